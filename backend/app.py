@@ -1,116 +1,443 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 import os
 import sys
+import itertools
 import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
 
 # Ajouter le dossier shared au path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
 
-from lora_module import LoRaDevice, list_available_ports, test_lora_connection
-from crypto_utils import SecureCrypto, MessageValidator, generate_secure_password
+from lora_module import RadioConfig
+from tx_scheduler import PRIORITY_LEVELS
+from device_pool import DevicePool, ROLES, ROLE_TX, ROLE_RX
+from async_lora import get_lora_event_loop
+from channel_plan import ChannelPlan, STRATEGIES, STRATEGY_LEAST_USED
+from port_discovery import PortDiscovery
+from message_aggregator import MessageAggregator
+from arq import ArqSender, ArqReceiver, ACK_PRIORITY, DELIVERY_PENDING
+from fragmentation import MAX_LORA_PAYLOAD
+from adr import AdrEngine
+from crypto_utils import SecureCrypto, MessageValidator, generate_secure_password, NONCE_IMPLICIT
+from replay_protection import SequenceCounter, node_id_from_state, save_node_id
+from key_derivation import get_key_derivation_pool
+from compression import PayloadCompressor, load_dictionary
+from message_store import MessageStore, DEFAULT_DATABASE_URL, DEFAULT_PAGE_SIZE
+from message_stats import MessageStats
+from event_bus import EventBus
+from metrics import REGISTRY, STAGE_SECONDS, DECRYPT_FAILURES, REPLAY_REJECTIONS
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+# Format des trames émises ("json" historique ou "binary" compact, lisible par les nœuds à jour seulement)
+FRAME_FORMAT = os.getenv('LORA_FRAME_FORMAT', 'json')
+
+# Configuration radio commune aux modules (utilisée aussi pour le temps d'émission)
+RADIO_CONFIG = RadioConfig(
+    frequency=float(os.getenv('LORA_FREQUENCY', 865.125)),
+    sf=int(os.getenv('LORA_SPREADING_FACTOR', 7)),
+    bw=int(os.getenv('LORA_BANDWIDTH', 125)),
+    power=int(os.getenv('LORA_TX_POWER', 14))
+)
+
+# Plan de canaux: "865.125,865.325::250" (fréquence[:sf[:bw]]), vide pour un seul canal.
+# Un SF imposé par un canal suspend l'ADR, qui choisit sinon le SF de tous les modules
+channel_plan = None
+if os.getenv('LORA_CHANNEL_PLAN'):
+    channel_plan = ChannelPlan.from_string(os.getenv('LORA_CHANNEL_PLAN'),
+                                           os.getenv('LORA_CHANNEL_STRATEGY', STRATEGY_LEAST_USED))
+
+# Débit adaptatif: SF et puissance ajustés selon le SNR mesuré à la réception
+# (retour à la configuration de base après LORA_ADR_SILENCE_S secondes sans trame d'un lien)
+adr_engine = (AdrEngine(silence_timeout=float(os.getenv('LORA_ADR_SILENCE_S', 90)))
+              if os.getenv('LORA_ADR', 'off').lower() == 'on' else None)
+
+# Taille maximale d'un paquet LoRa avant fragmentation (0, par défaut, pour désactiver).
+# Changement coordonné: tous les nœuds doivent l'activer ensemble. Avec la fragmentation, une
+# trame qui commence par 0xFF (environ 1 sur 256 en nonce aléatoire) reçoit un en-tête de
+# fragment, illisible pour un nœud sans fragmentation ou de version antérieure
+LORA_MTU = int(os.getenv('LORA_MTU', 0)) or None
+
+# Débit série négocié à la connexion (AT+UART), plafond en bauds (0 pour rester à 9600)
+LORA_MAX_BAUDRATE = int(os.getenv('LORA_MAX_BAUDRATE', 115200)) or None
+
+# Pilote des modules: "asyncio" (une boucle pour les commandes, émissions et réceptions de
+# tous les modules) ou "threaded" (un thread de lecture par module)
+LORA_DRIVER = os.getenv('LORA_DRIVER', 'asyncio').lower()
+if LORA_DRIVER not in ('asyncio', 'threaded'):
+    raise ValueError(f"LORA_DRIVER inconnu: {LORA_DRIVER} (asyncio ou threaded)")
+
+# Regroupement des petits messages dans une trame (fenêtre en ms, 0 pour désactiver)
+AGGREGATION_WINDOW = int(os.getenv('LORA_AGGREGATION_WINDOW_MS', 0)) / 1000
+# Un lot doit tenir dans un seul paquet LoRa (sans en-tête de fragment)
+AGGREGATION_MAX_SIZE = LORA_MTU or MAX_LORA_PAYLOAD
+
+# Livraison fiable: trames acquittées, fenêtre de LORA_ARQ_WINDOW trames en vol (0 pour désactiver)
+ARQ_WINDOW = int(os.getenv('LORA_ARQ_WINDOW', 0))
+ARQ_MAX_ATTEMPTS = int(os.getenv('LORA_ARQ_MAX_ATTEMPTS', 5))
+# Attente maximale avant d'acquitter, pour couvrir plusieurs trames d'un seul accusé
+ACK_DELAY = int(os.getenv('LORA_ACK_DELAY_MS', 100)) / 1000
+
+# Compression avant chiffrement (dictionnaire partagé par les deux extrémités)
+COMPRESSOR = None
+if os.getenv('LORA_COMPRESSION', 'off').lower() == 'on':
+    dictionary_path = os.getenv('LORA_COMPRESSION_DICT')
+    COMPRESSOR = PayloadCompressor(load_dictionary(dictionary_path) if dictionary_path else None)
+
+# Identité de ce nœud et état persistant (numéros de séquence, fenêtres anti-rejeu).
+# Le récepteur tient une fenêtre anti-rejeu par émetteur: sans LORA_NODE_ID, un identifiant
+# aléatoire est tiré au premier lancement et mémorisé dans STATE_DIR, pour que deux nœuds
+# ne partagent jamais une fenêtre. L'ancien identifiant commun est refusé.
+LEGACY_NODE_ID = 'web_interface'
+STATE_DIR = os.getenv('LORA_STATE_DIR') or os.path.join(os.path.dirname(__file__), 'state')
+NODE_ID_PATH = os.path.join(STATE_DIR, 'node_id.json')
+NODE_ID = os.getenv('LORA_NODE_ID') or node_id_from_state(NODE_ID_PATH)
+if NODE_ID == LEGACY_NODE_ID:
+    raise ValueError(f"LORA_NODE_ID={LEGACY_NODE_ID} est partagé par tous les nœuds: définir un identifiant "
+                     "propre à ce nœud, ou retirer LORA_NODE_ID pour en tirer un")
+SEQUENCE = SequenceCounter(NODE_ID, os.path.join(STATE_DIR, 'sequence.json'))
+
+# Nonce GCM: "random" (12 octets transmis) ou "implicit" (compteur de LORA_NONCE_COUNTER_BYTES octets)
+NONCE_MODE = os.getenv('LORA_NONCE_MODE', 'random')
+NONCE_COUNTER_BYTES = int(os.getenv('LORA_NONCE_COUNTER_BYTES', 4))
+# Émetteurs dont les trames à nonce implicite sont acceptées
+PEERS = [peer.strip() for peer in os.getenv('LORA_PEERS', '').split(',') if peer.strip()]
+if NONCE_MODE == NONCE_IMPLICIT:
+    # Le nonce est dérivé de l'identifiant et d'un compteur parti de 1: deux nœuds de même
+    # identifiant sous la même clé réutiliseraient les mêmes nonces GCM
+    if NODE_ID in PEERS:
+        raise ValueError(f"Nonce implicite: {NODE_ID} est aussi l'identifiant d'un pair (LORA_PEERS)")
+# Un compteur de nonce par clé (même objet si la clé est réinstallée)
+nonce_counters = {}
+
+# Diffusion socket.io groupée (fenêtre en ms, file bornée par client)
+event_bus = EventBus(
+    socketio,
+    window=int(os.getenv('SOCKETIO_BATCH_WINDOW_MS', 100)) / 1000,
+    max_queue=int(os.getenv('SOCKETIO_CLIENT_QUEUE', 200)),
+    policy=os.getenv('SOCKETIO_OVERFLOW_POLICY', 'drop_oldest')
+)
+
 # Variables globales
-lora_sender = None
-lora_receiver = None
+device_pool = None
+# Connexions/déconnexions en arrière-plan, suivies par /api/lora/operations/<id>
+lora_operations = OrderedDict()
+lora_operation_ids = itertools.count(1)
+lora_operations_lock = threading.Lock()
+# Rôle et débit des modules connectés par hwid: un module rebranché rejoint le pool
+rejoin_specs = {}
 crypto = None
-validator = MessageValidator()
-message_history = []
+# Génération de la clé courante: incrémentée à chaque dérivation lancée ou clé importée
+crypto_generation = 0
+crypto_lock = threading.Lock()
+# Résultat de l'installation des dérivations suivies par /api/crypto/jobs/<id>
+crypto_jobs = OrderedDict()
+message_aggregator = None
+validator = MessageValidator(window_store_path=os.path.join(STATE_DIR, 'replay_windows.json'))
+# Statistiques incrémentales, initialisées depuis l'historique conservé
+message_stats = MessageStats()
+# Historique persistant (SQLite), ouvert par start_services()
+message_store = None
+services_started = False
+services_lock = threading.Lock()
 is_listening = False
 
+def _pool_ports() -> set:
+    pool = device_pool
+    return set(pool.members) if pool else set()
+
+def _on_port_added(info):
+    """Module LoRa branché: il rejoint le pool s'il y était avant son débranchement"""
+    pool = device_pool
+    spec = rejoin_specs.get(info.get('hwid'))
+    event_bus.publish('ports_changed', {'event': 'added', 'port': info['port'], 'hwid': info.get('hwid')})
+    if not pool or not spec or info['port'] in pool.members:
+        return
+    members, errors = pool.add_devices([dict(spec, port=info['port'])])
+    if members:
+        print(f"🔌 Module rebranché, retour dans le pool: {info['port']} ({spec['role']})")
+    event_bus.publish('lora_rejoin', {'port': info['port'], 'role': spec['role'],
+                                      'success': bool(members), 'error': errors.get(info['port'])})
+
+def _on_port_removed(info):
+    """Module LoRa débranché: retiré du pool, son rôle est conservé pour le rebranchement"""
+    pool = device_pool
+    event_bus.publish('ports_changed', {'event': 'removed', 'port': info['port'], 'hwid': info.get('hwid')})
+    if pool and info['port'] in pool.members:
+        print(f"🔌 Module débranché: {info['port']}")
+        pool.remove_device(info['port'])
+
+# Inventaire des ports en cache, sondage AT parallèle et détection à chaud
+port_discovery = PortDiscovery(
+    scan_interval=float(os.getenv('LORA_PORT_SCAN_INTERVAL', 2.0)),
+    state_path=os.path.join(STATE_DIR, 'lora_ports.json'),
+    in_use=_pool_ports,
+    on_added=_on_port_added,
+    on_removed=_on_port_removed
+)
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Vérification de l'état du serveur"""
     return jsonify({
         'status': 'ok',
         'timestamp': datetime.now().isoformat(),
-        'lora_sender_connected': lora_sender.is_connected if lora_sender else False,
-        'lora_receiver_connected': lora_receiver.is_connected if lora_receiver else False,
-        'crypto_initialized': crypto is not None
+        'lora_sender_connected': device_pool.has_transmitter() if device_pool else False,
+        'lora_receiver_connected': device_pool.has_receiver() if device_pool else False,
+        'devices': device_pool.get_status()['devices'] if device_pool else [],
+        'crypto_initialized': crypto is not None,
+        'nonce': {
+            'mode': NONCE_MODE,
+            'counter': crypto.sequence.value if crypto and crypto.sequence else None,
+            'max_counter': crypto.max_counter if crypto and crypto.implicit else None,
+            'rotation_needed': crypto.rotation_needed if crypto else False
+        },
+        'port_discovery': port_discovery.get_status(),
+        'key_derivation': get_key_derivation_pool().get_stats()
     })
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Métriques au format texte Prometheus (désactivables avec LORA_METRICS=off)"""
+    if not REGISTRY.enabled:
+        return jsonify({'error': 'Métriques désactivées'}), 404
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/ports', methods=['GET'])
 def get_available_ports():
-    """Obtenir la liste des ports série disponibles"""
+    """Obtenir les ports série connus (cache), ?refresh=1 pour réénumérer et resonder"""
     try:
-        ports = list_available_ports()
-        return jsonify({'ports': ports})
+        if request.args.get('refresh') in ('1', 'true') or not port_discovery.scans:
+            port_discovery.scan(reprobe=request.args.get('refresh') in ('1', 'true'))
+        return jsonify({'ports': port_discovery.get_ports(), 'discovery': port_discovery.get_status()})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/lora/connect', methods=['POST'])
 def connect_lora():
-    """Connecter les modules LoRa"""
-    global lora_sender, lora_receiver
+    """Connecter les modules LoRa (en parallèle, en arrière-plan)
 
+    devices: [{"port": ..., "role": "tx" | "rx" | "both"}], ou l'ancien
+    couple sender_port / receiver_port. Répond 202 avec l'identifiant de
+    l'opération; l'avancement arrive par socket.io ('lora_progress').
+    """
     try:
         data = request.get_json()
-        sender_port = data.get('sender_port')
-        receiver_port = data.get('receiver_port')
-        baudrate = data.get('baudrate', 9600)
-
-        if not sender_port or not receiver_port:
+        baudrate = data.get('baudrate')
+        devices = data.get('devices')
+        if devices is None:
+            sender_port = data.get('sender_port')
+            receiver_port = data.get('receiver_port')
+            if not sender_port or not receiver_port:
+                return jsonify({'error': 'Ports manquants'}), 400
+            devices = [{'port': sender_port, 'role': ROLE_TX}, {'port': receiver_port, 'role': ROLE_RX}]
+
+        if not devices or any(not device.get('port') for device in devices):
             return jsonify({'error': 'Ports manquants'}), 400
+        if any(device.get('role', 'both') not in ROLES for device in devices):
+            return jsonify({'error': f'Rôle inconnu, attendu: {", ".join(ROLES)}'}), 400
+        if len({device['port'] for device in devices}) != len(devices):
+            return jsonify({'error': 'Port en double'}), 400
+
+        # Sans débit imposé: celui négocié à la dernière connexion du module, sinon 9600
+        specs = [{'port': device['port'], 'role': device.get('role', 'both'),
+                  'baudrate': device.get('baudrate') or baudrate or port_discovery.get_baudrate(device['port'])}
+                 for device in devices]
+
+        def connect(progress):
+            global device_pool
+            if device_pool:
+                device_pool.close()
+
+            # Chaque émetteur a son ordonnanceur, chaque récepteur sa lecture continue
+            # (sur la boucle asyncio partagée, créée à la première connexion)
+            pool = DevicePool(mtu=LORA_MTU, radio_config=RADIO_CONFIG.copy(), channel_plan=channel_plan,
+                              max_baudrate=LORA_MAX_BAUDRATE,
+                              event_loop=get_lora_event_loop() if LORA_DRIVER == 'asyncio' else None)
+            members, errors = pool.add_devices(specs, progress)
+            if not members:
+                raise Exception(f"Aucun module connecté: {'; '.join(errors.values())}")
+
+            device_pool = pool
+            # Modules confirmés: mémorisés par hwid pour le rebranchement à chaud
+            rejoin_specs.clear()
+            if any(port_discovery.get_hwid(member.port) is None for member in members):
+                port_discovery.scan()
+            for member in members:
+                port_discovery.confirm(member.port)
+                port_discovery.set_baudrate(member.port, member.device.baudrate)
+                hwid = port_discovery.get_hwid(member.port)
+                if hwid:
+                    rejoin_specs[hwid] = {'role': member.role, 'baudrate': member.device.baudrate}
+            start_listening()
+            return {
+                'devices': [{'port': member.port, 'role': member.role, 'baudrate': member.device.baudrate}
+                            for member in members],
+                'errors': errors
+            }
 
-        # Connecter l'émetteur
-        lora_sender = LoRaDevice(sender_port, baudrate)
-        if not lora_sender.connect():
-            return jsonify({'error': 'Impossible de connecter l\'émetteur'}), 500
-
-        # Connecter le récepteur
-        lora_receiver = LoRaDevice(receiver_port, baudrate)
-        if not lora_receiver.connect():
-            lora_sender.disconnect()
-            return jsonify({'error': 'Impossible de connecter le récepteur'}), 500
-
-        # Démarrer l'écoute
-        start_listening()
-
-        return jsonify({
-            'message': 'Modules LoRa connectés avec succès',
-            'sender_port': sender_port,
-            'receiver_port': receiver_port
-        })
+        operation = _start_lora_operation('connect', len(specs), connect)
+        if operation is None:
+            return jsonify({'error': 'Opération de connexion déjà en cours'}), 409
+        return jsonify({'message': 'Connexion des modules LoRa en cours', 'operation_id': operation['id'],
+                        'status': operation['status']}), 202
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/lora/disconnect', methods=['POST'])
 def disconnect_lora():
-    """Déconnecter les modules LoRa"""
-    global lora_sender, lora_receiver, is_listening
+    """Réinitialiser (ATZ) et déconnecter les modules LoRa, en parallèle et en arrière-plan"""
+    global device_pool, is_listening
 
     try:
+        if _lora_operation_running():
+            return jsonify({'error': 'Opération de connexion déjà en cours'}), 409
+
         is_listening = False
+        if message_aggregator:
+            message_aggregator.flush()
+        pool, device_pool = device_pool, None
+        rejoin_specs.clear()
 
-        # Reset des modules avant déconnexion
-        if lora_sender and lora_sender.is_connected:
-            try:
-                lora_sender._send_command("ATZ")  # Commande de reset
-                time.sleep(0.5)  # Attendre le reset
-            except Exception as reset_error:
-                print(f"Erreur reset émetteur: {reset_error}")
-            lora_sender.disconnect()
-            lora_sender = None
-
-        if lora_receiver and lora_receiver.is_connected:
-            try:
-                lora_receiver._send_command("ATZ")  # Commande de reset
-                time.sleep(0.5)  # Attendre le reset
-            except Exception as reset_error:
-                print(f"Erreur reset récepteur: {reset_error}")
-            lora_receiver.disconnect()
-            lora_receiver = None
+        def disconnect(progress):
+            if pool:
+                pool.close(reset=True, progress=progress)
+            return {}
 
-        return jsonify({'message': 'Modules LoRa déconnectés et réinitialisés'})
+        operation = _start_lora_operation('disconnect', len(pool.members) if pool else 0, disconnect)
+        return jsonify({'message': 'Déconnexion des modules LoRa en cours', 'operation_id': operation['id'],
+                        'status': operation['status']}), 202
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _lora_operation_running() -> bool:
+    return any(operation['status'] == 'running' for operation in list(lora_operations.values()))
+
+def _start_lora_operation(kind: str, total: int, target):
+    """Lancer target(progress) dans un thread, None si une opération est déjà en cours"""
+    with lora_operations_lock:
+        if _lora_operation_running():
+            return None
+        operation = {
+            'id': next(lora_operation_ids),
+            'kind': kind,
+            'status': 'running',
+            'total': total,
+            'devices': {},
+            'started_at': time.time(),
+            'duration_ms': None,
+            'result': None,
+            'error': None
+        }
+        lora_operations[operation['id']] = operation
+        while len(lora_operations) > 16:
+            lora_operations.popitem(last=False)
+
+    def progress(port, state, error=None):
+        operation['devices'][port] = {'state': state, 'error': error}
+        event_bus.publish('lora_progress', {
+            'operation_id': operation['id'],
+            'kind': kind,
+            'port': port,
+            'state': state,
+            'error': error,
+            'total': total
+        })
+
+    def run():
+        try:
+            operation['result'] = target(progress)
+            operation['status'] = 'done'
+        except Exception as e:
+            operation['status'] = 'failed'
+            operation['error'] = str(e)
+            print(f"⚫️ Erreur de {kind}: {e}")
+        operation['duration_ms'] = round((time.time() - operation['started_at']) * 1000, 1)
+        event_bus.publish('lora_operation', dict(operation))
+
+    threading.Thread(target=run, daemon=True).start()
+    return operation
+
+@app.route('/api/lora/operations/<int:operation_id>', methods=['GET'])
+def get_lora_operation(operation_id):
+    """Suivre une connexion ou une déconnexion lancée en arrière-plan"""
+    operation = lora_operations.get(operation_id)
+    if operation is None:
+        return jsonify({'error': 'Opération inconnue'}), 404
+    return jsonify(dict(operation, devices=dict(operation['devices'])))
+
+@app.route('/api/lora/signal', methods=['GET'])
+def get_signal_info():
+    """Obtenir la qualité du dernier paquet reçu et l'état de l'ADR"""
+    if not device_pool or not device_pool.get_members(ROLE_RX):
+        return jsonify({'error': 'Récepteur LoRa non connecté'}), 400
+
+    return jsonify({
+        'signal': device_pool.get_signal_info(),
+        'radio_config': device_pool.radio_config.to_dict(),
+        'adr': adr_engine.get_status() if adr_engine else None
+    })
+
+@app.route('/api/lora/metrics', methods=['GET'])
+def get_lora_metrics():
+    """Obtenir les métriques de réception et de réassemblage"""
+    return jsonify({
+        'mtu': LORA_MTU,
+        'driver': LORA_DRIVER,
+        'pool': device_pool.get_status() if device_pool else {},
+        'reassembly': {member.port: member.device.get_reassembly_metrics()
+                       for member in device_pool.get_members(ROLE_RX)} if device_pool else {},
+        'channels': device_pool.get_channel_status()['channels'] if device_pool else [],
+        'ports': port_discovery.get_status(),
+        'aggregation': message_aggregator.get_status() if message_aggregator else None,
+        'arq': arq_sender.get_status() if arq_sender else None,
+        'acks': arq_receiver.get_status(),
+        'socketio': event_bus.get_status()
+    })
+
+@app.route('/api/lora/channels', methods=['GET'])
+def get_channel_plan():
+    """Obtenir le plan de canaux et l'occupation de chaque canal"""
+    if device_pool:
+        return jsonify(device_pool.get_channel_status())
+    return jsonify({'plan': channel_plan.to_dict() if channel_plan else None, 'channels': []})
+
+@app.route('/api/lora/channels', methods=['PUT'])
+def set_channel_plan():
+    """Remplacer le plan de canaux: {"channels": [{"frequency", "sf", "bw"}], "strategy"}
+
+    Une liste vide remet tous les modules sur la configuration commune.
+    """
+    global channel_plan
+
+    try:
+        data = request.get_json()
+        channels = data.get('channels') or []
+        strategy = data.get('strategy', STRATEGY_LEAST_USED)
+        if strategy not in STRATEGIES:
+            return jsonify({'error': f'Stratégie inconnue, attendu: {", ".join(STRATEGIES)}'}), 400
+
+        try:
+            plan = ChannelPlan.from_list(channels, strategy) if channels else None
+        except (KeyError, ValueError) as plan_error:
+            return jsonify({'error': f'Plan de canaux invalide: {plan_error}'}), 400
+
+        channel_plan = plan
+        if device_pool and not device_pool.set_channel_plan(plan):
+            return jsonify({'error': 'Certains modules n\'ont pas pu changer de canal'}), 500
+
+        event_bus.publish('channel_plan_changed', plan.to_dict() if plan else None)
+        return jsonify(device_pool.get_channel_status() if device_pool else
+                       {'plan': plan.to_dict() if plan else None, 'channels': []})
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -118,8 +445,6 @@ def disconnect_lora():
 @app.route('/api/crypto/init', methods=['POST'])
 def init_crypto():
     """Initialiser le système de chiffrement"""
-    global crypto
-
     try:
         data = request.get_json()
         password = data.get('password')
@@ -128,17 +453,125 @@ def init_crypto():
             # Générer un mot de passe aléatoire
             password = generate_secure_password()
 
-        crypto = SecureCrypto(password=password)
+        generated_password = password if not data.get('password') else None
+        generation = _next_crypto_generation()
+        job_id, future = get_key_derivation_pool().start_job(password)
 
+        if future.done():
+            # Clé déjà en cache: réponse immédiate
+            return jsonify(_install_derived_key(future, generation, generated_password, job_id))
+
+        # Dérivation en arrière-plan: le client suit le travail ou attend l'événement socket
+        future.add_done_callback(
+            lambda f: event_bus.publish('crypto_initialized',
+                                        _install_derived_key(f, generation, generated_password, job_id))
+        )
         return jsonify({
-            'message': 'Chiffrement initialisé',
-            'key_fingerprint': crypto.get_key_fingerprint(),
-            'generated_password': password if not data.get('password') else None
-        })
+            'message': 'Dérivation de clé en cours',
+            'job_id': job_id,
+            'status': 'pending',
+            'generated_password': generated_password
+        }), 202
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _next_crypto_generation() -> int:
+    global crypto_generation
+    with crypto_lock:
+        crypto_generation += 1
+        return crypto_generation
+
+def _install_derived_key(future, generation, generated_password=None, job_id=None):
+    """Installer la clé dérivée comme clé de chiffrement courante
+
+    Ignorée si une autre dérivation a été lancée ou une clé importée depuis
+    (generation n'est plus la génération courante).
+    """
+    global crypto
+
+    try:
+        key = future.result()
+    except Exception as e:
+        return _record_crypto_job(job_id, None, {'job_id': job_id, 'status': 'error', 'error': str(e)})
+
+    new_crypto = _new_crypto(key)
+    with crypto_lock:
+        installed = generation == crypto_generation
+        if installed:
+            crypto = new_crypto
+    if not installed:
+        return _record_crypto_job(job_id, new_crypto, _superseded_job(job_id, new_crypto))
+    return _record_crypto_job(job_id, new_crypto, {
+        'message': 'Chiffrement initialisé',
+        'job_id': job_id,
+        'status': 'done',
+        'key_fingerprint': new_crypto.get_key_fingerprint(),
+        'generated_password': generated_password
+    })
+
+def _record_crypto_job(job_id, derived, result):
+    """Conserver le résultat d'une dérivation et la clé qu'elle a produite"""
+    if job_id is not None:
+        with crypto_lock:
+            crypto_jobs[job_id] = (derived, result)
+            # Conserver seulement les derniers travaux, comme le pool de dérivation
+            while len(crypto_jobs) > 64:
+                crypto_jobs.popitem(last=False)
+    return result
+
+def _superseded_job(job_id, derived):
+    """Dérivation remplacée: l'empreinte rapportée est celle de la clé installée"""
+    current = crypto
+    return {
+        'job_id': job_id,
+        'status': 'superseded',
+        'message': 'Clé remplacée entre-temps par une autre initialisation ou un import',
+        'key_fingerprint': current.get_key_fingerprint() if current else None,
+        'derived_fingerprint': derived.get_key_fingerprint()
+    }
+
+def _new_crypto(key: bytes) -> SecureCrypto:
+    """Chiffrement avec la configuration de trame du nœud"""
+    sequence = SEQUENCE
+    if NONCE_MODE == NONCE_IMPLICIT:
+        # Compteur persistant propre à la clé: jamais deux fois le même nonce avec une clé
+        key_id = SecureCrypto(key=key).key_id
+        if key_id not in nonce_counters:
+            nonce_counters[key_id] = SequenceCounter(NODE_ID, os.path.join(STATE_DIR, f'nonce_counter_{key_id}.json'))
+        sequence = nonce_counters[key_id]
+    return SecureCrypto(key=key, frame_format=FRAME_FORMAT, compressor=COMPRESSOR, sequence=sequence,
+                        nonce_mode=NONCE_MODE, counter_bytes=NONCE_COUNTER_BYTES, peers=PEERS)
+
+def _check_key_rotation():
+    """Prévenir une fois par clé quand le compteur de nonce approche de sa limite"""
+    current = crypto
+    if current and current.rotation_needed and not getattr(current, 'rotation_notified', False):
+        current.rotation_notified = True
+        print(f"⚠️ Compteur de nonce à {current.sequence.value}/{current.max_counter}: changer de clé")
+        event_bus.publish('key_rotation_required', {
+            'fingerprint': current.get_key_fingerprint(),
+            'counter': current.sequence.value,
+            'max_counter': current.max_counter
+        })
+
+@app.route('/api/crypto/jobs/<int:job_id>', methods=['GET'])
+def get_crypto_job(job_id):
+    """Suivre une dérivation de clé lancée par /api/crypto/init"""
+    with crypto_lock:
+        record = crypto_jobs.get(job_id)
+    if record is None:
+        if get_key_derivation_pool().get_job(job_id) is None:
+            return jsonify({'error': 'Travail inconnu'}), 404
+        # Dérivation en cours ou clé pas encore installée
+        return jsonify({'job_id': job_id, 'status': 'pending'})
+
+    derived, result = record
+    if derived is not None and derived is not crypto:
+        # Non installée ou remplacée depuis: empreinte de la clé installée maintenant
+        return jsonify(_superseded_job(job_id, derived))
+    return jsonify({key: value for key, value in result.items() if key != 'generated_password'})
+
 @app.route('/api/crypto/export', methods=['GET'])
 def export_crypto_key():
     """Exporter la clé de chiffrement"""
@@ -165,11 +598,16 @@ def import_crypto_key():
         if not key_b64:
             return jsonify({'error': 'Clé manquante'}), 400
 
-        crypto = SecureCrypto.import_key(key_b64)
+        new_crypto = _new_crypto(SecureCrypto.import_key(key_b64).key)
+        # Une dérivation encore en cours ne doit pas remplacer la clé importée
+        generation = _next_crypto_generation()
+        with crypto_lock:
+            if generation == crypto_generation:
+                crypto = new_crypto
 
         return jsonify({
             'message': 'Clé importée avec succès',
-            'fingerprint': crypto.get_key_fingerprint()
+            'fingerprint': new_crypto.get_key_fingerprint()
         })
 
     except Exception as e:
@@ -178,7 +616,7 @@ def import_crypto_key():
 @app.route('/api/messages/send', methods=['POST'])
 def send_message():
     """Envoyer un message chiffré"""
-    if not lora_sender or not lora_sender.is_connected:
+    if not device_pool or not device_pool.has_transmitter():
         return jsonify({'error': 'Émetteur LoRa non connecté'}), 400
 
     if not crypto:
@@ -192,73 +630,256 @@ def send_message():
         if not message:
             return jsonify({'error': 'Message vide'}), 400
 
+        if priority not in PRIORITY_LEVELS:
+            return jsonify({'error': f'Priorité inconnue: {priority}'}), 400
+
         # Métadonnées
         metadata = {
-            'sender': 'web_interface',
+            'sender': NODE_ID,
             'priority': priority,
             'timestamp': int(time.time())
         }
+        if arq_sender:
+            # Accusé de réception demandé au destinataire
+            metadata['ack'] = True
 
-        # Chiffrer le message
-        encrypted_data = crypto.encrypt_message(message, metadata)
+        submitted_at = time.time()
 
-        # Envoyer via LoRa
-        success = lora_sender.send_data(encrypted_data)
+        def on_sent(success: bool, frame: bytes, count: int = 1):
+            """Historique et notification une fois la trame émise"""
+            if not success:
+                event_bus.publish('message_failed', {'message': message, 'metadata': metadata})
+                return
+            _check_key_rotation()
 
-        if success:
-            # Ajouter à l'historique
-            message_entry = {
-                'id': len(message_history) + 1,
+            message_entry = message_store.add({
                 'message': message,
                 'direction': 'sent',
                 'timestamp': datetime.now().isoformat(),
                 'metadata': metadata,
-                'encrypted_size': len(encrypted_data)
-            }
-            message_history.append(message_entry)
+                # Part de la trame groupée revenant à ce message
+                'encrypted_size': round(len(frame) / count),
+                'delivery': {'status': DELIVERY_PENDING} if arq_sender else None
+            })
+            message_stats.record(message_entry, latency=time.time() - submitted_at)
+            STAGE_SECONDS.observe(time.time() - submitted_at, "send_to_tx_done")
 
             # Notifier via WebSocket
-            socketio.emit('message_sent', message_entry)
-
+            event_bus.publish('message_sent', message_entry)
+            if arq_sender:
+                arq_sender.watch(frame, lambda status, info: _update_delivery(message_entry, status, info))
+
+        # Regroupement: le message attend la fenêtre ou une trame pleine (priorité haute: aucune attente)
+        aggregator = _get_aggregator()
+        if aggregator and aggregator.fits(message, metadata):
+            held = aggregator.add(message, metadata, priority, on_sent)
             return jsonify({
-                'message': 'Message envoyé avec succès',
-                'encrypted_size': len(encrypted_data)
-            })
-        else:
-            return jsonify({'error': 'Échec de l\'envoi'}), 500
+                'message': 'Message en attente de regroupement' if held['held'] else 'Message en file d\'émission',
+                'aggregated': True,
+                'aggregation_id': held['id'],
+                'pending': held['pending'],
+                'hold_s': held['hold_s']
+            }), 202
+
+        # Chiffrer le message
+        encrypted_data = crypto.encrypt_message(message, metadata)
+
+        # Mettre en file sur l'émetteur le plus tôt disponible (priorité, rapport cyclique)
+        try:
+            ticket = _submit_frame(encrypted_data, priority, lambda success: on_sent(success, encrypted_data))
+        except Exception as queue_error:
+            return jsonify({'error': str(queue_error)}), 503
+
+        response = {
+            'message': 'Message en file d\'émission',
+            'encrypted_size': len(encrypted_data),
+            # Absents tant que la trame attend une place dans la fenêtre d'acquittement
+            'queue_id': ticket.get('id'),
+            'port': ticket.get('port'),
+            'queue_position': ticket.get('queue_position'),
+            'airtime_s': ticket.get('airtime_s'),
+            'estimated_delay_s': ticket.get('estimated_delay_s')
+        }
+        if arq_sender:
+            response['delivery'] = {'status': DELIVERY_PENDING, 'seq': ticket['seq'],
+                                    'window_position': ticket['window_position']}
+        return jsonify(response), 202
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _submit_frame(frame: bytes, priority: str, on_sent):
+    """Émettre une trame de données, par la fenêtre d'acquittement si la livraison fiable est active"""
+    if arq_sender:
+        return arq_sender.submit(frame, priority, on_sent)
+    return _submit_to_pool(frame, priority, on_sent)
+
+def _submit_to_pool(frame: bytes, priority: str, on_sent=None):
+    pool = device_pool
+    if not pool or not pool.has_transmitter():
+        raise Exception('Émetteur LoRa non connecté')
+    return pool.submit(frame, priority, on_sent)
+
+def _send_ack(to: str, base: int, bitmap: int):
+    """Chiffrer et émettre un accusé de réception, devant les données en file"""
+    current = crypto
+    if not current:
+        raise Exception('Chiffrement non initialisé')
+    _submit_to_pool(current.encrypt_ack(to, base, bitmap), ACK_PRIORITY)
+
+def _update_delivery(message_entry: dict, status: str, info: dict):
+    """Accusé reçu ou échec définitif: historique et notification"""
+    delivery = dict(info, status=status)
+    message_entry['delivery'] = delivery
+    message_store.set_delivery(message_entry['id'], delivery)
+    event_bus.publish('message_delivery', {'id': message_entry['id'], 'delivery': delivery})
+
+# Fenêtre glissante côté émetteur (RTO mesuré), accusés groupés côté récepteur
+arq_sender = None
+if ARQ_WINDOW > 0:
+    arq_sender = ArqSender(_submit_to_pool, lambda frame: crypto.frame_sequence(frame), window=ARQ_WINDOW,
+                           max_attempts=ARQ_MAX_ATTEMPTS)
+arq_receiver = ArqReceiver(_send_ack, delay=ACK_DELAY)
+
+def start_services():
+    """Ouvrir l'historique et démarrer les threads de fond (diffusion, ARQ, détection des ports)
+
+    Rien n'est ouvert ni démarré à l'import du module: appelé au lancement
+    du serveur, ou à la première requête si l'application est servie autrement.
+    """
+    global message_store, services_started
+
+    with services_lock:
+        if services_started:
+            return
+        if not os.getenv('LORA_NODE_ID'):
+            # Identifiant tiré à l'import: gardé tel quel aux redémarrages suivants
+            save_node_id(NODE_ID_PATH, NODE_ID)
+            print(f"🆔 Identifiant de ce nœud: {NODE_ID} (à déclarer dans LORA_PEERS des autres nœuds)")
+        # Historique persistant (SQLite), rétention optionnelle par âge ou par nombre;
+        # chemin relatif résolu depuis le dossier backend, pas depuis le dossier courant
+        message_store = MessageStore.from_url(
+            os.getenv('DATABASE_URL') or DEFAULT_DATABASE_URL,
+            base_dir=os.path.dirname(os.path.abspath(__file__)),
+            max_age=float(os.getenv('HISTORY_MAX_AGE_DAYS', 0)) * 86400 or None,
+            max_messages=int(os.getenv('HISTORY_MAX_MESSAGES', 0)) or None,
+            on_purge=message_stats.forget
+        )
+        message_stats.load(message_store.aggregate())
+
+        event_bus.start()
+        arq_receiver.start()
+        if arq_sender:
+            arq_sender.start()
+        if port_discovery.scan_interval > 0:
+            port_discovery.start()
+        services_started = True
+
+@app.before_request
+def _ensure_services():
+    start_services()
+
+def _get_aggregator():
+    """Regroupeur lié à la clé courante, None si le regroupement est désactivé"""
+    global message_aggregator
+    if AGGREGATION_WINDOW <= 0:
+        return None
+    if message_aggregator and message_aggregator.crypto is not crypto:
+        # Nouvelle clé: les messages retenus partent avec l'ancienne
+        message_aggregator.stop()
+        message_aggregator = None
+    if message_aggregator is None:
+        message_aggregator = MessageAggregator(crypto, _submit_frame, window=AGGREGATION_WINDOW,
+                                               max_size=AGGREGATION_MAX_SIZE)
+        message_aggregator.start()
+    return message_aggregator
+
+@app.route('/api/messages/estimate', methods=['POST'])
+def estimate_message():
+    """Estimer le délai d'émission d'un message avant de l'envoyer"""
+    if not device_pool or not device_pool.has_transmitter():
+        return jsonify({'error': 'Émetteur LoRa non connecté'}), 400
+
+    if not crypto:
+        return jsonify({'error': 'Chiffrement non initialisé'}), 400
+
+    try:
+        data = request.get_json()
+        message = data.get('message', '')
+        priority = data.get('priority', 'normal')
+
+        metadata = {
+            'sender': NODE_ID,
+            'priority': priority,
+            'timestamp': int(time.time())
+        }
+        if arq_sender:
+            metadata['ack'] = True
+        # Taille calculée sans chiffrer: une estimation ne consomme ni numéro de séquence ni nonce
+        encrypted_size = crypto.message_size(message, metadata)
+
+        estimate = device_pool.estimate(encrypted_size, priority)
+        estimate['encrypted_size'] = encrypted_size
+        return jsonify(estimate)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/scheduler/status', methods=['GET'])
+def get_scheduler_status():
+    """Obtenir l'état de la file d'émission et du rapport cyclique"""
+    if not device_pool or not device_pool.get_members(ROLE_TX):
+        return jsonify({'error': 'Émetteur LoRa non connecté'}), 400
+    return jsonify(device_pool.get_scheduler_status())
+
 @app.route('/api/messages/history', methods=['GET'])
 def get_message_history():
-    """Obtenir l'historique des messages"""
-    return jsonify({'messages': message_history})
+    """Obtenir l'historique des messages (pagination par curseur)
 
+    ?after_id= pour les messages suivants, ?before_id= pour les précédents,
+    sans curseur les plus récents; filtres direction, sender, since, until.
+    """
+    try:
+        args = request.args
+        messages, has_more = message_store.list(
+            after_id=args.get('after_id', type=int),
+            before_id=args.get('before_id', type=int),
+            limit=args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+            direction=args.get('direction'),
+            sender=args.get('sender'),
+            since=args.get('since', type=float),
+            until=args.get('until', type=float)
+        )
+        return jsonify({
+            'messages': messages,
+            'has_more': has_more,
+            'first_id': messages[0]['id'] if messages else None,
+            'last_id': messages[-1]['id'] if messages else None
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/messages/history', methods=['DELETE'])
 @app.route('/api/messages/clear', methods=['POST'])
 def clear_message_history():
     """Effacer l'historique des messages"""
-    global message_history
-    message_history = []
-    socketio.emit('history_cleared')
+    message_store.clear()
+    message_stats.reset()
+    event_bus.publish('history_cleared')
     return jsonify({'message': 'Historique effacé'})
 
 @app.route('/api/messages/stats', methods=['GET'])
 def get_message_stats():
     """Obtenir les statistiques des messages"""
-    sent_count = len([msg for msg in message_history if msg['direction'] == 'sent'])
-    received_count = len([msg for msg in message_history if msg['direction'] == 'received'])
-
-    return jsonify({
-        'total_messages': len(message_history),
-        'sent_messages': sent_count,
-        'received_messages': received_count,
+    stats = message_stats.snapshot()
+    stats.update({
         'connection_status': {
-            'sender_connected': lora_sender is not None and lora_sender.is_connected,
-            'receiver_connected': lora_receiver is not None and lora_receiver.is_connected,
+            'sender_connected': device_pool is not None and device_pool.has_transmitter(),
+            'receiver_connected': device_pool is not None and device_pool.has_receiver(),
             'crypto_initialized': crypto is not None
         }
     })
+    return jsonify(stats)
 
 def start_listening():
     """Démarrer l'écoute des messages LoRa"""
@@ -270,41 +891,71 @@ def start_listening():
     is_listening = True
 
     def listen_loop():
-        global is_listening
         print("🎧 Thread d'écoute LoRa démarré")
 
-        while is_listening and lora_receiver and lora_receiver.is_connected:
+        while is_listening and device_pool:
             try:
-                # Recevoir des données
-                encrypted_data = lora_receiver.receive_data(timeout=1.0)
+                # Flux fusionné et dédupliqué de tous les récepteurs, avec la qualité de lien
+                encrypted_data, signal_info = device_pool.receive_frame(timeout=1.0)
+                if not encrypted_data:
+                    # Silence prolongé: l'ADR revient à la configuration de base
+                    update_data_rate()
 
                 if encrypted_data:
                     print(f"📡 Données reçues: {len(encrypted_data)} bytes")
                     if crypto:
                         try:
-                            # Déchiffrer le message
-                            message, metadata = crypto.decrypt_message(encrypted_data)
-                            print(f"🔓 Message déchiffré: {message}")
-
-                            # Valider le message
-                            if validator.validate_message(message, metadata):
-                                # Ajouter à l'historique
-                                message_entry = {
-                                    'id': len(message_history) + 1,
-                                    'message': message,
-                                    'direction': 'received',
-                                    'timestamp': datetime.now().isoformat(),
-                                    'metadata': metadata,
-                                    'encrypted_size': len(encrypted_data),
-                                    'signal_info': lora_receiver.get_signal_info()
-                                }
-                                message_history.append(message_entry)
-                                print(f"⚪️ Message ajouté à l'historique: {message}")
-
-                                # Notifier via WebSocket
-                                socketio.emit('message_received', message_entry)
+                            # Déchiffrer la trame (un message ou un lot)
+                            with STAGE_SECONDS.time("decrypt"):
+                                messages, frame_metadata = crypto.decrypt_frame(encrypted_data)
+                            # Accusé de réception: livraison confirmée pour nos trames en vol
+                            acknowledgement = frame_metadata.get('acknowledgement')
+                            if acknowledgement is not None:
+                                if arq_sender and acknowledgement['to'] == NODE_ID:
+                                    delivered = arq_sender.handle_ack(acknowledgement['base'],
+                                                                      acknowledgement['bitmap'])
+                                    print(f"📬 Accusé de réception: {delivered} trame(s) livrée(s)")
+                                continue
+                            print(f"🔓 {len(messages)} message(s) déchiffré(s)")
+
+                            # Accusé demandé: noté même pour un doublon (l'accusé précédent a pu se perdre)
+                            if frame_metadata.get('ack') and type(frame_metadata.get('seq')) is int:
+                                arq_receiver.record(frame_metadata.get('sender', ''), frame_metadata['seq'],
+                                                    frame_metadata.get('key_id'))
+
+                            # Valider la trame une seule fois (séquence commune au lot)
+                            with STAGE_SECONDS.time("validate"):
+                                valid = validator.validate_message("\x1e".join(message for message, _ in messages),
+                                                                   frame_metadata)
+
+                            if valid:
+                                # Un message d'historique par message du lot
+                                for message, metadata in messages:
+                                    message_entry = message_store.add({
+                                        'message': message,
+                                        'direction': 'received',
+                                        'timestamp': datetime.now().isoformat(),
+                                        'metadata': metadata,
+                                        'encrypted_size': round(len(encrypted_data) / len(messages)),
+                                        'signal_info': signal_info
+                                    })
+                                    message_stats.record(
+                                        message_entry,
+                                        latency=time.time() - signal_info['received_at'] if signal_info else None
+                                    )
+                                    print(f"⚪️ Message ajouté à l'historique: {message}")
+
+                                    # Notifier via WebSocket
+                                    event_bus.publish('message_received', message_entry)
+                                if signal_info:
+                                    STAGE_SECONDS.observe(time.time() - signal_info['received_at'], "rx_to_emit")
+
+                                update_data_rate(frame_metadata.get('sender', 'default'), signal_info)
+                            else:
+                                REPLAY_REJECTIONS.inc()
 
                         except Exception as decrypt_error:
+                            DECRYPT_FAILURES.inc()
                             print(f"⚫️ Erreur de déchiffrement: {decrypt_error}")
                     else:
                         print("⚠️ Crypto non initialisé")
@@ -318,14 +969,45 @@ def start_listening():
     listen_thread = threading.Thread(target=listen_loop, daemon=True)
     listen_thread.start()
 
+def update_data_rate(link: str = None, signal_info: dict = None):
+    """Alimenter l'ADR et reconfigurer les modules si besoin
+
+    Sans trame (link None), seul le silence des liens est vérifié: un pair
+    qui n'a pas suivi un changement n'est plus entendu, et la configuration
+    de base (RADIO_CONFIG) revient quand plus aucun lien n'est actif.
+    """
+    pool = device_pool
+    if not adr_engine or not pool:
+        return
+    plan = pool.channel_plan
+    if plan and plan.fixes_sf:
+        # SF imposé par le plan: les modules n'utilisent pas celui sur lequel l'ADR calculerait sa marge
+        return
+
+    current = pool.radio_config
+    if link and signal_info:
+        # Décision propre au lien, mesurée avec la configuration commune
+        adr_engine.record(link, signal_info.get('snr'))
+        adr_engine.evaluate(link, current)
+    new_config = adr_engine.select(current, RADIO_CONFIG)
+    if not new_config:
+        return
+
+    # Émetteurs et récepteurs partagent la configuration du lien le plus exigeant
+    print(f"📶 ADR: {current.to_rfcfg()} -> {new_config.to_rfcfg()}")
+    device_pool.apply_radio_config(new_config)
+    event_bus.publish('radio_config_changed', new_config.to_dict())
+
 @socketio.on('connect')
 def handle_connect():
     """Gestion de la connexion WebSocket"""
+    event_bus.add_client(request.sid)
     emit('connected', {'message': 'Connecté au serveur LoRa'})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Gestion de la déconnexion WebSocket"""
+    event_bus.remove_client(request.sid)
     print('Client déconnecté')
 
 if __name__ == '__main__':
@@ -335,4 +1017,6 @@ if __name__ == '__main__':
     print(f" Serveur LoRa sécurisé démarré sur le port {port}")
     print(f"📡 Interface web: http://localhost:{port}")
 
+    start_services()
+
     socketio.run(app, host='0.0.0.0', port=port, debug=debug)
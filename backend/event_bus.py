@@ -0,0 +1,215 @@
+import os
+import sys
+import time
+from collections import deque
+from threading import Thread, Lock
+from typing import Dict, Optional
+
+# Ajouter le dossier shared au path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
+
+from metrics import REGISTRY, STAGE_SECONDS
+
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_COLLAPSE = "collapse"
+POLICIES = [POLICY_DROP_OLDEST, POLICY_COLLAPSE]
+
+# Événements dont seule la dernière valeur compte: fusionnés dans une fenêtre
+LATEST_ONLY_EVENTS = {"radio_config_changed"}
+
+EVENTS_DROPPED = REGISTRY.counter("lora_socketio_events_dropped_total",
+                                  "Événements socket.io abandonnés pour un client lent", label="policy")
+
+
+class _ClientQueue:
+    """File bornée d'un client, avec au plus un lot en attente d'acquittement"""
+
+    def __init__(self, max_queue: int):
+        self.events = deque()
+        self.max_queue = max_queue
+        self.dropped = 0
+        self.resync = False
+        self.in_flight_since: Optional[float] = None
+
+
+class EventBus:
+    """Diffusion socket.io groupée, sans jamais bloquer les threads radio
+
+    publish() ajoute l'événement à un tampon et rend la main. Un thread
+    répartit le tampon toutes les window secondes dans une file bornée par
+    client, puis émet un seul 'messages_batch' par client. Un client qui
+    n'a pas acquitté son lot précédent n'en reçoit pas d'autre: sa file se
+    remplit, puis la politique s'applique (drop_oldest: les plus anciens
+    sont abandonnés et comptés; collapse: la file est remplacée par un
+    marqueur 'resync' et le client recharge l'historique).
+    """
+
+    def __init__(self, socketio, window: float = 0.1, max_queue: int = 200,
+                 policy: str = POLICY_DROP_OLDEST, ack_timeout: float = 5.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Politique inconnue: {policy}")
+        self.socketio = socketio
+        self.window = window
+        self.max_queue = max_queue
+        self.policy = policy
+        self.ack_timeout = ack_timeout
+
+        self.lock = Lock()
+        self.pending = deque()
+        self.clients: Dict[str, _ClientQueue] = {}
+        self.running = False
+        self.thread: Thread = None
+        self.batches_sent = 0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self.thread = None
+
+    def publish(self, event: str, data=None):
+        """Publier un événement pour tous les clients (appel non bloquant)"""
+        # deque.append est atomique: pas de verrou sur le chemin radio
+        self.pending.append((event, data))
+
+    def add_client(self, sid: str):
+        with self.lock:
+            self.clients[sid] = _ClientQueue(self.max_queue)
+
+    def remove_client(self, sid: str):
+        with self.lock:
+            self.clients.pop(sid, None)
+
+    def _enqueue(self, client: _ClientQueue, event: str, data):
+        if event in LATEST_ONLY_EVENTS:
+            # Remplacer la valeur en attente plutôt que d'en empiler une autre
+            for i, (queued_event, _) in enumerate(client.events):
+                if queued_event == event:
+                    del client.events[i]
+                    break
+
+        if len(client.events) >= client.max_queue:
+            EVENTS_DROPPED.inc(self.policy, len(client.events) if self.policy == POLICY_COLLAPSE else 1)
+            if self.policy == POLICY_COLLAPSE:
+                client.dropped += len(client.events)
+                client.events.clear()
+                client.resync = True
+            else:
+                client.events.popleft()
+                client.dropped += 1
+        client.events.append((event, data))
+
+    def _run(self):
+        while self.running:
+            time.sleep(self.window)
+            try:
+                self._dispatch()
+            except Exception as e:
+                print(f"Erreur de diffusion socket.io: {e}")
+
+    def _dispatch(self):
+        events = []
+        while self.pending:
+            events.append(self.pending.popleft())
+
+        now = time.monotonic()
+        to_send = []
+        with self.lock:
+            for sid, client in self.clients.items():
+                for event, data in events:
+                    self._enqueue(client, event, data)
+
+                if client.in_flight_since is not None:
+                    if now - client.in_flight_since < self.ack_timeout:
+                        continue  # Lot précédent pas encore acquitté
+                    client.in_flight_since = None
+                if not client.events and not client.resync:
+                    continue
+
+                batch = {
+                    "events": [{"event": event, "data": data} for event, data in client.events],
+                    "dropped": client.dropped,
+                    "resync": client.resync
+                }
+                client.events.clear()
+                client.dropped = 0
+                client.resync = False
+                client.in_flight_since = now
+                to_send.append((sid, batch))
+
+        for sid, batch in to_send:
+            with STAGE_SECONDS.time("socketio_emit"):
+                self.socketio.emit("messages_batch", batch, to=sid, callback=self._acknowledger(sid))
+            self.batches_sent += 1
+
+    def _acknowledger(self, sid: str):
+        def acknowledge(*args):
+            with self.lock:
+                client = self.clients.get(sid)
+                if client:
+                    client.in_flight_since = None
+        return acknowledge
+
+    def get_status(self) -> dict:
+        with self.lock:
+            return {
+                "window_s": self.window,
+                "policy": self.policy,
+                "pending": len(self.pending),
+                "batches_sent": self.batches_sent,
+                "clients": {
+                    sid: {"queued": len(client.events), "awaiting_ack": client.in_flight_since is not None}
+                    for sid, client in self.clients.items()
+                }
+            }
+
+
+def test_event_bus():
+    """Tester le regroupement et la politique d'un client lent"""
+
+    class _RecordingSocketIO:
+        def __init__(self):
+            self.emitted = []
+
+        def emit(self, event, data, to=None, callback=None):
+            self.emitted.append((to, data, callback))
+
+    socketio = _RecordingSocketIO()
+    bus = EventBus(socketio, max_queue=5, policy=POLICY_DROP_OLDEST)
+    bus.add_client("fast")
+    bus.add_client("slow")
+
+    for i in range(3):
+        bus.publish("message_received", {"id": i})
+    bus.publish("radio_config_changed", {"sf": 9})
+    bus.publish("radio_config_changed", {"sf": 10})
+    bus._dispatch()
+    assert len(socketio.emitted) == 2
+    _, batch, ack = socketio.emitted[0]
+    assert len(batch["events"]) == 4 and batch["events"][-1]["data"] == {"sf": 10}
+
+    # Seul le client rapide acquitte: le lent accumule puis perd les plus anciens
+    socketio.emitted[0][2]()
+    for i in range(3, 12):
+        bus.publish("message_received", {"id": i})
+    bus._dispatch()
+    assert [to for to, _, _ in socketio.emitted[2:]] == ["fast"]
+    assert len(bus.clients["slow"].events) == 5 and bus.clients["slow"].dropped == 4
+
+    bus.ack_timeout = 0
+    bus._dispatch()
+    slow_batch = socketio.emitted[-1][1]
+    assert slow_batch["dropped"] == 4 and slow_batch["events"][0]["data"] == {"id": 7}
+    print(f"Statut: {bus.get_status()}")
+    print("⚪️ Test du bus d'événements réussi!")
+
+
+if __name__ == "__main__":
+    test_event_bus()
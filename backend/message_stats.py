@@ -0,0 +1,185 @@
+import time
+import bisect
+from threading import Lock
+from typing import List, Optional
+
+DIRECTIONS = ["sent", "received"]
+
+# Bornes supérieures des histogrammes (la dernière classe est +inf)
+LATENCY_BUCKETS_MS = [10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+SIZE_BUCKETS_BYTES = [16, 32, 64, 128, 192, 240, 255, 512, 1024]
+
+
+class Histogram:
+    """Histogramme à classes fixes (comptes, somme, min/max)"""
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.total,
+            "avg": round(self.sum / self.total, 2) if self.total else None,
+            "min": self.min,
+            "max": self.max,
+            # Liste ordonnée (un dict JSON serait trié par clé), le: borne supérieure
+            "buckets": [{"le": bound, "count": count}
+                        for bound, count in zip(self.bounds + ["+Inf"], self.counts)]
+        }
+
+
+class RateWindow:
+    """Compteur glissant sur un anneau de tranches de durée fixe"""
+
+    def __init__(self, slots: int, slot_seconds: int = 1):
+        self.slot_seconds = slot_seconds
+        self.counts = [0] * slots
+        self.slot_ids = [0] * slots
+
+    def add(self, now: float, count: int = 1):
+        slot_id = int(now) // self.slot_seconds
+        index = slot_id % len(self.counts)
+        if self.slot_ids[index] != slot_id:
+            self.slot_ids[index] = slot_id
+            self.counts[index] = 0
+        self.counts[index] += count
+
+    def total(self, now: float) -> int:
+        oldest = int(now) // self.slot_seconds - len(self.counts)
+        return sum(count for count, slot_id in zip(self.counts, self.slot_ids) if slot_id > oldest)
+
+
+class MessageStats:
+    """Statistiques de messages tenues à jour à chaque message
+
+    Chaque lecture est en temps constant (les fenêtres glissantes ont une
+    taille fixe) et se fait sous le même verrou que les mises à jour: un
+    instantané est toujours cohérent entre compteurs.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        """Remettre tous les compteurs à zéro (effacement de l'historique)"""
+        with self.lock:
+            self.total = 0
+            self.by_direction = {direction: 0 for direction in DIRECTIONS}
+            self.by_priority = {}
+            self.bytes_on_air = {direction: 0 for direction in DIRECTIONS}
+            self.latency_ms = {direction: Histogram(LATENCY_BUCKETS_MS) for direction in DIRECTIONS}
+            self.payload_size = Histogram(SIZE_BUCKETS_BYTES)
+            self.last_minute = RateWindow(60)
+            self.last_15_minutes = RateWindow(15, slot_seconds=60)
+            self.started_at = time.time()
+
+    def load(self, rows: List[tuple]):
+        """Initialiser les compteurs depuis l'historique persistant
+
+        rows: (direction, priorité, nombre, octets) agrégés par le stockage.
+        """
+        with self.lock:
+            for direction, priority, count, size in rows:
+                self.total += count
+                self.by_direction[direction] = self.by_direction.get(direction, 0) + count
+                priority = priority or "normal"
+                self.by_priority[priority] = self.by_priority.get(priority, 0) + count
+                self.bytes_on_air[direction] = self.bytes_on_air.get(direction, 0) + (size or 0)
+
+    def forget(self, rows: List[tuple]):
+        """Retirer des compteurs les messages supprimés de l'historique (rétention)
+
+        rows: (direction, priorité, nombre, octets), comme pour load. Les
+        histogrammes et les débits glissants décrivent les messages observés
+        et restent inchangés.
+        """
+        with self.lock:
+            for direction, priority, count, size in rows:
+                self.total -= count
+                self.by_direction[direction] = self.by_direction.get(direction, 0) - count
+                priority = priority or "normal"
+                self.by_priority[priority] = self.by_priority.get(priority, 0) - count
+                if not self.by_priority[priority]:
+                    del self.by_priority[priority]
+                self.bytes_on_air[direction] = self.bytes_on_air.get(direction, 0) - (size or 0)
+
+    def record(self, entry: dict, latency: float = None):
+        """Comptabiliser un message ajouté à l'historique (latence en secondes)"""
+        direction = entry["direction"]
+        priority = (entry.get("metadata") or {}).get("priority", "normal")
+        size = entry.get("encrypted_size") or 0
+        now = time.time()
+
+        with self.lock:
+            self.total += 1
+            self.by_direction[direction] = self.by_direction.get(direction, 0) + 1
+            self.by_priority[priority] = self.by_priority.get(priority, 0) + 1
+            self.bytes_on_air[direction] = self.bytes_on_air.get(direction, 0) + size
+            self.payload_size.observe(size)
+            if latency is not None and direction in self.latency_ms:
+                self.latency_ms[direction].observe(round(latency * 1000, 1))
+            self.last_minute.add(now)
+            self.last_15_minutes.add(now)
+
+    def snapshot(self) -> dict:
+        """Instantané cohérent de tous les compteurs"""
+        now = time.time()
+        with self.lock:
+            window_15 = min(900.0, max(60.0, now - self.started_at))
+            return {
+                "total_messages": self.total,
+                "sent_messages": self.by_direction.get("sent", 0),
+                "received_messages": self.by_direction.get("received", 0),
+                "by_priority": dict(self.by_priority),
+                "bytes_on_air": dict(self.bytes_on_air),
+                "messages_per_minute": {
+                    "last_1m": self.last_minute.total(now),
+                    "avg_15m": round(self.last_15_minutes.total(now) * 60 / window_15, 2)
+                },
+                "latency_ms": {direction: h.to_dict() for direction, h in self.latency_ms.items()},
+                "payload_size_bytes": self.payload_size.to_dict()
+            }
+
+
+def test_message_stats():
+    """Tester les compteurs, les fenêtres et les histogrammes"""
+    stats = MessageStats()
+    stats.load([("sent", "high", 3, 300), ("received", None, 2, 100)])
+    for i in range(10):
+        stats.record({"direction": "received", "metadata": {"priority": "low"}, "encrypted_size": 40 + i},
+                     latency=0.02 * i)
+
+    snapshot = stats.snapshot()
+    assert snapshot["total_messages"] == 15 and snapshot["received_messages"] == 12
+    assert snapshot["by_priority"] == {"high": 3, "normal": 2, "low": 10}
+    assert snapshot["messages_per_minute"]["last_1m"] == 10
+    assert snapshot["latency_ms"]["received"]["count"] == 10
+    assert snapshot["payload_size_bytes"]["buckets"][2] == {"le": 64, "count": 10}
+
+    # Messages supprimés par la rétention
+    stats.forget([("sent", "high", 3, 300), ("received", "low", 4, 160)])
+    snapshot = stats.snapshot()
+    assert snapshot["total_messages"] == 8 and snapshot["sent_messages"] == 0
+    assert snapshot["by_priority"] == {"normal": 2, "low": 6} and snapshot["bytes_on_air"]["sent"] == 0
+
+    stats.reset()
+    assert stats.snapshot()["total_messages"] == 0
+    print(f"Statistiques: {snapshot['messages_per_minute']}")
+    print("⚪️ Test des statistiques réussi!")
+
+
+if __name__ == "__main__":
+    test_message_stats()
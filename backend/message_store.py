@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+from threading import Thread, Lock, Event
+from typing import Callable, List, Tuple
+
+DEFAULT_DATABASE_URL = "sqlite:///lora_messages.db"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    direction TEXT NOT NULL,
+    sender TEXT,
+    created_at REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    message TEXT NOT NULL,
+    metadata TEXT,
+    encrypted_size INTEGER,
+    signal_info TEXT,
+    delivery TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_direction ON messages (direction, id);
+CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages (sender, id);
+CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages (created_at);
+"""
+
+# Colonnes ajoutées depuis la première version du schéma
+MIGRATIONS = {
+    "delivery": "ALTER TABLE messages ADD COLUMN delivery TEXT",
+}
+
+
+def database_path_from_url(url: str, base_dir: str = None) -> str:
+    """sqlite:///chemin/relatif.db, sqlite:////chemin/absolu.db ou sqlite:///:memory:
+
+    Un chemin relatif est résolu depuis base_dir (sinon le dossier courant).
+    """
+    if not url.startswith("sqlite:///"):
+        raise ValueError(f"Seules les bases SQLite sont supportées: {url}")
+    path = url[len("sqlite:///"):]
+    if base_dir and path != ":memory:" and not os.path.isabs(path):
+        path = os.path.join(base_dir, path)
+    return path
+
+
+class MessageStore:
+    """Historique des messages dans SQLite (WAL), avec commits groupés
+
+    Les insertions restent dans une transaction ouverte jusqu'à batch_size
+    messages ou flush_interval secondes; la même connexion voit ses propres
+    écritures, l'historique est donc toujours à jour. La pagination par
+    curseur (id) et les index gardent le coût d'une lecture indépendant du
+    volume conservé. La rétention supprime les messages plus vieux que
+    max_age secondes ou au-delà de max_messages, puis passe l'agrégat des
+    messages supprimés à on_purge (même forme que aggregate()).
+    """
+
+    def __init__(self, path: str, batch_size: int = 50, flush_interval: float = 0.5,
+                 max_age: float = None, max_messages: int = None, retention_interval: float = 60.0,
+                 on_purge: Callable[[List[tuple]], None] = None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_age = max_age
+        self.max_messages = max_messages
+        self.retention_interval = retention_interval
+        self.on_purge = on_purge
+
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(messages)")}
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                self.conn.execute(statement)
+
+        self.pending = 0
+        self.in_transaction = False
+        self.last_retention = 0.0
+
+        self.stop_event = Event()
+        self.flusher = Thread(target=self._flush_loop, daemon=True)
+        self.flusher.start()
+        atexit.register(self.flush)
+
+    @classmethod
+    def from_url(cls, url: str, base_dir: str = None, **kwargs) -> 'MessageStore':
+        return cls(database_path_from_url(url, base_dir), **kwargs)
+
+    def add(self, entry: dict) -> dict:
+        """Enregistrer un message, l'entrée reçoit son identifiant définitif"""
+        metadata = entry.get("metadata") or {}
+        with self.lock:
+            if not self.in_transaction:
+                self.conn.execute("BEGIN")
+                self.in_transaction = True
+            cursor = self.conn.execute(
+                "INSERT INTO messages (direction, sender, created_at, timestamp, message, metadata,"
+                " encrypted_size, signal_info, delivery) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry["direction"], metadata.get("sender"), time.time(), entry["timestamp"],
+                 entry["message"], json.dumps(metadata), entry.get("encrypted_size"),
+                 json.dumps(entry["signal_info"]) if entry.get("signal_info") else None,
+                 json.dumps(entry["delivery"]) if entry.get("delivery") else None)
+            )
+            entry["id"] = cursor.lastrowid
+            self.pending += 1
+            if self.pending >= self.batch_size:
+                self._commit()
+        return entry
+
+    def set_delivery(self, entry_id: int, delivery: dict):
+        """Mettre à jour l'état de livraison d'un message envoyé (accusé reçu, échec...)"""
+        with self.lock:
+            if not self.in_transaction:
+                self.conn.execute("BEGIN")
+                self.in_transaction = True
+            self.conn.execute("UPDATE messages SET delivery = ? WHERE id = ?", (json.dumps(delivery), entry_id))
+            self.pending += 1
+            if self.pending >= self.batch_size:
+                self._commit()
+
+    def _commit(self):
+        if self.in_transaction:
+            self.conn.execute("COMMIT")
+            self.in_transaction = False
+            self.pending = 0
+
+    def flush(self):
+        """Valider les insertions en attente"""
+        with self.lock:
+            self._commit()
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+                if time.time() - self.last_retention >= self.retention_interval:
+                    self.apply_retention()
+            except sqlite3.Error as e:
+                print(f"Erreur de l'historique SQLite: {e}")
+
+    def list(self, after_id: int = None, before_id: int = None, limit: int = DEFAULT_PAGE_SIZE,
+             direction: str = None, sender: str = None, since: float = None,
+             until: float = None) -> Tuple[List[dict], bool]:
+        """Lire une page de messages, en ordre chronologique
+
+        after_id donne la page suivante (messages plus récents), before_id
+        ou aucun curseur la page qui précède (par défaut les plus récents).
+        Retourne (messages, has_more).
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses, params = [], []
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+        if before_id is not None:
+            clauses.append("id < ?")
+            params.append(before_id)
+        if direction:
+            clauses.append("direction = ?")
+            params.append(direction)
+        if sender:
+            clauses.append("sender = ?")
+            params.append(sender)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "ASC" if after_id is not None else "DESC"
+        query = f"SELECT * FROM messages {where} ORDER BY id {order} LIMIT ?"
+
+        with self.lock:
+            rows = self.conn.execute(query, params + [limit + 1]).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if order == "DESC":
+            rows.reverse()
+        return [self._row_to_entry(row) for row in rows], has_more
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row) -> dict:
+        entry = {
+            "id": row["id"],
+            "message": row["message"],
+            "direction": row["direction"],
+            "timestamp": row["timestamp"],
+            "metadata": json.loads(row["metadata"]) if row["metadata"] else {},
+            "encrypted_size": row["encrypted_size"]
+        }
+        if row["signal_info"]:
+            entry["signal_info"] = json.loads(row["signal_info"])
+        if row["delivery"]:
+            entry["delivery"] = json.loads(row["delivery"])
+        return entry
+
+    def count(self, direction: str = None) -> int:
+        with self.lock:
+            if direction:
+                return self.conn.execute("SELECT COUNT(*) FROM messages WHERE direction = ?",
+                                         (direction,)).fetchone()[0]
+            return self.conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def aggregate(self) -> List[tuple]:
+        """(direction, priorité, nombre, octets) sur tout l'historique, lu au démarrage"""
+        with self.lock:
+            return self._aggregate()
+
+    def _aggregate(self, where: str = "", params: tuple = ()) -> List[tuple]:
+        return [tuple(row) for row in self.conn.execute(
+            "SELECT direction, json_extract(metadata, '$.priority'), COUNT(*), SUM(encrypted_size)"
+            f" FROM messages {where} GROUP BY 1, 2", params
+        )]
+
+    def _purge(self, where: str, params: tuple, purged: List[tuple]) -> int:
+        """Supprimer les messages sélectionnés, leur agrégat est ajouté à purged"""
+        purged.extend(self._aggregate(where, params))
+        return self.conn.execute(f"DELETE FROM messages {where}", params).rowcount
+
+    def clear(self):
+        """Effacer tout l'historique"""
+        with self.lock:
+            self._commit()
+            self.conn.execute("DELETE FROM messages")
+
+    def apply_retention(self) -> int:
+        """Supprimer les messages hors rétention, retourne le nombre supprimé"""
+        deleted = 0
+        purged = []
+        with self.lock:
+            self.last_retention = time.time()
+            self._commit()
+            self.conn.execute("BEGIN")
+            try:
+                if self.max_age:
+                    deleted += self._purge("WHERE created_at < ?", (time.time() - self.max_age,), purged)
+                if self.max_messages:
+                    # Conserver les max_messages plus récents (parcours de l'index primaire)
+                    row = self.conn.execute("SELECT id FROM messages ORDER BY id DESC LIMIT 1 OFFSET ?",
+                                            (self.max_messages,)).fetchone()
+                    if row:
+                        deleted += self._purge("WHERE id <= ?", (row[0],), purged)
+                self.conn.execute("COMMIT")
+            except sqlite3.Error:
+                self.conn.execute("ROLLBACK")
+                raise
+        if purged and self.on_purge:
+            # Statistiques tenues à jour des messages supprimés
+            self.on_purge(purged)
+        return deleted
+
+    def close(self):
+        self.stop_event.set()
+        self.flusher.join(timeout=1.0)
+        with self.lock:
+            self._commit()
+            self.conn.close()
+
+
+def test_message_store():
+    """Tester la pagination, les filtres et la rétention"""
+    purged = []
+    store = MessageStore(":memory:", batch_size=10, on_purge=purged.extend)
+    for i in range(25):
+        store.add({
+            "message": f"msg {i}",
+            "direction": "sent" if i % 2 else "received",
+            "timestamp": "2024-01-01T00:00:00",
+            "metadata": {"sender": f"node_{i % 3}"},
+            "encrypted_size": 40
+        })
+
+    latest, has_more = store.list(limit=10)
+    assert [m["id"] for m in latest] == list(range(16, 26)) and has_more
+    older, _ = store.list(before_id=latest[0]["id"], limit=10)
+    assert older[-1]["id"] == 15
+    newer, has_more = store.list(after_id=20, limit=10)
+    assert [m["id"] for m in newer] == [21, 22, 23, 24, 25] and not has_more
+
+    sent, _ = store.list(direction="sent", sender="node_1", limit=100)
+    assert all(m["direction"] == "sent" and m["metadata"]["sender"] == "node_1" for m in sent)
+
+    # État de livraison mis à jour à l'arrivée de l'accusé
+    store.set_delivery(sent[0]["id"], {"status": "delivered", "attempts": 1})
+    assert store.list(after_id=sent[0]["id"] - 1, limit=1)[0][0]["delivery"]["status"] == "delivered"
+
+    assert sum(count for _, _, count, _ in store.aggregate()) == 25
+
+    store.max_messages = 5
+    assert store.apply_retention() == 20 and store.count() == 5
+    assert database_path_from_url("sqlite:///lora.db", "/srv/backend") == "/srv/backend/lora.db"
+    assert database_path_from_url("sqlite:////var/lora.db", "/srv/backend") == "/var/lora.db"
+    assert sum(count for _, _, count, _ in purged) == 20 and sum(size for *_, size in purged) == 800
+    store.close()
+    print("⚪️ Test de l'historique SQLite réussi!")
+
+
+if __name__ == "__main__":
+    test_message_store()
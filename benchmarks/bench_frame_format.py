@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Comparaison taille/débit/temps d'émission entre l'enveloppe JSON, la trame
+binaire compacte et le nonce implicite
+"""
+
+import sys
+import os
+import time
+
+# Ajouter le dossier shared au path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
+
+from crypto_utils import SecureCrypto, NONCE_IMPLICIT
+from frame_codec import FORMAT_JSON, FORMAT_BINARY
+from compression import PayloadCompressor
+from replay_protection import SequenceCounter
+from lora_module import RadioConfig, time_on_air
+
+# Corpus de messages réels (scripts de test et trafic de l'interface web)
+CORPUS = [
+    "hello",
+    "OK",
+    "Hello LoRa World!",
+    "Test de chiffrement AES-256",
+    "Communication sécurisée établie ⚪️",
+    "Message avec émojis",
+    "Message chiffré #2",
+    "Test de sécurité LoRa",
+    "Batterie faible",
+    "Capteur 3: température 21.5C",
+    "Test de message plus long pour vérifier la capacité de transmission des données chiffrées",
+]
+
+PRIORITIES = ["low", "normal", "high"]
+
+
+def build_corpus():
+    """Associer à chaque message les métadonnées envoyées par le backend"""
+    now = int(time.time())
+    return [
+        (message, {
+            'sender': 'web_interface',
+            'priority': PRIORITIES[i % len(PRIORITIES)],
+            'timestamp': now
+        })
+        for i, message in enumerate(CORPUS)
+    ]
+
+
+def bench_format(crypto: SecureCrypto, corpus, rounds: int = 200) -> dict:
+    """Mesurer la taille et le temps d'émission moyens, et le débit chiffrement + déchiffrement"""
+    sizes = [len(crypto.encrypt_message(msg, meta)) for msg, meta in corpus]
+    config = RadioConfig()
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for msg, meta in corpus:
+            crypto.decrypt_message(crypto.encrypt_message(msg, meta))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'avg_size': sum(sizes) / len(sizes),
+        'min_size': min(sizes),
+        'max_size': max(sizes),
+        'avg_airtime_ms': sum(time_on_air(size, config) for size in sizes) * 1000 / len(sizes),
+        'msgs_per_sec': rounds * len(corpus) / elapsed
+    }
+
+
+def main():
+    corpus = build_corpus()
+    key = SecureCrypto().key
+
+    print("⚪️ Comparaison des formats de trame")
+    print("=" * 50)
+
+    variants = {
+        FORMAT_JSON: SecureCrypto(key=key, frame_format=FORMAT_JSON),
+        FORMAT_BINARY: SecureCrypto(key=key, frame_format=FORMAT_BINARY),
+        'binary+deflate': SecureCrypto(key=key, frame_format=FORMAT_BINARY, compressor=PayloadCompressor()),
+        # Compteur de 4 octets au lieu du nonce, émetteur et séquence portés par le nonce
+        '+implicit': SecureCrypto(key=key, frame_format=FORMAT_BINARY, compressor=PayloadCompressor(),
+                                  sequence=SequenceCounter('web_interface'), nonce_mode=NONCE_IMPLICIT),
+    }
+
+    results = {}
+    for name, crypto in variants.items():
+        results[name] = bench_format(crypto, corpus)
+        r = results[name]
+        print(f"{name:>14}: {r['avg_size']:6.1f} bytes en moyenne "
+              f"(min {r['min_size']}, max {r['max_size']}) - {r['avg_airtime_ms']:5.1f} ms d'émission"
+              f" - {r['msgs_per_sec']:.0f} msg/s")
+
+    print("\n Détail par message (bytes chiffrés)")
+    for msg, meta in corpus:
+        sizes = [len(crypto.encrypt_message(msg, meta)) for crypto in variants.values()]
+        print("  " + " -> ".join(f"{size:4d}" for size in sizes) + f"  {msg[:40]}")
+
+    print()
+    for name in list(variants)[1:]:
+        gain = 1 - results[name]['avg_size'] / results[FORMAT_JSON]['avg_size']
+        airtime_gain = 1 - results[name]['avg_airtime_ms'] / results[FORMAT_JSON]['avg_airtime_ms']
+        print(f"Gain moyen ({name}): {gain * 100:.1f}% en taille, {airtime_gain * 100:.1f}% en temps d'émission")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Comparaison du cache anti-rejeu par tranches avec l'ancien set de SHA-256,
+et de la fenêtre glissante sur numéros de séquence
+"""
+
+import sys
+import os
+import time
+import hashlib
+import tracemalloc
+
+# Ajouter le dossier shared au path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
+
+from crypto_utils import MessageValidator
+
+
+class LegacyValidator:
+    """Ancienne implémentation: set de hash hexadécimaux vidé à 1000 entrées"""
+
+    def __init__(self, limit: int = 1000):
+        self.seen_messages = set()
+        self.max_age = 300
+        self.limit = limit
+
+    def validate_message(self, message, metadata):
+        timestamp = metadata.get("timestamp", 0)
+        if int(time.time()) - timestamp > self.max_age:
+            return False
+        message_hash = hashlib.sha256(f"{message}{timestamp}".encode()).hexdigest()
+        if message_hash in self.seen_messages:
+            return False
+        self.seen_messages.add(message_hash)
+        if len(self.seen_messages) > self.limit:
+            self.seen_messages.clear()
+        return True
+
+
+def bench_throughput(validator, count: int, numbered: bool = False) -> float:
+    """Validations par seconde sur des messages tous différents"""
+    now = int(time.time())
+    messages = [(f"Capteur {i % 50}: température {i}", {"timestamp": now - i % 200}) for i in range(count)]
+    if numbered:
+        for i, (_, metadata) in enumerate(messages):
+            metadata.update(sender=f"capteur_{i % 50}", seq=i // 50 + 1)
+    start = time.perf_counter()
+    for message, metadata in messages:
+        validator.validate_message(message, metadata)
+    return count / (time.perf_counter() - start)
+
+
+def bench_memory(factory, count: int, numbered: bool = False) -> float:
+    """Octets alloués par message suivi"""
+    now = int(time.time())
+    tracemalloc.start()
+    validator = factory()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        metadata = {"timestamp": now - i % 200}
+        if numbered:
+            metadata.update(sender=f"capteur_{i % 50}", seq=i // 50 + 1)
+        validator.validate_message(f"msg {i}", metadata)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / count
+
+
+def main():
+    count = 50000
+    variants = {
+        "set SHA-256 (ancien, sans limite)": (lambda: LegacyValidator(limit=10 ** 9), False),
+        "tranches 64 bits": (lambda: MessageValidator(), False),
+        "tranches + Bloom": (lambda: MessageValidator(bloom_threshold=2000), False),
+        "séquence + fenêtre glissante": (lambda: MessageValidator(), True),
+    }
+
+    print("⚪️ Cache anti-rejeu")
+    print("=" * 50)
+    for name, (factory, numbered) in variants.items():
+        rate = bench_throughput(factory(), count, numbered)
+        memory = bench_memory(factory, count, numbered)
+        print(f"{name:>34}: {rate:9.0f} validations/s - {memory:6.1f} bytes/message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Banc de mesure de bout en bout: chiffrement, LoRaDevice, liaison série,
+réception, déchiffrement et validation anti-rejeu
+
+Par défaut les deux modules sont émulés (modem_emulator) avec un temps
+d'émission réduit par --time-scale; --tx-port/--rx-port pour du matériel.
+Les résultats sont écrits en JSON et comparés à une référence si fournie.
+Avec l'émulateur, le temps CPU par message inclut les threads des modules
+émulés (même processus): à comparer entre exécutions émulées uniquement.
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+from threading import Lock, Event
+
+# Ajouter le dossier shared au path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
+
+from lora_module import LoRaDevice
+from fragmentation import DEFAULT_MTU
+from crypto_utils import SecureCrypto, MessageValidator, NONCE_MODES, NONCE_RANDOM
+from replay_protection import SequenceCounter
+from modem_emulator import RadioChannel
+
+DEFAULT_SIZES = [16, 64, 200]
+DEFAULT_RESULTS = os.path.join(os.path.dirname(__file__), "e2e_results.json")
+
+# Écart relatif toléré avant de signaler une régression
+DEFAULT_TOLERANCE = 0.15
+
+# Métrique -> sens favorable (+1: plus grand est meilleur)
+COMPARED_METRICS = {
+    "msgs_per_s": +1,
+    "latency_p50_ms": -1,
+    "latency_p95_ms": -1,
+    "latency_p99_ms": -1,
+    "cpu_ms_per_msg": -1
+}
+
+
+def percentile(values: list, p: float) -> float:
+    """Percentile au rang le plus proche (valeurs triées)"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+class _Receiver:
+    """Déchiffre et valide les trames reçues, mesure la latence de chaque message"""
+
+    def __init__(self, crypto: SecureCrypto, expected: int):
+        self.crypto = crypto
+        self.validator = MessageValidator()
+        self.expected = expected
+        self.sent_at = {}
+        self.latencies = []
+        self.rejected = 0
+        self.errors = 0
+        self.last_received = None
+        self.lock = Lock()
+        self.done = Event()
+
+    def on_frame(self, frame: bytes, signal_info: dict):
+        try:
+            message, metadata = self.crypto.decrypt_message(frame)
+        except Exception:
+            self.errors += 1
+            return
+        if not self.validator.validate_message(message, metadata):
+            self.rejected += 1
+            return
+
+        now = time.perf_counter()
+        with self.lock:
+            sent_at = self.sent_at.pop(metadata.get("seq"), None)
+            if sent_at is not None:
+                self.latencies.append(now - sent_at)
+                self.last_received = now
+            if len(self.latencies) >= self.expected:
+                self.done.set()
+
+
+def run_size(sender: LoRaDevice, receiver: LoRaDevice, size: int, count: int, rate: float,
+             drain_timeout: float, nonce_mode: str = NONCE_RANDOM) -> dict:
+    """Envoyer count messages de size octets et mesurer le pipeline complet"""
+    sequence = SequenceCounter(f"bench_{size}")
+    tx_crypto = SecureCrypto(frame_format="binary", sequence=sequence, nonce_mode=nonce_mode)
+    rx = _Receiver(SecureCrypto(key=tx_crypto.key, frame_format="binary", peers=[sequence.sender_id]), count)
+    receiver.on_frame = rx.on_frame
+
+    text = "x" * size
+    metadata = {"sender": f"bench_{size}"}
+    interval = 1.0 / rate if rate else 0.0
+    bytes_on_air = 0
+    airtime = 0.0
+    failures = 0
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for i in range(count):
+        if interval:
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        sent_at = time.perf_counter()
+        with rx.lock:
+            # Numéro que encrypt_message va attribuer (un seul thread émetteur)
+            rx.sent_at[sequence.value + 1] = sent_at
+        frame = tx_crypto.encrypt_message(text, metadata)
+        packets = sender.fragmenter.fragment(frame) if sender.fragmenter else [frame]
+        bytes_on_air += sum(len(packet) for packet in packets)
+        airtime += sender.frame_airtime(len(frame))
+        if not sender.send_data(frame):
+            failures += 1
+
+    sent_until = time.perf_counter()
+    rx.done.wait(drain_timeout)
+    cpu = time.process_time() - cpu_start
+    # Débit mesuré jusqu'au dernier message reçu, pas jusqu'à l'expiration de l'attente
+    elapsed = max(sent_until, rx.last_received or 0.0) - start
+    receiver.on_frame = None
+
+    latencies = sorted(latency * 1000 for latency in rx.latencies)
+    received = len(latencies)
+    return {
+        "size": size,
+        "sent": count - failures,
+        "received": received,
+        "lost": count - received,
+        "rejected": rx.rejected,
+        "decrypt_errors": rx.errors,
+        "msgs_per_s": round(received / elapsed, 2) if elapsed else 0.0,
+        "latency_p50_ms": _round(percentile(latencies, 50)),
+        "latency_p95_ms": _round(percentile(latencies, 95)),
+        "latency_p99_ms": _round(percentile(latencies, 99)),
+        "bytes_on_air": bytes_on_air,
+        "bytes_on_air_per_msg": round(bytes_on_air / count, 1),
+        "airtime_s": round(airtime, 3),
+        "cpu_ms_per_msg": _round(cpu * 1000 / max(received, 1), 3)
+    }
+
+
+def _round(value, digits: int = 2):
+    return round(value, digits) if value is not None else None
+
+
+def compare_with_baseline(results: list, baseline: dict, tolerance: float) -> list:
+    """Lister les régressions par rapport à une exécution de référence"""
+    reference = {entry["size"]: entry for entry in baseline.get("results", [])}
+    regressions = []
+    for entry in results:
+        base = reference.get(entry["size"])
+        if not base:
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            old, new = base.get(metric), entry.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change * direction < -tolerance:
+                regressions.append(f"{entry['size']} B: {metric} {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de mesure de bout en bout du pipeline LoRa chiffré")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Tailles de message en octets, séparées par des virgules")
+    parser.add_argument("--count", type=int, default=100, help="Messages par taille")
+    parser.add_argument("--rate", type=float, default=0.0, help="Messages par seconde (0: au plus vite)")
+    parser.add_argument("--time-scale", type=float, default=0.01,
+                        help="Facteur appliqué au temps d'émission émulé")
+    parser.add_argument("--loss", type=float, default=0.0, help="Probabilité de perte d'un paquet émulé")
+    parser.add_argument("--nonce", choices=NONCE_MODES, default=NONCE_RANDOM,
+                        help="Nonce GCM aléatoire (12 octets) ou implicite (compteur de 4 octets)")
+    parser.add_argument("--max-baudrate", type=int, default=0,
+                        help="Débit série négocié à la connexion (0: rester à 9600)")
+    parser.add_argument("--uart-timing", action="store_true",
+                        help="Émuler la durée de transfert sur la liaison série au débit courant")
+    parser.add_argument("--tx-port", help="Port série de l'émetteur (matériel)")
+    parser.add_argument("--rx-port", help="Port série du récepteur (matériel)")
+    parser.add_argument("--output", default=DEFAULT_RESULTS, help="Fichier de résultats JSON")
+    parser.add_argument("--baseline", help="Résultats de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Écart relatif toléré avant de signaler une régression")
+    args = parser.parse_args()
+
+    channel = None
+    if args.tx_port and args.rx_port:
+        tx_port, rx_port = args.tx_port, args.rx_port
+    else:
+        channel = RadioChannel(time_scale=args.time_scale, loss=args.loss, seed=1,
+                               uart_timing=args.uart_timing)
+        tx_port, rx_port = channel.add_modem("tx").port, channel.add_modem("rx").port
+
+    max_baudrate = args.max_baudrate or None
+    # Fragmentation des deux côtés: les plus grandes tailles dépassent un paquet LoRa
+    sender = LoRaDevice(tx_port, mtu=DEFAULT_MTU, max_baudrate=max_baudrate)
+    receiver = LoRaDevice(rx_port, mtu=DEFAULT_MTU, max_baudrate=max_baudrate)
+    results = []
+    try:
+        if not (sender.connect() and receiver.connect()):
+            print("⚫️ Erreur: connexion aux modules impossible")
+            return 1
+        # Lecture continue des deux côtés: l'émetteur attend TX DONE entre deux trames
+        receiver.start_streaming()
+        sender.start_streaming()
+
+        print("⚪️ Banc de mesure de bout en bout")
+        print("=" * 78)
+        print(f"{'taille':>6} | {'reçus':>7} | {'msg/s':>8} | {'p50 ms':>8} | {'p95 ms':>8} | "
+              f"{'p99 ms':>8} | {'o/msg':>6} | {'CPU ms':>7}")
+        for size in [int(size) for size in args.sizes.split(",")]:
+            entry = run_size(sender, receiver, size, args.count, args.rate,
+                             drain_timeout=max(5.0, args.count * 0.05), nonce_mode=args.nonce)
+            results.append(entry)
+            print(f"{size:>6} | {entry['received']:>3}/{args.count:<3} | {entry['msgs_per_s']:8.1f} | "
+                  f"{entry['latency_p50_ms'] or 0:8.2f} | {entry['latency_p95_ms'] or 0:8.2f} | "
+                  f"{entry['latency_p99_ms'] or 0:8.2f} | {entry['bytes_on_air_per_msg']:6.1f} | "
+                  f"{entry['cpu_ms_per_msg']:7.3f}")
+    finally:
+        receiver.disconnect()
+        sender.disconnect()
+        if channel:
+            print(f"Statistiques du canal: {channel.stats}")
+            channel.close()
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "config": {
+            "count": args.count,
+            "rate": args.rate,
+            "emulated": channel is not None,
+            "time_scale": args.time_scale if channel else 1.0,
+            "loss": args.loss if channel else None,
+            "nonce": args.nonce
+        },
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Résultats: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("⚫️ Régressions par rapport à la référence:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("⚪️ Aucune régression par rapport à la référence")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
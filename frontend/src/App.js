@@ -48,16 +48,45 @@ function App() {
       setConnectionStatus(prev => ({ ...prev, server_connected: false }));
     });
 
-    newSocket.on('message_sent', (message) => {
-      setMessages(prev => [...prev, message]);
-    });
+    // Événements regroupés par le serveur, acquittés pour recevoir le lot suivant
+    newSocket.on('messages_batch', async (batch, ack) => {
+      // File saturée côté serveur: l'historique rechargé contient déjà ces messages
+      if (batch.resync) {
+        try {
+          const response = await ApiService.getMessageHistory();
+          setMessages(response.messages);
+        } catch (error) {
+          console.error('Erreur de resynchronisation de l\'historique:', error);
+        }
+      }
 
-    newSocket.on('message_received', (message) => {
-      setMessages(prev => [...prev, message]);
-    });
+      const added = [];
+      const deliveries = {};
+      batch.events.forEach(({ event, data }) => {
+        if ((event === 'message_sent' || event === 'message_received') && !batch.resync) {
+          added.push(data);
+        } else if (event === 'message_delivery') {
+          deliveries[data.id] = data.delivery;
+        } else if (event === 'history_cleared') {
+          added.length = 0;
+          setMessages([]);
+        } else if (event === 'crypto_initialized' && data.status === 'done') {
+          setSystemInfo(prev => ({ ...prev, keyFingerprint: data.key_fingerprint }));
+        }
+      });
+      if (added.length > 0) {
+        setMessages(prev => [...prev, ...added]);
+      }
+      // Accusés de réception: état de livraison des messages envoyés
+      if (Object.keys(deliveries).length > 0) {
+        setMessages(prev => prev.map(message =>
+          deliveries[message.id] ? { ...message, delivery: deliveries[message.id] } : message
+        ));
+      }
 
-    newSocket.on('history_cleared', () => {
-      setMessages([]);
+      if (ack) {
+        ack();
+      }
     });
 
     setSocket(newSocket);
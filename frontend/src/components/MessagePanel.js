@@ -210,6 +210,13 @@ const MessagePanel = ({
                     {formatTimestamp(message.timestamp)}
                   </span>
 
+                  {message.delivery && (
+                    <span className={`message-delivery message-delivery-${message.delivery.status}`}>
+                      {message.delivery.status === 'delivered' ? '✓✓ Livré'
+                        : message.delivery.status === 'failed' ? '✗ Non livré' : '✓ En attente d\'accusé'}
+                    </span>
+                  )}
+
                   {message.signal_info && (
                     <div className={`message-signal ${
                       message.direction === 'sent' ? 'message-signal-sent' : 'message-signal-received'
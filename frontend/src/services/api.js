@@ -3,6 +3,9 @@ import axios from 'axios';
 // Configuration de base pour axios
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000';
 
+// Attente maximale d'un travail en arrière-plan (connexion LoRa, dérivation de clé)
+const BACKGROUND_JOB_TIMEOUT_MS = 60000;
+
 const api = axios.create({
   baseURL: API_BASE_URL,
   timeout: 30000, // Augmenté à 30 secondes pour la connexion LoRa
@@ -61,7 +64,7 @@ export class ApiService {
       receiver_port: receiverPort,
       baudrate: baudrate
     });
-    return response.data;
+    return ApiService.waitForLoRaOperation(response);
   }
 
   /**
@@ -69,7 +72,30 @@ export class ApiService {
    */
   static async disconnectLoRa() {
     const response = await api.post('/api/lora/disconnect');
-    return response.data;
+    return ApiService.waitForLoRaOperation(response);
+  }
+
+  /**
+   * Suivre une connexion/déconnexion lancée en arrière-plan jusqu'à la fin
+   */
+  static async waitForLoRaOperation(response) {
+    if (response.status !== 202) {
+      return response.data;
+    }
+
+    const { operation_id } = response.data;
+    const deadline = Date.now() + BACKGROUND_JOB_TIMEOUT_MS;
+    while (Date.now() < deadline) {
+      await new Promise((resolve) => setTimeout(resolve, 100));
+      const operation = await api.get(`/api/lora/operations/${operation_id}`);
+      if (operation.data.status === 'failed') {
+        throw new Error(operation.data.error);
+      }
+      if (operation.data.status === 'done') {
+        return operation.data;
+      }
+    }
+    throw new Error('Opération LoRa trop longue, vérifiez les modules');
   }
 
   /**
@@ -89,7 +115,31 @@ export class ApiService {
     const response = await api.post('/api/crypto/init', {
       password: password
     });
-    return response.data;
+    if (response.status !== 202) {
+      return response.data;
+    }
+
+    // Dérivation de clé en arrière-plan: suivre le travail jusqu'à la fin
+    const { job_id, generated_password } = response.data;
+    const deadline = Date.now() + BACKGROUND_JOB_TIMEOUT_MS;
+    while (Date.now() < deadline) {
+      await new Promise((resolve) => setTimeout(resolve, 200));
+      const job = await api.get(`/api/crypto/jobs/${job_id}`);
+      if (job.data.status === 'error') {
+        throw new Error(job.data.error);
+      }
+      if (job.data.status === 'done') {
+        return { ...job.data, generated_password };
+      }
+      if (job.data.status === 'superseded') {
+        // Remplacée par une autre initialisation ou un import: empreinte de la clé installée
+        if (!job.data.key_fingerprint) {
+          throw new Error(job.data.message);
+        }
+        return { ...job.data, generated_password: null };
+      }
+    }
+    throw new Error('Dérivation de clé trop longue, réessayez');
   }
 
   /**
@@ -0,0 +1,216 @@
+import math
+import time
+import random
+from collections import deque
+from typing import Dict, Optional
+
+from lora_module import RadioConfig
+
+# SNR minimal de démodulation par facteur d'étalement (dB, Semtech SX126x)
+REQUIRED_SNR = {7: -7.5, 8: -10.0, 9: -12.5, 10: -15.0, 11: -17.5, 12: -20.0}
+
+
+class _LinkState:
+    """Historique SNR d'un lien et configuration qui lui convient"""
+
+    def __init__(self, history: int):
+        self.snr = deque(maxlen=history)
+        self.last_change = 0.0
+        self.last_seen = 0.0
+        self.config: Optional[RadioConfig] = None
+
+
+class AdrEngine:
+    """Moteur de débit adaptatif (ADR) à partir du SNR mesuré par lien
+
+    La marge d'un lien est la moyenne glissante du SNR moins le SNR requis
+    pour le SF courant et la marge d'installation. Chaque pas de step_db
+    de marge permet de descendre d'un SF puis de baisser la puissance;
+    une marge négative fait remonter la puissance puis le SF. Aucune
+    décision n'est prise tant que la marge reste dans la bande
+    d'hystérésis, avant min_samples mesures, ni pendant holdoff secondes
+    après un changement.
+
+    Chaque lien garde sa propre configuration; select() applique à tous
+    les modules la plus robuste des liens actifs (SF et puissance les plus
+    hauts), pour ne perdre aucun pair. L'autre extrémité n'est pas
+    prévenue d'un changement: si elle ne suit pas, plus rien n'est reçu.
+    Un lien muet depuis silence_timeout secondes est donc oublié et, sans
+    lien actif, select() revient à la configuration de base.
+    """
+
+    def __init__(self, margin_db: float = 10.0, step_db: float = 3.0, hysteresis_db: float = 2.0,
+                 history: int = 20, min_samples: int = 5, holdoff: float = 30.0,
+                 min_sf: int = 7, max_sf: int = 12, min_power: int = 2, max_power: int = 14,
+                 power_step: int = 3, silence_timeout: float = 90.0):
+        self.margin_db = margin_db
+        self.step_db = step_db
+        self.hysteresis_db = hysteresis_db
+        self.history = history
+        self.min_samples = min_samples
+        self.holdoff = holdoff
+        self.min_sf = min_sf
+        self.max_sf = max_sf
+        self.min_power = min_power
+        self.max_power = max_power
+        self.power_step = power_step
+        self.silence_timeout = silence_timeout
+        self.links: Dict[str, _LinkState] = {}
+        self.changes = 0
+        self.silences = 0
+
+    def record(self, link: str, snr: float, now: float = None):
+        """Noter une trame reçue d'un lien, avec sa mesure de SNR si elle existe"""
+        state = self.links.setdefault(link, _LinkState(self.history))
+        state.last_seen = time.time() if now is None else now
+        if snr is not None:
+            state.snr.append(snr)
+
+    def get_margin(self, link: str, config: RadioConfig) -> Optional[float]:
+        """Marge SNR glissante du lien pour la configuration courante"""
+        state = self.links.get(link)
+        if not state or not state.snr:
+            return None
+        average = sum(state.snr) / len(state.snr)
+        return average - REQUIRED_SNR.get(config.sf, REQUIRED_SNR[12]) - self.margin_db
+
+    def evaluate(self, link: str, config: RadioConfig, now: float = None) -> Optional[RadioConfig]:
+        """Proposer une nouvelle configuration pour le lien (mesuré avec config), ou None si inchangée"""
+        now = time.time() if now is None else now
+        state = self.links.get(link)
+        if not state or len(state.snr) < self.min_samples or now - state.last_change < self.holdoff:
+            return None
+
+        margin = self.get_margin(link, config)
+        if -self.hysteresis_db <= margin < self.step_db + self.hysteresis_db:
+            return None
+
+        if margin > 0:
+            steps = int((margin - self.hysteresis_db) // self.step_db)
+        else:
+            steps = -math.ceil(-margin / self.step_db)
+
+        sf, power = config.sf, config.power
+        while steps > 0 and sf > self.min_sf:
+            sf -= 1
+            steps -= 1
+        while steps > 0 and power - self.power_step >= self.min_power:
+            power -= self.power_step
+            steps -= 1
+        while steps < 0 and power < self.max_power:
+            power = min(self.max_power, power + self.power_step)
+            steps += 1
+        while steps < 0 and sf < self.max_sf:
+            sf += 1
+            steps += 1
+
+        if sf == config.sf and power == config.power:
+            return None
+
+        # Les mesures faites avec l'ancienne configuration ne valent plus
+        state.snr.clear()
+        state.last_change = now
+        state.config = config.copy(sf=sf, power=power)
+        self.changes += 1
+        return state.config
+
+    def select(self, current: RadioConfig, base: RadioConfig, now: float = None) -> Optional[RadioConfig]:
+        """Configuration commune des modules: la plus robuste des liens actifs, base sans lien actif
+
+        Retourne None si current convient déjà.
+        """
+        now = time.time() if now is None else now
+        for link, state in list(self.links.items()):
+            if now - state.last_seen >= self.silence_timeout:
+                del self.links[link]
+                if state.config:
+                    self.silences += 1
+        configs = [state.config for state in self.links.values() if state.config]
+        sf = max((config.sf for config in configs), default=base.sf)
+        power = max((config.power for config in configs), default=base.power)
+        if sf == current.sf and power == current.power:
+            return None
+        # Mesures faites avec l'ancienne configuration commune: plus valables pour aucun lien
+        for state in self.links.values():
+            state.snr.clear()
+        return current.copy(sf=sf, power=power)
+
+    def get_status(self) -> dict:
+        return {
+            "changes": self.changes,
+            "silences": self.silences,
+            "silence_timeout_s": self.silence_timeout,
+            "links": {
+                link: {
+                    "samples": len(state.snr),
+                    "average_snr": round(sum(state.snr) / len(state.snr), 2) if state.snr else None,
+                    "sf": state.config.sf if state.config else None,
+                    "power": state.config.power if state.config else None,
+                    "last_seen": state.last_seen
+                }
+                for link, state in self.links.items()
+            }
+        }
+
+
+def simulate_adr(base_snr: float, start: RadioConfig, steps: int = 400, noise_db: float = 1.5,
+                 seed: int = 1, engine: AdrEngine = None) -> tuple:
+    """Simuler un lien: SNR = base_snr + (puissance - 14) + bruit gaussien
+
+    Retourne (configuration finale, nombre de changements).
+    """
+    rng = random.Random(seed)
+    engine = engine or AdrEngine(holdoff=5.0)
+    config = start
+    for tick in range(steps):
+        engine.record("sim", base_snr + (config.power - 14) + rng.gauss(0, noise_db), now=float(tick))
+        new_config = engine.evaluate("sim", config, now=float(tick))
+        if new_config:
+            config = new_config
+    return config, engine.changes
+
+
+def test_adr():
+    """Simulation: bon lien -> SF7, lien dégradé -> SF plus robuste, sans oscillation"""
+    good, changes = simulate_adr(base_snr=8.0, start=RadioConfig(sf=12))
+    assert good.sf == 7, good.to_rfcfg()
+    print(f"Bon lien: sf{good.sf}, {good.power} dBm après {changes} changements")
+
+    poor, changes = simulate_adr(base_snr=-10.0, start=RadioConfig(sf=7))
+    assert poor.sf == 12 and poor.power == 14, poor.to_rfcfg()
+    print(f"Lien dégradé: sf{poor.sf}, {poor.power} dBm après {changes} changements")
+
+    # Lien stable au seuil: le bruit seul ne doit pas provoquer d'oscillation
+    engine = AdrEngine(holdoff=5.0)
+    edge = RadioConfig(sf=9)
+    steady, changes = simulate_adr(base_snr=REQUIRED_SNR[9] + 10.0 + 1.0, start=edge, engine=engine)
+    assert changes == 0, changes
+    print(f"Lien au seuil: sf{steady.sf}, aucun changement")
+
+    # Deux pairs: les modules suivent le plus exigeant; un pair qui se tait est oublié
+    base = RadioConfig(sf=7)
+    engine = AdrEngine(holdoff=0.0, silence_timeout=60.0)
+    for tick in range(5):
+        engine.record("near", 8.0, now=float(tick))
+        engine.record("far", -12.0, now=float(tick))
+    near = engine.evaluate("near", base, now=5.0)
+    far = engine.evaluate("far", base, now=5.0)
+    assert near.sf == 7 and near.power < base.power and far.sf > 7
+    common = engine.select(base, base, now=5.0)
+    assert (common.sf, common.power) == (far.sf, far.power)
+    assert engine.select(common, base, now=6.0) is None
+    # Le pair lointain n'a pas suivi le changement: plus rien de lui, seul le proche compte
+    engine.record("near", 8.0, now=50.0)
+    assert engine.select(common, base, now=63.0) is None
+    reverted = engine.select(common, base, now=64.0)
+    assert (reverted.sf, reverted.power) == (near.sf, near.power) and list(engine.links) == ["near"]
+    # Plus aucun pair entendu: retour à la configuration de base
+    restored = engine.select(reverted, base, now=110.0)
+    assert (restored.sf, restored.power) == (base.sf, base.power) and engine.silences == 2
+    print(f"Deux pairs: sf{common.sf} commun, sf{reverted.sf} après le silence du pair lointain, "
+          f"base après le silence des deux")
+    print("⚪️ Test ADR réussi!")
+
+
+if __name__ == "__main__":
+    test_adr()
@@ -0,0 +1,587 @@
+import time
+import heapq
+import itertools
+from collections import OrderedDict
+from threading import Thread, Condition
+from typing import Callable, Dict, List, Optional
+
+from tx_scheduler import PRIORITY_LEVELS
+from metrics import REGISTRY
+
+# États de livraison d'une trame fiabilisée
+DELIVERY_PENDING = "pending"
+DELIVERY_DELIVERED = "delivered"
+DELIVERY_FAILED = "failed"
+
+# Séquences couvertes par un accusé (bitmap de 64 bits)
+ACK_SPAN = 64
+
+# Priorité d'émission des accusés: ils passent devant les données
+ACK_PRIORITY = "urgent"
+
+ARQ_FRAMES = REGISTRY.counter("lora_arq_frames_total",
+                              "Trames fiabilisées: livrées, échouées, retransmises", label="event")
+
+
+class _ArqFrame:
+    """Trame émise en attente d'accusé"""
+
+    def __init__(self, frame_id: int, seq: int, frame: bytes, priority: str, on_sent: Callable):
+        self.id = frame_id
+        self.seq = seq
+        self.frame = frame
+        self.priority = priority
+        self.level = PRIORITY_LEVELS.get(priority, PRIORITY_LEVELS["normal"])
+        self.on_sent = on_sent
+        self.callbacks: List[Callable] = []
+
+        self.attempts = 0
+        self.in_air = False        # Soumise à l'émetteur, TX DONE pas encore reçu
+        self.sent_at = None        # Fin de la dernière émission
+        self.deadline = None       # Retransmission si aucun accusé avant
+        self.fast_retransmitted = 0
+        self.reported = False
+        self.status = DELIVERY_PENDING
+        self.rtt = None
+
+    def info(self) -> dict:
+        return {"seq": self.seq, "attempts": self.attempts,
+                "rtt_ms": round(self.rtt * 1000, 1) if self.rtt is not None else None}
+
+
+class ArqSender:
+    """Fenêtre glissante de trames non acquittées, retransmission sélective
+
+    Au plus window trames sont en vol; les suivantes attendent une place,
+    par priorité. Une trame est retransmise seule, quand son délai expire
+    (RTO calculé sur le RTT mesuré, RFC 6298, doublé à chaque tentative)
+    ou dès qu'un accusé confirme une trame émise après elle. Après
+    max_attempts émissions sans accusé, elle est déclarée perdue.
+
+    submit(trame, priorité, on_sent(succès)) met la trame en file
+    d'émission; sequence_of(trame) donne son numéro de séquence, que
+    l'accusé du récepteur reprend. on_sent est appelé une fois, à la
+    première émission réussie (ou à l'échec définitif); watch(trame,
+    callback(état, info)) suit ensuite sa livraison. clock donne l'heure
+    des émissions et des accusés (time.monotonic par défaut).
+    """
+
+    def __init__(self, submit: Callable, sequence_of: Callable[[bytes], Optional[int]], window: int = 8,
+                 max_attempts: int = 5, initial_rto: float = 3.0, min_rto: float = 1.0, max_rto: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.submit_frame = submit
+        self.clock = clock
+        self.sequence_of = sequence_of
+        self.window = window
+        self.max_attempts = max_attempts
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.rto = initial_rto
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+
+        self.in_flight: Dict[int, _ArqFrame] = {}
+        self.waiting: List[tuple] = []
+        self.frames: Dict[bytes, _ArqFrame] = {}
+        # Livraisons récentes, pour un watch() arrivé après l'accusé
+        self.resolved: OrderedDict = OrderedDict()
+        self.condition = Condition()
+        self.ids = itertools.count(1)
+        self.running = False
+        self.thread: Thread = None
+
+        self.transmissions = 0
+        self.retransmissions = 0
+        self.fast_retransmissions = 0
+        self.delivered = 0
+        self.failed = 0
+        self.acks = 0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self.thread = None
+
+    def submit(self, frame: bytes, priority: str = "normal", on_sent: Callable = None) -> dict:
+        """Émettre une trame numérotée dès qu'une place se libère dans la fenêtre
+
+        Retourne le ticket de l'émetteur si la trame part tout de suite,
+        complété de "seq" et "window_position" (0: en vol).
+        """
+        seq = self.sequence_of(frame)
+        if type(seq) is not int:
+            raise Exception("Trame non numérotée: acquittement impossible")
+        item = _ArqFrame(next(self.ids), seq, frame, priority, on_sent)
+
+        with self.condition:
+            self.frames[frame] = item
+            send_now = len(self.in_flight) < self.window and not self.waiting
+            if send_now:
+                self.in_flight[seq] = item
+            else:
+                heapq.heappush(self.waiting, (-item.level, item.id, item))
+            position = 0 if send_now else len(self.waiting)
+
+        ticket = self._transmit(item) if send_now else None
+        return dict(ticket or {}, seq=seq, window_position=position)
+
+    def watch(self, frame: bytes, callback: Callable) -> bool:
+        """Suivre la livraison d'une trame: callback(état, info) à l'accusé ou à l'échec
+
+        Retourne False si la trame n'est pas fiabilisée.
+        """
+        with self.condition:
+            item = self.frames.get(frame)
+            if item and item.status == DELIVERY_PENDING:
+                item.callbacks.append(callback)
+                return True
+            resolved = item or self.resolved.get(frame)
+        if not resolved:
+            return False
+        self._call(callback, resolved)
+        return True
+
+    def _transmit(self, item: _ArqFrame) -> Optional[dict]:
+        with self.condition:
+            if item.status != DELIVERY_PENDING:
+                return None
+            item.attempts += 1
+            item.in_air = True
+            item.deadline = None
+            self.transmissions += 1
+            if item.attempts > 1:
+                self.retransmissions += 1
+        if item.attempts > 1:
+            ARQ_FRAMES.inc("retransmitted")
+        try:
+            return self.submit_frame(item.frame, item.priority, lambda success: self._on_tx_done(item, success))
+        except Exception as e:
+            print(f"⚫️ Trame {item.seq} non mise en file: {e}")
+            self._on_tx_done(item, False)
+            return None
+
+    def _on_tx_done(self, item: _ArqFrame, success: bool):
+        if success:
+            self._report(item, True)
+        with self.condition:
+            item.in_air = False
+            if item.status != DELIVERY_PENDING:
+                return
+            now = self.clock()
+            if success:
+                item.sent_at = now
+            # Attente de l'accusé: RTO doublé à chaque tentative
+            item.deadline = now + min(self.max_rto, self.rto * 2 ** (item.attempts - 1))
+            self.condition.notify_all()
+
+    def _report(self, item: _ArqFrame, success: bool):
+        """Appeler on_sent une seule fois par trame"""
+        with self.condition:
+            if item.reported:
+                return
+            item.reported = True
+        if item.on_sent:
+            try:
+                item.on_sent(success)
+            except Exception as e:
+                print(f"Erreur du callback d'émission: {e}")
+
+    def handle_ack(self, base: int, bitmap: int) -> int:
+        """Appliquer un accusé (bit i: séquence base - i reçue), retourne le nombre de trames livrées"""
+        now = self.clock()
+        acked = []
+        retransmit = []
+        with self.condition:
+            self.acks += 1
+            for seq, item in list(self.in_flight.items()):
+                if 0 <= base - seq < ACK_SPAN and bitmap >> (base - seq) & 1:
+                    acked.append(item)
+            latest = max((item.sent_at for item in acked if item.sent_at), default=None)
+            for item in acked:
+                if item.attempts == 1 and item.sent_at:
+                    # Algorithme de Karn: pas de mesure sur une trame retransmise
+                    self._update_rto(now - item.sent_at)
+                    item.rtt = now - item.sent_at
+                self._resolve(item, DELIVERY_DELIVERED)
+
+            # Retransmission rapide: une trame émise après celle-ci est arrivée, pas elle
+            if latest is not None:
+                for item in self.in_flight.values():
+                    if (not item.in_air and item.sent_at and item.sent_at < latest
+                            and item.fast_retransmitted < item.attempts < self.max_attempts):
+                        item.fast_retransmitted = item.attempts
+                        retransmit.append(item)
+                self.fast_retransmissions += len(retransmit)
+            started = self._fill_window()
+
+        for item in acked:
+            self._finish(item)
+        for item in retransmit:
+            ARQ_FRAMES.inc("fast_retransmitted")
+            self._transmit(item)
+        for item in started:
+            self._transmit(item)
+        return len(acked)
+
+    def _update_rto(self, rtt: float):
+        """Estimation du RTT lissé et de sa variance (RFC 6298)"""
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = max(self.min_rto, min(self.max_rto, self.srtt + 4 * self.rttvar))
+
+    def _resolve(self, item: _ArqFrame, status: str):
+        """Sortir la trame de la fenêtre (verrou tenu)"""
+        item.status = status
+        self.in_flight.pop(item.seq, None)
+        self.frames.pop(item.frame, None)
+        self.resolved[item.frame] = item
+        while len(self.resolved) > 256:
+            self.resolved.popitem(last=False)
+        if status == DELIVERY_DELIVERED:
+            self.delivered += 1
+        else:
+            self.failed += 1
+
+    def _fill_window(self) -> List[_ArqFrame]:
+        """Faire entrer les trames en attente dans la fenêtre (verrou tenu)"""
+        started = []
+        while self.waiting and len(self.in_flight) < self.window:
+            _, _, item = heapq.heappop(self.waiting)
+            self.in_flight[item.seq] = item
+            started.append(item)
+        return started
+
+    def _finish(self, item: _ArqFrame):
+        ARQ_FRAMES.inc(item.status)
+        self._report(item, item.status == DELIVERY_DELIVERED)
+        with self.condition:
+            callbacks, item.callbacks = item.callbacks, []
+        for callback in callbacks:
+            self._call(callback, item)
+
+    @staticmethod
+    def _call(callback: Callable, item: _ArqFrame):
+        try:
+            callback(item.status, item.info())
+        except Exception as e:
+            print(f"Erreur de notification de livraison: {e}")
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                now = self.clock()
+                expired = [item for item in self.in_flight.values()
+                           if not item.in_air and item.deadline is not None and item.deadline <= now]
+                if not expired:
+                    deadlines = [item.deadline for item in self.in_flight.values()
+                                 if not item.in_air and item.deadline is not None]
+                    self.condition.wait(min(deadlines) - now if deadlines else None)
+                    continue
+                failed = [item for item in expired if item.attempts >= self.max_attempts]
+                for item in failed:
+                    self._resolve(item, DELIVERY_FAILED)
+                retransmit = [item for item in expired if item.status == DELIVERY_PENDING]
+                for item in retransmit:
+                    item.deadline = None
+                started = self._fill_window()
+
+            for item in failed:
+                print(f"⚫️ Trame {item.seq} non acquittée après {item.attempts} émissions")
+                self._finish(item)
+            for item in retransmit + started:
+                self._transmit(item)
+
+    def get_status(self) -> dict:
+        with self.condition:
+            return {
+                "window": self.window,
+                "in_flight": len(self.in_flight),
+                "waiting": len(self.waiting),
+                "transmissions": self.transmissions,
+                "retransmissions": self.retransmissions,
+                "fast_retransmissions": self.fast_retransmissions,
+                "delivered": self.delivered,
+                "failed": self.failed,
+                "acks": self.acks,
+                "srtt_ms": round(self.srtt * 1000, 1) if self.srtt is not None else None,
+                "rto_ms": round(self.rto * 1000, 1)
+            }
+
+
+class _PeerWindow:
+    """Séquences reçues d'un émetteur: la plus haute et le bitmap des précédentes"""
+
+    def __init__(self, sender: str):
+        self.sender = sender
+        self.base = None
+        self.bitmap = 0
+        self.unacked = 0
+        self.since = None
+
+
+class ArqReceiver:
+    """Accusés de réception groupés pour les trames qui en demandent
+
+    Chaque trame reçue est notée dans un bitmap par émetteur (et par clé
+    en nonce implicite). L'accusé part delay secondes après la première
+    trame non acquittée, ou dès que max_pending trames l'attendent: un
+    seul accusé couvre les 64 dernières séquences. Une trame reçue en
+    double est acquittée à nouveau (l'accusé précédent a pu se perdre).
+
+    send_ack(émetteur, base, bitmap) chiffre et émet l'accusé.
+    """
+
+    def __init__(self, send_ack: Callable, delay: float = 0.1, max_pending: int = 4):
+        self.send_ack = send_ack
+        self.delay = delay
+        self.max_pending = max_pending
+
+        self.peers: Dict[tuple, _PeerWindow] = {}
+        self.condition = Condition()
+        self.running = False
+        self.thread: Thread = None
+
+        self.received = 0
+        self.acks_sent = 0
+        self.errors = 0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self.thread = None
+
+    def record(self, sender: str, seq: int, key_id: str = None):
+        """Noter la réception d'une trame demandant un accusé"""
+        with self.condition:
+            peer = self.peers.get((sender, key_id))
+            if peer is None:
+                peer = self.peers[(sender, key_id)] = _PeerWindow(sender)
+            if peer.base is None or seq > peer.base:
+                shift = seq - peer.base if peer.base is not None else ACK_SPAN
+                peer.bitmap = ((peer.bitmap << shift) | 1) & ((1 << ACK_SPAN) - 1) if shift < ACK_SPAN else 1
+                peer.base = seq
+            elif peer.base - seq < ACK_SPAN:
+                peer.bitmap |= 1 << (peer.base - seq)
+            else:
+                # Trop ancienne pour le bitmap: l'émetteur l'a déjà abandonnée
+                return
+            self.received += 1
+            peer.unacked += 1
+            if peer.since is None:
+                peer.since = time.monotonic()
+            if not self.running or peer.unacked >= self.max_pending:
+                ready = self._take([peer])
+            else:
+                ready = []
+                self.condition.notify_all()
+        self._send(ready)
+
+    def _take(self, peers: List[_PeerWindow]) -> List[tuple]:
+        """Accusés à émettre, remis à zéro (verrou tenu)"""
+        for peer in peers:
+            peer.unacked = 0
+            peer.since = None
+        return [(peer.sender, peer.base, peer.bitmap) for peer in peers]
+
+    def _send(self, acks: List[tuple]):
+        for sender, base, bitmap in acks:
+            try:
+                self.send_ack(sender, base, bitmap)
+                self.acks_sent += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"⚫️ Accusé pour {sender} non émis: {e}")
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                now = time.monotonic()
+                waiting = [peer for peer in self.peers.values() if peer.since is not None]
+                due = [peer for peer in waiting if peer.since + self.delay <= now]
+                if not due:
+                    self.condition.wait(min(peer.since + self.delay for peer in waiting) - now if waiting else None)
+                    continue
+                acks = self._take(due)
+            self._send(acks)
+
+    def get_status(self) -> dict:
+        with self.condition:
+            return {
+                "delay_s": self.delay,
+                "peers": len(self.peers),
+                "received": self.received,
+                "acks_sent": self.acks_sent,
+                "errors": self.errors
+            }
+
+
+def test_arq():
+    """Comparer l'attente d'accusé trame par trame et la fenêtre glissante sous 15% de pertes
+
+    Les pertes sont fixées (première émission de trames choisies) pour que
+    le test ne dépende pas du tirage du canal ni de l'ordonnancement.
+    """
+    from crypto_utils import SecureCrypto
+    from replay_protection import SequenceCounter
+    from device_pool import DevicePool, ROLE_TX, ROLE_RX
+    from lora_module import RadioConfig, DEFAULT_RFCFG
+    from modem_emulator import RadioChannel
+
+    # Trames dont la première émission est perdue (5 sur 30, environ 15%)
+    lost_indices = {3, 8, 14, 21, 27}
+
+    def run(window: int, count: int, lost: set, reliable: bool = True) -> tuple:
+        # Données sur un canal, accusés sur un autre: les deux sens ne se brouillent pas
+        channel = RadioChannel(time_scale=0.05, seed=3)
+        data = RadioConfig.from_rfcfg(DEFAULT_RFCFG)
+        acks = data.copy(frequency=865.525)
+        node_a, node_b = DevicePool(health_interval=0), DevicePool(health_interval=0)
+        node_a.add_devices([{"port": channel.add_modem("a_tx").port, "role": ROLE_TX, "radio_config": data},
+                            {"port": channel.add_modem("a_rx").port, "role": ROLE_RX, "radio_config": acks}])
+        node_b.add_devices([{"port": channel.add_modem("b_rx").port, "role": ROLE_RX, "radio_config": data},
+                            {"port": channel.add_modem("b_tx").port, "role": ROLE_TX, "radio_config": acks}])
+
+        crypto_a = SecureCrypto(frame_format="binary", sequence=SequenceCounter("node_a"))
+        crypto_b = SecureCrypto(key=crypto_a.key, frame_format="binary", sequence=SequenceCounter("node_b"))
+        receiver = ArqReceiver(lambda to, base, bitmap: node_b.submit(crypto_b.encrypt_ack(to, base, bitmap),
+                                                                       ACK_PRIORITY), delay=0.02)
+        dropped = set()
+
+        def lossy_submit(frame, priority, on_sent):
+            # Perte de la première émission: le module a émis, le récepteur n'a rien entendu
+            if frame in dropped:
+                dropped.discard(frame)
+                on_sent(True)
+                return None
+            return node_a.submit(frame, priority, on_sent)
+
+        sender = ArqSender(lossy_submit, crypto_a.frame_sequence, window=window, min_rto=0.1, initial_rto=0.3)
+        statuses = {}
+        received = set()
+        running = [True]
+
+        def listen(pool, handle):
+            while running[0]:
+                frame, _ = pool.receive_frame(timeout=0.1)
+                if frame:
+                    handle(*crypto_a.decrypt_frame(frame))
+
+        def on_data(messages, metadata):
+            if "acknowledgement" not in metadata:
+                received.add(messages[0][0])
+                receiver.record(metadata["sender"], metadata["seq"])
+
+        def on_ack(messages, metadata):
+            ack = metadata.get("acknowledgement")
+            if ack and ack["to"] == "node_a":
+                sender.handle_ack(ack["base"], ack["bitmap"])
+
+        threads = [Thread(target=listen, args=(node_b, on_data), daemon=True),
+                   Thread(target=listen, args=(node_a, on_ack), daemon=True)]
+        for thread in threads:
+            thread.start()
+        receiver.start()
+        sender.start()
+        try:
+            start = time.perf_counter()
+            for i in range(count):
+                frame = crypto_a.encrypt_message(f"mesure {i:03d} " + "x" * 80, {"ack": True})
+                if i in lost:
+                    dropped.add(frame)
+                if reliable:
+                    sender.submit(frame)
+                    sender.watch(frame, lambda status, info, i=i: statuses.__setitem__(i, status))
+                else:
+                    node_a.submit(frame, on_sent=lambda success, i=i: statuses.__setitem__(i, DELIVERY_PENDING))
+            while len(statuses) < count and time.perf_counter() - start < 20:
+                time.sleep(0.01)
+            elapsed = time.perf_counter() - start
+            return count / elapsed, statuses, received, sender.get_status()
+        finally:
+            running[0] = False
+            sender.stop()
+            receiver.stop()
+            for thread in threads:
+                thread.join()
+            node_a.close()
+            node_b.close()
+            channel.close()
+
+    line_rate, _, _, _ = run(8, 30, set(), reliable=False)
+    stop_and_wait, statuses, received, _ = run(1, 30, lost_indices)
+    assert all(status == DELIVERY_DELIVERED for status in statuses.values()) and len(received) == 30
+    windowed, statuses, received, status = run(8, 30, lost_indices)
+    assert len(statuses) == 30 and all(status == DELIVERY_DELIVERED for status in statuses.values()), statuses
+    # Chaque trame perdue est retransmise; un accusé lent peut en ajouter d'autres
+    assert len(received) == 30 and status["retransmissions"] >= len(lost_indices), status
+    print(f"Débit sans accusé ni perte: {line_rate:.1f} trames/s; 15% de pertes: "
+          f"fenêtre 1 {stop_and_wait:.1f} trames/s, fenêtre 8 {windowed:.1f} trames/s")
+    print(f"État: {status}")
+    assert windowed > stop_and_wait * 1.5 and windowed > line_rate * 0.5
+
+    # Horloge simulée, sans minuterie: seules les retransmissions rapides ont lieu, nombre exact
+    ticks = itertools.count()
+    sent = []
+    exact = ArqSender(lambda frame, priority, on_sent: on_sent(True) or sent.append(frame),
+                      lambda frame: frame[0], window=8, clock=lambda: next(ticks))
+    for seq in range(1, 9):
+        exact.submit(bytes([seq]))
+    # Séquences 3 et 6 perdues: l'accusé couvre 1-2, 4-5 et 7-8
+    received_bitmap = sum(1 << (8 - seq) for seq in (1, 2, 4, 5, 7, 8))
+    assert exact.handle_ack(8, received_bitmap) == 6
+    assert sent[8:] == [bytes([3]), bytes([6])]
+    assert exact.handle_ack(8, 0xFF) == 2
+    status = exact.get_status()
+    assert status["retransmissions"] == status["fast_retransmissions"] == 2, status
+    assert status["transmissions"] == 10 and status["delivered"] == 8 and status["in_flight"] == 0
+
+    # Trame jamais acquittée: échec après max_attempts émissions, fenêtre libérée
+    sent = []
+    lost = ArqSender(lambda frame, priority, on_sent: on_sent(True) or sent.append(frame),
+                     lambda frame: frame[0], window=1, max_attempts=3, initial_rto=0.02, min_rto=0.01)
+    lost.start()
+    outcome = []
+    lost.submit(bytes([1]), on_sent=lambda success: outcome.append(("sent", success)))
+    lost.watch(bytes([1]), lambda status, info: outcome.append((status, info["attempts"])))
+    ticket = lost.submit(bytes([2]))
+    assert ticket["window_position"] == 1
+    deadline = time.monotonic() + 1.0
+    while len(outcome) < 2 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    # La trame suivante entre dans la fenêtre libérée
+    assert lost.handle_ack(2, 1) == 1
+    lost.stop()
+    assert outcome == [("sent", True), (DELIVERY_FAILED, 3)] and sent.count(bytes([1])) == 3
+    assert lost.get_status()["delivered"] == 1
+    print("⚪️ Test de l'ARQ à fenêtre glissante réussi!")
+
+
+if __name__ == "__main__":
+    test_arq()
@@ -0,0 +1,456 @@
+import asyncio
+from collections import deque
+from concurrent.futures import Future
+from threading import Thread, Lock, current_thread
+from typing import Optional
+
+from fragmentation import DEFAULT_MTU
+from lora_module import LoRaDevice, RadioConfig, DEFAULT_BAUDRATE, parse_signal_line
+from metrics import SERIAL_ERRORS
+
+# Lignes émises spontanément par le module (URC), jamais des réponses
+URC_PREFIXES = ("+TEST: RX \"", "+TEST: LEN", "+TEST: TX DONE")
+# Commandes dont la réponse ne reprend pas le nom (ATZ -> +RESET: OK)
+RESPONSE_NAMES = {"Z": "RESET"}
+
+
+def response_prefix(cmd: str) -> str:
+    """Préfixe attendu de la réponse: AT -> +AT, AT+TEST=... -> +TEST, ATZ -> +RESET"""
+    name = cmd[2:].lstrip("+").split("=", 1)[0].split("?", 1)[0].upper()
+    return "+" + (RESPONSE_NAMES.get(name, name) or "AT")
+
+
+def is_urc(line: str) -> bool:
+    """Vérifier si une ligne est une notification non sollicitée"""
+    return line.startswith(URC_PREFIXES)
+
+
+class _PendingCommand:
+    """Commande AT en attente de sa réponse"""
+
+    def __init__(self, cmd: str, future: asyncio.Future):
+        self.cmd = cmd
+        self.prefix = response_prefix(cmd)
+        self.future = future
+        # Abandonnée après son délai: sa réponse tardive sera ignorée (pierre tombale)
+        self.timed_out = False
+        self.expires_at = None
+
+
+class LoRaEventLoop:
+    """Boucle asyncio dédiée aux modules LoRa, utilisable depuis les threads Flask"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def submit(self, coro) -> Future:
+        """Planifier une coroutine et obtenir un Future concurrent"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, coro, timeout: Optional[float] = None):
+        """Exécuter une coroutine et attendre son résultat (jamais depuis la boucle elle-même)"""
+        if current_thread() is self.thread:
+            coro.close()
+            raise RuntimeError("Appel bloquant depuis la boucle LoRa: utiliser await")
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=1.0)
+
+
+_default_loop: Optional[LoRaEventLoop] = None
+_default_loop_lock = Lock()
+
+
+def get_lora_event_loop() -> LoRaEventLoop:
+    """Boucle partagée par le processus (créée à la première utilisation)"""
+    global _default_loop
+    with _default_loop_lock:
+        if _default_loop is None:
+            _default_loop = LoRaEventLoop()
+        return _default_loop
+
+
+class AsyncLoRaDevice(LoRaDevice):
+    """Module LoRa piloté par une boucle asyncio partagée, commandes AT pipelinées
+
+    La connexion reprend la poignée de main de LoRaDevice (attente du
+    module, débit série, mode TEST, rfcfg), exécutée hors de la boucle;
+    le port est ensuite lu par la boucle, sans thread de lecture. Les
+    commandes sont écrites sans attendre la réponse de la précédente
+    (jusqu'à max_in_flight) et chaque réponse est rattachée à la plus
+    ancienne commande en vol de même préfixe. Une commande sans réponse
+    dans son délai reste en vol comme pierre tombale, hors fenêtre,
+    jusqu'à sa réponse tardive (ignorée), la réponse d'une commande
+    écrite après elle, ou tombstone_ttl secondes: sa réponse n'est jamais
+    attribuée à la commande suivante de même préfixe (+TEST...). Les URC
+    partent dans urc_queue; les paquets reçus suivent le chemin de
+    LoRaDevice (signal, réassemblage, callback ou rx_queue).
+
+    Les coroutines (open, send_command, transmit, configure, reset_module,
+    close) s'exécutent sur la boucle. Les méthodes de LoRaDevice (connect,
+    send_data, apply_radio_config, start_streaming...) y soumettent ces
+    coroutines et ne bloquent que le thread appelant: DevicePool et ses
+    ordonnanceurs utilisent ce module comme un LoRaDevice.
+    """
+
+    def __init__(self, port: str, baudrate: int = DEFAULT_BAUDRATE, mtu: int = None,
+                 radio_config: RadioConfig = None, max_baudrate: int = None,
+                 event_loop: LoRaEventLoop = None, max_in_flight: int = 4, tombstone_ttl: float = 5.0):
+        super().__init__(port, baudrate, mtu, radio_config, max_baudrate)
+        self.event_loop = event_loop or get_lora_event_loop()
+        self.loop = self.event_loop.loop
+        self.max_in_flight = max_in_flight
+        self.tombstone_ttl = tombstone_ttl
+        self.late_replies = 0
+        # Port lu par la boucle (False pendant la poignée de main et la réinitialisation)
+        self.attached = False
+
+        self.in_flight: deque = deque()
+        self.waiting: deque = deque()
+        self.urc_queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+        self.tx_event = asyncio.Event()
+        self.tx_guard = asyncio.Lock()
+        self._buffer = b""
+        self._reader_thread: Thread = None
+
+    # Coroutines, exécutées sur la boucle
+
+    async def open(self, timeout: float = 1.0) -> bool:
+        """Connecter le module (poignée de main de LoRaDevice) puis attacher le port à la boucle"""
+        if not await self.loop.run_in_executor(None, LoRaDevice.connect, self, timeout):
+            return False
+        self._attach()
+        return True
+
+    async def close(self):
+        """Détacher le port et le fermer"""
+        self.streaming = False
+        self._detach()
+        if self.serial and self.serial.is_open:
+            self.serial.close()
+        self.is_connected = False
+
+    async def reset_module(self, timeout: float = 2.0) -> bool:
+        """ATZ puis attente du module, hors de la boucle comme à la connexion"""
+        self.streaming = False
+        self._detach()
+        try:
+            return await self.loop.run_in_executor(None, LoRaDevice.reset, self, timeout)
+        finally:
+            if self.serial and self.serial.is_open:
+                self._attach()
+
+    async def send_command(self, cmd: str, timeout: float = 1.0) -> str:
+        """Envoyer une commande AT et attendre la réponse qui lui correspond"""
+        if not self.is_connected or not self.attached:
+            raise Exception("Module LoRa non connecté")
+
+        pending = _PendingCommand(cmd, self.loop.create_future())
+        self.waiting.append(pending)
+        self._write_waiting()
+
+        try:
+            # Délai allongé du temps de transfert à bas débit
+            return await asyncio.wait_for(asyncio.shield(pending.future), timeout + self._transfer_time(cmd))
+        except asyncio.TimeoutError:
+            SERIAL_ERRORS.inc("response_timeout")
+            # Ne pas laisser une commande muette bloquer la fenêtre, mais garder
+            # sa place pour que sa réponse tardive ne soit pas prise pour une autre
+            if pending in self.in_flight:
+                pending.timed_out = True
+                pending.expires_at = self.loop.time() + self.tombstone_ttl
+            if pending in self.waiting:
+                self.waiting.remove(pending)
+            self._write_waiting()
+            raise Exception(f"Pas de réponse du module LoRa à {cmd.split('=')[0]}")
+
+    async def start_receiving(self):
+        """Armer la réception continue"""
+        await self.send_command("AT+TEST=RXLRPKT")
+
+    async def transmit(self, data: bytes, tx_timeout: float = 10.0) -> bool:
+        """Émettre une trame (fragmentée si besoin) sans bloquer la boucle"""
+        try:
+            packets = self.fragmenter.fragment(data) if self.fragmenter else [data]
+            async with self.tx_guard:
+                try:
+                    for packet in packets:
+                        self.tx_event.clear()
+                        await self.send_command(f'AT+TEST=TXLRPKT,"{packet.hex().upper()}"')
+                        await asyncio.wait_for(self.tx_event.wait(), tx_timeout)
+                finally:
+                    # Le module quitte la réception après une émission
+                    if self.streaming:
+                        await self.start_receiving()
+                        self.rx_rearms += 1
+            return True
+        except Exception as e:
+            SERIAL_ERRORS.inc("send")
+            print(f"Erreur d'envoi: {e or type(e).__name__}")
+            return False
+
+    async def configure(self, config: RadioConfig, timeout: float = 1.0) -> bool:
+        """Reconfigurer le module (SF, canal...) entre deux émissions"""
+        try:
+            async with self.tx_guard:
+                await self.send_command(f"AT+TEST=rfcfg,{config.to_rfcfg()}", timeout=timeout)
+                self.radio_config = config
+                # rfcfg fait quitter la réception continue
+                if self.streaming:
+                    await self.start_receiving()
+                    self.rx_rearms += 1
+            return True
+        except Exception as e:
+            print(f"Erreur de configuration radio: {e}")
+            return False
+
+    # Interface de LoRaDevice, appelable depuis n'importe quel thread sauf celui de la boucle
+
+    def connect(self, timeout: float = 1.0) -> bool:
+        return self.event_loop.call(self.open(timeout))
+
+    def disconnect(self):
+        self.event_loop.call(self.close())
+
+    def reset(self, timeout: float = 2.0) -> bool:
+        return self.event_loop.call(self.reset_module(timeout))
+
+    def _send_command(self, cmd: str, timeout: float = None) -> str:
+        if not self.attached:
+            # Poignée de main et réinitialisation: échange bloquant de LoRaDevice
+            return super()._send_command(cmd, timeout)
+        return self.event_loop.call(self.send_command(cmd, timeout or 1.0))
+
+    def send_data(self, data: bytes) -> bool:
+        return self.event_loop.call(self.transmit(data))
+
+    def apply_radio_config(self, config: RadioConfig, timeout: float = 1.0) -> bool:
+        return self.event_loop.call(self.configure(config, timeout))
+
+    def start_streaming(self, callback=None) -> bool:
+        """Armer la réception; les trames sont livrées depuis la boucle, sans thread de lecture"""
+        if self.streaming:
+            return True
+        if not self.is_connected or not self.attached:
+            return False
+        self.on_frame = callback
+        try:
+            self.event_loop.call(self.start_receiving())
+        except Exception as e:
+            print(f"Erreur d'armement de la réception: {e}")
+            return False
+        self.streaming = True
+        return True
+
+    def stop_streaming(self):
+        self.streaming = False
+
+    def receive_frame(self, timeout: float = 1.0) -> tuple:
+        if not self.streaming and not self.start_streaming():
+            return b"", None
+        return super().receive_frame(timeout)
+
+    def get_rx_stats(self) -> dict:
+        stats = super().get_rx_stats()
+        stats["commands_in_flight"] = sum(not pending.timed_out for pending in self.in_flight)
+        stats["late_replies"] = self.late_replies
+        return stats
+
+    # Lecture du port et corrélation des réponses
+
+    def _attach(self):
+        """Lecture non bloquante: add_reader sur POSIX, sinon thread dédié"""
+        self.serial.timeout = 0
+        self._buffer = b""
+        self.attached = True
+        try:
+            self.loop.add_reader(self.serial.fileno(), self._on_readable)
+        except (NotImplementedError, AttributeError, ValueError):
+            self._reader_thread = Thread(target=self._thread_reader, daemon=True)
+            self._reader_thread.start()
+
+    def _detach(self):
+        """Rendre le port aux échanges bloquants; les commandes en cours échouent"""
+        if not self.attached:
+            return
+        self.attached = False
+        if self._reader_thread is None:
+            try:
+                self.loop.remove_reader(self.serial.fileno())
+            except (NotImplementedError, AttributeError, ValueError):
+                pass
+        else:
+            self._reader_thread.join(timeout=1.0)
+        self._reader_thread = None
+        for pending in list(self.in_flight) + list(self.waiting):
+            if not pending.future.done():
+                pending.future.set_exception(Exception("Module LoRa déconnecté"))
+        self.in_flight.clear()
+        self.waiting.clear()
+        self.serial.timeout = 1.0
+
+    def _thread_reader(self):
+        """Repli pour les plateformes sans add_reader sur un port série"""
+        self.serial.timeout = 0.1
+        while self.attached and self.serial.is_open:
+            try:
+                data = self.serial.read(self.serial.in_waiting or 1)
+            except Exception:
+                break
+            if data:
+                self.loop.call_soon_threadsafe(self._on_data, data)
+
+    def _on_readable(self):
+        try:
+            data = self.serial.read(self.serial.in_waiting or 1)
+        except Exception as e:
+            SERIAL_ERRORS.inc("read")
+            print(f"Erreur de lecture série: {e}")
+            return
+        if data:
+            self._on_data(data)
+
+    def _on_data(self, data: bytes):
+        self._buffer += data
+        while b"\r\n" in self._buffer:
+            raw, self._buffer = self._buffer.split(b"\r\n", 1)
+            line = raw.decode("ascii", errors="ignore").strip()
+            if line:
+                self._dispatch_line(line)
+
+    def _dispatch_line(self, line: str):
+        """Répartir une ligne: URC, réponse corrélée ou notification inconnue"""
+        if is_urc(line):
+            self._handle_urc(line)
+            return
+
+        index = next((i for i, pending in enumerate(self.in_flight) if line.startswith(pending.prefix)), None)
+        if index is None:
+            # Ligne sans commande correspondante: la traiter comme une notification
+            self._put_urc(line)
+            return
+
+        pending = self.in_flight[index]
+        # Le module répond dans l'ordre: les commandes abandonnées écrites avant n'auront plus de réponse
+        for earlier in [p for p in list(self.in_flight)[:index] if p.timed_out]:
+            self.in_flight.remove(earlier)
+        self.in_flight.remove(pending)
+
+        if pending.timed_out:
+            # Réponse tardive d'une commande abandonnée
+            self.late_replies += 1
+        elif not pending.future.done():
+            if "ERROR" in line:
+                pending.future.set_exception(Exception(f"Erreur LoRa: {line}"))
+            else:
+                pending.future.set_result(line)
+        self._write_waiting()
+
+    def _handle_urc(self, line: str):
+        if line.startswith("+TEST: TX DONE"):
+            self.tx_event.set()
+        elif line.startswith("+TEST: LEN"):
+            # Infos de signal précédant chaque trame
+            self.pending_signal = parse_signal_line(line)
+        elif line.startswith("+TEST: RX \""):
+            self._handle_rx_line(line)
+        self._put_urc(line)
+
+    def _put_urc(self, line: str):
+        try:
+            self.urc_queue.put_nowait(line)
+        except asyncio.QueueFull:
+            # Les URC non lues ne doivent pas bloquer la boucle
+            self.urc_queue.get_nowait()
+            self.urc_queue.put_nowait(line)
+
+    def _write_waiting(self):
+        """Écrire les commandes en attente tant que la fenêtre le permet (pierres tombales non comprises)"""
+        now = self.loop.time()
+        for pending in [p for p in self.in_flight if p.timed_out and p.expires_at <= now]:
+            self.in_flight.remove(pending)
+        while self.waiting and sum(not p.timed_out for p in self.in_flight) < self.max_in_flight:
+            pending = self.waiting.popleft()
+            if pending.future.done():
+                continue
+            try:
+                self.serial.write((pending.cmd + "\r\n").encode("ascii"))
+            except Exception as e:
+                pending.future.set_exception(e)
+                continue
+            self.in_flight.append(pending)
+
+
+def test_async_lora():
+    """Faire dialoguer deux AsyncLoRaDevice sur une même boucle à travers des modules émulés"""
+    import time
+    from modem_emulator import RadioChannel
+
+    channel = RadioChannel(time_scale=0.1, seed=1, uart_timing=True)
+    modem_a, modem_b = channel.add_modem("a"), channel.add_modem("b")
+    config = RadioConfig(sf=9)
+    event_loop = LoRaEventLoop()
+    sender = AsyncLoRaDevice(modem_a.port, mtu=DEFAULT_MTU, radio_config=config, max_baudrate=115200,
+                             event_loop=event_loop)
+    receiver = AsyncLoRaDevice(modem_b.port, mtu=DEFAULT_MTU, radio_config=config, event_loop=event_loop)
+    try:
+        # Poignée de main de LoRaDevice: débit négocié et configuration radio appliquée
+        assert sender.connect() and receiver.connect()
+        assert sender.baudrate == modem_a.baudrate == 115200, sender.baudrate
+        assert modem_a.config.sf == modem_b.config.sf == 9
+        assert receiver.start_streaming() and receiver._reader_thread is None
+
+        payload = bytes(range(256)) * 2  # Fragmenté en trois paquets
+        assert sender.send_data(payload)
+        frame, signal_info = receiver.receive_frame(timeout=5.0)
+        assert frame == payload, len(frame)
+        assert signal_info["rssi"] is not None and signal_info["sf"] == 9
+        print(f"Trame reçue: {len(frame)} bytes, RSSI {signal_info['rssi']} dBm, SNR {signal_info['snr']} dB")
+
+        # Commandes pipelinées: toutes écrites sans attendre la précédente
+        async def pipelined(count: int) -> list:
+            return await asyncio.gather(*(sender.send_command("AT") for _ in range(count)))
+
+        start = time.perf_counter()
+        assert event_loop.call(pipelined(8)) == ["+AT: OK"] * 8
+        print(f"8 commandes AT pipelinées: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        # Changement de SF: la réception est réarmée
+        assert receiver.apply_radio_config(config.copy(sf=10))
+        assert modem_b.config.sf == 10 and modem_b.receiving and receiver.radio_config.sf == 10
+
+        # Réponse tardive d'une commande abandonnée: jamais prise pour celle de la suivante
+        handle_command = modem_a._handle_command
+
+        def slow_rfcfg(cmd: str):
+            if cmd.upper().startswith("AT+TEST=RFCFG"):
+                time.sleep(0.5)
+            handle_command(cmd)
+
+        modem_a._handle_command = slow_rfcfg
+        try:
+            sender._send_command(f"AT+TEST=rfcfg,{config.to_rfcfg()}", timeout=0.1)
+            raise AssertionError("rfcfg aurait dû expirer")
+        except Exception as e:
+            assert "Pas de réponse" in str(e), e
+        assert sender._send_command("AT+TEST=RXLRPKT") == "+TEST: RXLRPKT"
+        assert sender.late_replies == 1
+        modem_a._handle_command = handle_command
+
+        # Réinitialisation: échange bloquant hors de la boucle, puis port rattaché
+        assert sender.reset() and sender.attached and sender._send_command("AT") == "+AT: OK"
+        print(f"Statistiques de réception: {receiver.get_rx_stats()}")
+    finally:
+        sender.disconnect()
+        receiver.disconnect()
+        event_loop.stop()
+        channel.close()
+    print("⚪️ Test du pilote asyncio réussi!")
+
+
+if __name__ == "__main__":
+    test_async_lora()
@@ -0,0 +1,186 @@
+import time
+from collections import deque
+from threading import Lock
+from typing import Dict, List, Optional
+
+from lora_module import RadioConfig
+from tx_scheduler import sub_band_for
+from metrics import REGISTRY
+
+STRATEGY_ROUND_ROBIN = "round_robin"
+STRATEGY_LEAST_USED = "least_used"
+STRATEGIES = [STRATEGY_ROUND_ROBIN, STRATEGY_LEAST_USED]
+
+# Fenêtre de calcul du taux d'occupation d'un canal (secondes)
+UTILISATION_WINDOW = 60.0
+
+CHANNEL_FRAMES = REGISTRY.counter("lora_channel_frames_total", "Trames émises par canal", label="channel")
+CHANNEL_AIRTIME = REGISTRY.counter("lora_channel_airtime_seconds_total",
+                                   "Temps d'émission cumulé par canal", label="channel")
+
+
+class Channel:
+    """Canal du plan: fréquence, bande passante et SF optionnel
+
+    Sans SF (None), le module garde celui de la configuration commune,
+    ajusté par l'ADR; un SF fixé par le canal l'emporte.
+    """
+
+    def __init__(self, frequency: float, sf: Optional[int] = None, bw: int = 125):
+        self.frequency = float(frequency)
+        self.sf = int(sf) if sf else None
+        self.bw = int(bw)
+        self.frames = 0
+        self.airtime = 0.0
+        self.recent = deque()  # (instant, temps d'émission)
+
+    @property
+    def name(self) -> str:
+        return f"{self.frequency:g}/sf{self.sf}/{self.bw}" if self.sf else f"{self.frequency:g}/{self.bw}"
+
+    def key(self) -> tuple:
+        return (self.frequency, self.sf, self.bw)
+
+    def apply_to(self, config: RadioConfig) -> RadioConfig:
+        """Configuration radio d'un module affecté à ce canal"""
+        if self.sf:
+            return config.copy(frequency=self.frequency, sf=self.sf, bw=self.bw)
+        return config.copy(frequency=self.frequency, bw=self.bw)
+
+    def recent_airtime(self, now: float) -> float:
+        while self.recent and self.recent[0][0] < now - UTILISATION_WINDOW:
+            self.recent.popleft()
+        return sum(airtime for _, airtime in self.recent)
+
+    def to_dict(self) -> dict:
+        sub_band, duty_cycle = sub_band_for(self.frequency)
+        return {"frequency": self.frequency, "sf": self.sf, "bw": self.bw,
+                "sub_band": sub_band, "duty_cycle": duty_cycle}
+
+
+class ChannelPlan:
+    """Plan de canaux: répartition des modules et des trames sur plusieurs fréquences
+
+    Les émetteurs sont répartis sur les canaux à tour de rôle, puis les
+    récepteurs seuls, pour que chaque canal ait si possible son récepteur.
+    Une trame part sur le canal suivant (round_robin) ou sur celui qui a
+    le moins émis pendant la dernière minute (least_used).
+    """
+
+    def __init__(self, channels: List[Channel], strategy: str = STRATEGY_LEAST_USED):
+        if not channels:
+            raise ValueError("Plan de canaux vide")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Stratégie inconnue: {strategy}")
+        if len({channel.key() for channel in channels}) != len(channels):
+            raise ValueError("Canal en double dans le plan")
+        self.channels = channels
+        self.strategy = strategy
+        self.lock = Lock()
+        self.next_channel = 0
+
+    @classmethod
+    def from_list(cls, channels: List[dict], strategy: str = STRATEGY_LEAST_USED) -> 'ChannelPlan':
+        """[{"frequency": 865.125, "sf": 7, "bw": 125}, ...] (sf et bw optionnels)"""
+        return cls([Channel(c["frequency"], c.get("sf"), c.get("bw") or 125) for c in channels], strategy)
+
+    @classmethod
+    def from_string(cls, plan: str, strategy: str = STRATEGY_LEAST_USED) -> 'ChannelPlan':
+        """"865.125,865.325::250,865.525:9" (fréquence[:sf[:bw]] séparés par des virgules, sf vide: ADR)"""
+        channels = []
+        for entry in plan.split(","):
+            fields = entry.strip().split(":")
+            channels.append(Channel(fields[0], fields[1] if len(fields) > 1 else None,
+                                    fields[2] if len(fields) > 2 and fields[2] else 125))
+        return cls(channels, strategy)
+
+    @property
+    def fixes_sf(self) -> bool:
+        """Un canal au moins impose son SF: l'ADR ne peut pas le choisir"""
+        return any(channel.sf for channel in self.channels)
+
+    def assign(self, transmitters: List[str], receivers: List[str]) -> Dict[str, Channel]:
+        """Affecter un canal à chaque module (ports), émetteurs d'abord"""
+        assignment = {}
+        for i, port in enumerate(transmitters):
+            assignment[port] = self.channels[i % len(self.channels)]
+
+        # Récepteurs seuls: d'abord les canaux sans module à l'écoute
+        listened = {id(assignment[port]) for port in transmitters if port in receivers}
+        unlistened = [channel for channel in self.channels if id(channel) not in listened]
+        order = unlistened + [channel for channel in self.channels if id(channel) in listened]
+        for i, port in enumerate(port for port in receivers if port not in assignment):
+            assignment[port] = order[i % len(order)]
+        return assignment
+
+    def order(self, candidates: List[Channel]) -> List[Channel]:
+        """Canaux candidats dans l'ordre de préférence de la stratégie"""
+        if not candidates:
+            return []
+        with self.lock:
+            if self.strategy == STRATEGY_ROUND_ROBIN:
+                indexes = sorted(self.channels.index(channel) for channel in candidates)
+                start = next((i for i in indexes if i >= self.next_channel), indexes[0])
+                self.next_channel = start + 1
+                first = self.channels[start]
+                return [first] + [channel for channel in candidates if channel is not first]
+            now = time.time()
+            return sorted(candidates, key=lambda channel: channel.recent_airtime(now))
+
+    def record(self, channel: Channel, airtime: float):
+        """Comptabiliser une trame émise sur un canal"""
+        with self.lock:
+            channel.frames += 1
+            channel.airtime += airtime
+            channel.recent.append((time.time(), airtime))
+        CHANNEL_FRAMES.inc(channel.name)
+        CHANNEL_AIRTIME.inc(channel.name, airtime)
+
+    def get_utilisation(self) -> List[dict]:
+        """Trames, temps d'émission et occupation de chaque canal"""
+        now = time.time()
+        with self.lock:
+            total = sum(channel.frames for channel in self.channels)
+            return [dict(channel.to_dict(),
+                         frames=channel.frames,
+                         share=round(channel.frames / total, 3) if total else 0.0,
+                         airtime_s=round(channel.airtime, 3),
+                         utilisation=round(channel.recent_airtime(now) / UTILISATION_WINDOW, 4))
+                    for channel in self.channels]
+
+    def to_dict(self) -> dict:
+        return {"strategy": self.strategy, "channels": [channel.to_dict() for channel in self.channels]}
+
+
+def test_channel_plan():
+    """Tester l'affectation des modules et les deux stratégies"""
+    plan = ChannelPlan.from_string("865.125,865.325::250,865.525:9:125", STRATEGY_ROUND_ROBIN)
+    assert [channel.sf for channel in plan.channels] == [None, None, 9]
+    assert [channel.bw for channel in plan.channels] == [125, 250, 125] and plan.fixes_sf
+
+    # Sans SF imposé, le canal garde celui de la configuration commune (choisi par l'ADR)
+    config = RadioConfig(sf=10)
+    assert plan.channels[1].apply_to(config).sf == 10 and plan.channels[2].apply_to(config).sf == 9
+    assert not ChannelPlan.from_string("865.125,865.325").fixes_sf
+
+    assignment = plan.assign(["tx0", "tx1"], ["rx0", "rx1", "rx2"])
+    assert assignment["tx0"] is plan.channels[0] and assignment["tx1"] is plan.channels[1]
+    assert {assignment[port].frequency for port in ("rx0", "rx1", "rx2")} == {865.125, 865.325, 865.525}
+
+    # Un module mixte écoute déjà son canal: les récepteurs vont d'abord ailleurs
+    assignment = plan.assign(["both0"], ["both0", "rx0", "rx1"])
+    assert assignment["rx0"] is plan.channels[1] and assignment["rx1"] is plan.channels[2]
+
+    picks = [plan.order(plan.channels)[0] for _ in range(6)]
+    assert picks == plan.channels * 2
+
+    plan.strategy = STRATEGY_LEAST_USED
+    plan.record(plan.channels[0], 0.5)
+    plan.record(plan.channels[1], 0.1)
+    assert plan.order(plan.channels)[0] is plan.channels[2]
+    print(f"Occupation: {plan.get_utilisation()}")
+    print("⚪️ Test du plan de canaux réussi!")
+
+
+if __name__ == "__main__":
+    test_channel_plan()
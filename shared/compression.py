@@ -0,0 +1,233 @@
+import zlib
+import json
+import hashlib
+import argparse
+import urllib.parse
+import urllib.request
+from collections import Counter
+from typing import Callable, List, Optional
+
+from frame_codec import encode_payload
+
+# Octet de drapeau en tête du clair compressé (distinct de '{' et des versions de trame)
+FLAG_RAW = 0x80
+FLAG_DEFLATE = 0x81
+COMPRESSION_FLAGS = (FLAG_RAW, FLAG_DEFLATE)
+
+# Fenêtre deflate maximale: un dictionnaire plus long est tronqué par zlib
+MAX_DICTIONARY_SIZE = 32 * 1024
+DEFAULT_TRAINED_SIZE = 2048
+
+# Dictionnaire par défaut: clés de métadonnées et statuts courants FR/EN.
+# Les fragments les plus fréquents sont placés en fin (distances plus courtes).
+DEFAULT_DICTIONARY = (
+    "error erreur warning alerte alarm alarme capteur sensor humidité humidity "
+    "pression pressure niveau level position latitude longitude vitesse speed "
+    "connexion connection perdue lost rétablie restored démarrage startup "
+    "redémarrage reboot arrêt shutdown reçu received envoyé sent "
+    "Batterie faible Battery low température temperature "
+    "Test de message Test de communication Test de sécurité LoRa "
+    "Hello LoRa World! Message chiffré Communication sécurisée établie "
+    '{"message": "", "timestamp": , "metadata": {"sender": "web_interface", '
+    '"priority": "low"}}"priority": "high"}}"priority": "normal"}}'
+    "web_interface lora_device_1 status OK"
+).encode("utf-8")
+
+
+class CompressionError(Exception):
+    """Erreur de compression ou de décompression d'une trame"""
+
+
+class PayloadCompressor:
+    """Classe pour compresser les payloads avec un dictionnaire partagé"""
+
+    def __init__(self, dictionary: bytes = None, level: int = 9):
+        self.dictionary = (DEFAULT_DICTIONARY if dictionary is None else dictionary)[-MAX_DICTIONARY_SIZE:]
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        """Compresser un clair, ou le garder brut si la compression ne paie pas"""
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=self.dictionary)
+        compressed = compressor.compress(data) + compressor.flush()
+
+        if len(compressed) < len(data):
+            return bytes([FLAG_DEFLATE]) + compressed
+        return bytes([FLAG_RAW]) + data
+
+    def decompress(self, data: bytes) -> bytes:
+        """Décompresser un clair préfixé par son drapeau"""
+        if not data or data[0] not in COMPRESSION_FLAGS:
+            raise CompressionError("Drapeau de compression absent")
+        if data[0] == FLAG_RAW:
+            return data[1:]
+
+        try:
+            decompressor = zlib.decompressobj(-15, zdict=self.dictionary)
+            return decompressor.decompress(data[1:]) + decompressor.flush()
+        except zlib.error as e:
+            raise CompressionError(f"Décompression impossible (dictionnaire différent ?): {e}")
+
+    def get_dictionary_id(self) -> str:
+        """Obtenir l'empreinte du dictionnaire (à comparer entre les deux extrémités)"""
+        return hashlib.sha256(self.dictionary).hexdigest()[:8]
+
+
+def is_compressed_frame(data: bytes) -> bool:
+    """Vérifier si un clair porte un drapeau de compression"""
+    return bool(data) and data[0] in COMPRESSION_FLAGS
+
+
+def train_dictionary(samples: List[bytes], max_size: int = DEFAULT_TRAINED_SIZE,
+                     min_length: int = 3, max_length: int = 24) -> bytes:
+    """Entraîner un dictionnaire à partir d'échantillons de clairs
+
+    Chaque sous-chaîne est comptée une fois par échantillon, puis les plus
+    rentables (occurrences x longueur) sont retenues jusqu'à max_size.
+    """
+    counts = Counter()
+    for sample in samples:
+        seen = set()
+        for length in range(min_length, max_length + 1):
+            for start in range(0, len(sample) - length + 1):
+                seen.add(sample[start:start + length])
+        counts.update(seen)
+
+    # Une sous-chaîne vue une seule fois n'aide pas le message suivant
+    candidates = [(count * (len(sub) - 2), sub) for sub, count in counts.items() if count > 1]
+    candidates.sort(reverse=True)
+
+    selected = []
+    size = 0
+    for _, sub in candidates:
+        if size + len(sub) > max_size:
+            continue
+        if any(sub in kept for kept in selected):
+            continue
+        selected.append(sub)
+        size += len(sub)
+        if size >= max_size - min_length:
+            break
+
+    # Les plus rentables en dernier
+    return b"".join(reversed(selected))
+
+
+def load_dictionary(path: str) -> bytes:
+    """Charger un dictionnaire depuis un fichier"""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def samples_from_history(history: list, frame_format: str) -> List[bytes]:
+    """Reconstruire les clairs émis à partir d'un export de message_history"""
+    samples = []
+    for entry in history:
+        metadata = entry.get("metadata", {})
+        timestamp = metadata.get("timestamp", 0)
+        if not isinstance(timestamp, int):
+            timestamp = 0
+        samples.append(encode_payload(entry.get("message", ""), timestamp, metadata, frame_format))
+    return samples
+
+
+def read_history(fetch_page: Callable[[Optional[int]], dict]) -> list:
+    """Lire tout l'historique paginé, du plus récent au plus ancien
+
+    fetch_page(before_id) retourne une page de /api/messages/history
+    ({"messages", "has_more", "first_id"}); None donne la plus récente.
+    Les messages sont retournés en ordre chronologique.
+    """
+    pages = []
+    before_id = None
+    while True:
+        page = fetch_page(before_id)
+        messages = page.get("messages", [])
+        if messages:
+            pages.append(messages)
+        if not page.get("has_more") or not messages:
+            break
+        before_id = page.get("first_id", messages[0].get("id"))
+    return [entry for messages in reversed(pages) for entry in messages]
+
+
+def history_fetcher(url: str) -> Callable[[Optional[int]], dict]:
+    """Pages de l'API http://hôte:5000/api/messages/history, via before_id"""
+    def fetch_page(before_id: Optional[int]) -> dict:
+        parts = urllib.parse.urlsplit(url)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        if before_id is not None:
+            query["before_id"] = str(before_id)
+        page_url = urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query)))
+        with urllib.request.urlopen(page_url, timeout=30) as response:
+            return json.load(response)
+    return fetch_page
+
+
+def load_history(source: str) -> list:
+    """Historique depuis l'API (toutes les pages) ou un fichier JSON exporté"""
+    if source.startswith(("http://", "https://")):
+        return read_history(history_fetcher(source))
+    with open(source, encoding="utf-8") as f:
+        history = json.load(f)
+    if isinstance(history, dict):
+        # Une réponse de l'API ne contient qu'une page
+        history = history.get("messages", [])
+    return history
+
+
+def test_history_paging():
+    """Tester que l'entraînement lit toutes les pages de l'historique"""
+    entries = [{"id": i, "message": f"Capteur {i % 7} température {20 + i % 5}",
+                "metadata": {"sender": "node_1", "timestamp": 1700000000 + i, "priority": "normal"}}
+               for i in range(1, 251)]
+    requests = []
+
+    def fetch_page(before_id, limit=100):
+        # Même pagination que /api/messages/history: les plus récents avant before_id
+        requests.append(before_id)
+        older = [e for e in entries if before_id is None or e["id"] < before_id]
+        page = older[-limit:]
+        return {"messages": page, "has_more": len(older) > limit,
+                "first_id": page[0]["id"] if page else None}
+
+    history = read_history(fetch_page)
+    assert [e["id"] for e in history] == list(range(1, 251))
+    assert requests == [None, 151, 51]
+
+    samples = samples_from_history(history, "binary")
+    trained = PayloadCompressor(train_dictionary(samples))
+    assert len(samples) == 250
+    assert all(trained.decompress(trained.compress(s)) == s for s in samples[:10])
+    print("⚪️ Test de la lecture paginée de l'historique réussi!")
+
+
+def main():
+    """Outil d'entraînement: python compression.py http://localhost:5000/api/messages/history -o lora.dict"""
+    parser = argparse.ArgumentParser(description="Entraîner un dictionnaire de compression LoRa")
+    parser.add_argument("history", help="URL de /api/messages/history (toutes les pages sont lues "
+                                        "avec before_id) ou fichier JSON d'une liste de messages")
+    parser.add_argument("-o", "--output", default="lora_compression.dict")
+    parser.add_argument("--size", type=int, default=DEFAULT_TRAINED_SIZE)
+    parser.add_argument("--format", default="binary", choices=["json", "binary"])
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    samples = samples_from_history(history, args.format)
+    dictionary = train_dictionary(samples, max_size=args.size)
+
+    with open(args.output, "wb") as f:
+        f.write(dictionary)
+
+    trained = PayloadCompressor(dictionary)
+    default = PayloadCompressor()
+    raw_size = sum(len(s) for s in samples)
+    trained_size = sum(len(trained.compress(s)) for s in samples)
+    default_size = sum(len(default.compress(s)) for s in samples)
+
+    print(f"⚪️ Dictionnaire {trained.get_dictionary_id()} ({len(dictionary)} bytes) écrit dans {args.output}")
+    print(f"Échantillons: {len(samples)} - brut {raw_size} bytes, "
+          f"défaut {default_size} bytes, entraîné {trained_size} bytes")
+
+
+if __name__ == "__main__":
+    main()
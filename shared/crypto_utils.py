@@ -1,70 +1,346 @@
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
-from Crypto.Protocol.KDF import PBKDF2
-from Crypto.Hash import SHA256
 import base64
-import json
 import hashlib
 import time
-from typing import Tuple, Dict, Any
+from threading import Lock
+from typing import Tuple, Dict, Any, List, Optional
+
+from frame_codec import (FORMAT_JSON, FORMAT_BINARY, FRAME_FORMATS, encode_payload, encode_batch_payload,
+                         encode_ack_payload, decode_payload)
+from key_derivation import get_key_derivation_pool
+from compression import PayloadCompressor, is_compressed_frame
+from metrics import STAGE_SECONDS
+from replay_protection import ReplayCache, ReplayWindowStore, SequenceCounter, message_digest
+
+# Nonce GCM aléatoire transmis en clair (12 octets), ou implicite: préfixe
+# dérivé de l'identifiant de l'émetteur + compteur, seul le compteur est transmis
+NONCE_RANDOM = "random"
+NONCE_IMPLICIT = "implicit"
+NONCE_MODES = (NONCE_RANDOM, NONCE_IMPLICIT)
+
+NONCE_SIZE = 12
+TAG_SIZE = 16
+DEFAULT_COUNTER_BYTES = 4
+
+# Rotation de clé demandée quand il reste moins de 1/16 de l'espace du compteur
+ROTATION_MARGIN = 1 / 16
 
 class SecureCrypto:
-    """Classe pour gérer le chiffrement/déchiffrement sécurisé"""
+    """Classe pour gérer le chiffrement/déchiffrement sécurisé
+
+    En mode de nonce implicite, la trame est compteur (counter_bytes) +
+    tag + chiffré: le nonce vaut BLAKE2b(émetteur) tronqué + compteur. Le
+    compteur est le numéro de séquence (persistant, à conserver par clé);
+    le récepteur retrouve l'émetteur en essayant ses pairs connus (peers).
+    Chaque nœud partageant la clé doit avoir un identifiant unique: deux
+    émetteurs de même identifiant produiraient les mêmes nonces.
+    Une fois le compteur épuisé, le chiffrement refuse d'émettre: la clé
+    doit être changée.
+    """
+
+    def __init__(self, password: str = None, key: bytes = None, frame_format: str = FORMAT_JSON,
+                 compressor: PayloadCompressor = None, sequence: SequenceCounter = None,
+                 nonce_mode: str = NONCE_RANDOM, counter_bytes: int = DEFAULT_COUNTER_BYTES,
+                 peers: List[str] = None):
+        if frame_format not in FRAME_FORMATS:
+            raise ValueError(f"Format de trame inconnu: {frame_format}")
+        if nonce_mode not in NONCE_MODES:
+            raise ValueError(f"Mode de nonce inconnu: {nonce_mode}")
+        if nonce_mode == NONCE_IMPLICIT and not sequence:
+            raise ValueError("Le nonce implicite nécessite un compteur de séquence")
+        if not 2 <= counter_bytes <= 4:
+            raise ValueError(f"Taille de compteur invalide: {counter_bytes}")
+        # Format utilisé à l'émission, la réception détecte JSON et binaire
+        self.frame_format = frame_format
+        # Compression optionnelle avant AES-GCM (dictionnaire partagé)
+        self.compressor = compressor
+        # Numéro de séquence par émetteur, authentifié dans la trame (anti-rejeu)
+        self.sequence = sequence
+        self.nonce_mode = nonce_mode
+        self.counter_bytes = counter_bytes
+        self.max_counter = (1 << (8 * counter_bytes)) - 1
+        # Émetteurs dont les trames à nonce implicite sont acceptées, le dernier reconnu en tête
+        self.peers: List[str] = []
+        self.prefixes: Dict[str, bytes] = {}
+        self.peers_lock = Lock()
+        for peer in ([sequence.sender_id] if nonce_mode == NONCE_IMPLICIT else []) + list(peers or []):
+            self.add_peer(peer)
 
-    def __init__(self, password: str = None, key: bytes = None):
         if key:
             self.key = key
         elif password:
-            # Dériver une clé à partir du mot de passe
-            salt = b'lora_secure_salt_2024'  # En production, utiliser un salt aléatoire
-            self.key = PBKDF2(password, salt, 32, count=100000, hmac_hash_module=SHA256)
+            # Dériver une clé à partir du mot de passe (PBKDF2-SHA256, mise en cache)
+            self.key = get_key_derivation_pool().derive(password)
         else:
             # Générer une clé aléatoire
             self.key = get_random_bytes(32)
 
     def encrypt_message(self, plaintext: str, metadata: Dict[str, Any] = None) -> bytes:
         """Chiffrer un message avec métadonnées"""
-        # Préparer le payload
-        payload = {
-            "message": plaintext,
-            "timestamp": int(time.time()),
-            "metadata": metadata or {}
-        }
-
-        # Convertir en JSON puis en bytes
-        json_data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
-
-        # Générer un nonce aléatoire
-        nonce = get_random_bytes(12)
+        seq = self.sequence.next() if self.sequence else None
+        payload_data = self._encode(plaintext, metadata, int(time.time()), seq)
+        return self._seal(payload_data, seq)
+
+    def message_size(self, plaintext: str, metadata: Dict[str, Any] = None) -> int:
+        """Taille de la trame que produirait encrypt_message (sans consommer de numéro de séquence)"""
+        seq = self.sequence.value + 1 if self.sequence else None
+        return self.overhead + len(self._encode(plaintext, metadata, int(time.time()), seq))
+
+    @property
+    def implicit(self) -> bool:
+        return self.nonce_mode == NONCE_IMPLICIT
+
+    @property
+    def overhead(self) -> int:
+        """Octets ajoutés au payload par trame (nonce ou compteur, et tag)"""
+        return (self.counter_bytes if self.implicit else NONCE_SIZE) + TAG_SIZE
+
+    @property
+    def rotation_needed(self) -> bool:
+        """Compteur de nonce bientôt épuisé: changer de clé"""
+        return self.implicit and self.sequence.value >= self.max_counter - int(self.max_counter * ROTATION_MARGIN)
+
+    @property
+    def key_id(self) -> str:
+        return self.get_key_fingerprint()[:8]
+
+    def add_peer(self, sender_id: str):
+        """Accepter les trames à nonce implicite d'un émetteur"""
+        with self.peers_lock:
+            if sender_id not in self.prefixes:
+                self.prefixes[sender_id] = hashlib.blake2b(sender_id.encode("utf-8"),
+                                                           digest_size=NONCE_SIZE - self.counter_bytes).digest()
+                self.peers.append(sender_id)
+
+    def _strip_implicit(self, metadata: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Nonce implicite: l'émetteur est porté par le nonce, inutile de le transmettre"""
+        if metadata and metadata.get("sender") == self.sequence.sender_id:
+            return {key: value for key, value in metadata.items() if key != "sender"}
+        return metadata
+
+    def encrypt_batch(self, messages: List[Tuple[str, Optional[Dict[str, Any]]]]) -> bytes:
+        """Chiffrer plusieurs (message, métadonnées) dans une seule trame
+
+        Un seul nonce, un seul tag et un seul numéro de séquence pour tout
+        le lot; le récepteur le déballe avec decrypt_frame.
+        """
+        seq = self.sequence.next() if self.sequence else None
+        payload_data = self._encode_batch(messages, int(time.time()), seq)
+        return self._seal(payload_data, seq)
+
+    def batch_size(self, messages: List[Tuple[str, Optional[Dict[str, Any]]]]) -> int:
+        """Taille de la trame que produirait encrypt_batch (sans consommer de numéro de séquence)"""
+        seq = self.sequence.value + 1 if self.sequence else None
+        return self.overhead + len(self._encode_batch(messages, int(time.time()), seq))
+
+    def _encode_batch(self, messages: List[Tuple[str, Optional[Dict[str, Any]]]], timestamp: int,
+                      seq: Optional[int]) -> bytes:
+        # Trame numérotée: émetteur et séquence; sinon l'horodatage sert à l'anti-rejeu
+        common = {"timestamp": timestamp}
+        if seq is not None and not self.implicit:
+            common = {"sender": self.sequence.sender_id, "seq": seq}
+        if messages and all((metadata or {}).get("ack") for _, metadata in messages):
+            # Accusé demandé pour toute la trame
+            common["ack"] = True
+        if self.implicit:
+            messages = [(plaintext, self._strip_implicit(metadata)) for plaintext, metadata in messages]
+        entries = [(plaintext, (metadata or {}).get("timestamp", timestamp), metadata or {})
+                   for plaintext, metadata in messages]
+
+        with STAGE_SECONDS.time("encode"):
+            payload_data = encode_batch_payload(entries, timestamp, common, self.frame_format)
+        if self.compressor:
+            with STAGE_SECONDS.time("compress"):
+                payload_data = self.compressor.compress(payload_data)
+        return payload_data
+
+    def encrypt_ack(self, to: str, base: int, bitmap: int) -> bytes:
+        """Chiffrer un accusé de réception pour l'émetteur to (bit i du bitmap: séquence base - i reçue)
+
+        L'accusé ne consomme un numéro de séquence qu'en nonce implicite,
+        où il sert de nonce; il n'est pas soumis à l'anti-rejeu.
+        """
+        seq = self.sequence.next() if self.implicit else None
+        metadata = {"sender": self.sequence.sender_id} if self.sequence and not self.implicit else {}
+        with STAGE_SECONDS.time("encode"):
+            payload_data = encode_ack_payload(to, base, bitmap, int(time.time()), metadata, self.frame_format)
+        return self._seal(payload_data, seq)
+
+    def frame_sequence(self, encrypted_data: bytes) -> Optional[int]:
+        """Numéro de séquence d'une trame émise par ce nœud (None si non numérotée)"""
+        if self.implicit:
+            return int.from_bytes(encrypted_data[:self.counter_bytes], "big")
+        return self.decrypt_frame(encrypted_data)[1].get("seq")
+
+    def _encode(self, plaintext: str, metadata: Optional[Dict[str, Any]], timestamp: int,
+                seq: Optional[int]) -> bytes:
+        """Sérialiser (JSON ou trame binaire compacte) puis compresser le payload"""
+        if self.implicit:
+            metadata = self._strip_implicit(metadata)
+        elif seq is not None:
+            metadata = dict(metadata or {})
+            metadata.setdefault("sender", self.sequence.sender_id)
+            metadata["seq"] = seq
+
+        with STAGE_SECONDS.time("encode"):
+            payload_data = encode_payload(plaintext, timestamp, metadata, self.frame_format)
+        if self.compressor:
+            with STAGE_SECONDS.time("compress"):
+                payload_data = self.compressor.compress(payload_data)
+        return payload_data
+
+    def _seal(self, payload_data: bytes, seq: Optional[int], nonce: bytes = None) -> bytes:
+        if self.implicit:
+            if seq > self.max_counter:
+                raise Exception("Compteur de nonce épuisé: rotation de clé requise")
+            # Seul le compteur est transmis, le préfixe est connu du récepteur
+            header = seq.to_bytes(self.counter_bytes, "big")
+            nonce = self.prefixes[self.sequence.sender_id] + header
+        else:
+            # Nonce aléatoire transmis en clair
+            header = nonce = nonce or get_random_bytes(NONCE_SIZE)
 
         # Chiffrer avec AES-GCM
-        cipher = AES.new(self.key, AES.MODE_GCM, nonce=nonce)
-        ciphertext, auth_tag = cipher.encrypt_and_digest(json_data)
-
-        # Combiner nonce + auth_tag + ciphertext
-        encrypted_data = nonce + auth_tag + ciphertext
+        with STAGE_SECONDS.time("encrypt"):
+            cipher = AES.new(self.key, AES.MODE_GCM, nonce=nonce)
+            ciphertext, auth_tag = cipher.encrypt_and_digest(payload_data)
 
-        return encrypted_data
+        # Combiner nonce (ou compteur) + auth_tag + ciphertext
+        return header + auth_tag + ciphertext
 
     def decrypt_message(self, encrypted_data: bytes) -> Tuple[str, Dict[str, Any]]:
         """Déchiffrer un message et extraire les métadonnées"""
         try:
-            # Extraire les composants
-            nonce = encrypted_data[:12]
-            auth_tag = encrypted_data[12:28]
-            ciphertext = encrypted_data[28:]
-
-            # Déchiffrer
-            cipher = AES.new(self.key, AES.MODE_GCM, nonce=nonce)
-            json_data = cipher.decrypt_and_verify(ciphertext, auth_tag)
-
-            # Parser le JSON
-            payload = json.loads(json_data.decode('utf-8'))
+            return self._open(encrypted_data, self.compressor)
+        except Exception as e:
+            raise Exception(f"Erreur de déchiffrement: {e}")
 
-            return payload["message"], payload.get("metadata", {})
+    def decrypt_frame(self, encrypted_data: bytes) -> Tuple[List[Tuple[str, Dict[str, Any]]], Dict[str, Any]]:
+        """Déchiffrer une trame simple ou un lot
 
+        Retourne ([(message, métadonnées)...], métadonnées de la trame), ces
+        dernières portant l'émetteur et le numéro de séquence à valider.
+        Un accusé de réception ne contient aucun message: ses métadonnées
+        portent "acknowledgement" (destinataire, base, bitmap).
+        """
+        try:
+            payload = self._open_payload(encrypted_data, self.compressor)
         except Exception as e:
             raise Exception(f"Erreur de déchiffrement: {e}")
+        if "messages" in payload:
+            messages = [(entry["message"], entry["metadata"]) for entry in payload["messages"]]
+            frame_metadata = dict(payload.get("metadata", {}))
+        elif "acknowledgement" in payload:
+            messages = []
+            frame_metadata = dict(payload.get("metadata", {}), acknowledgement=payload["acknowledgement"])
+        else:
+            messages = [(payload["message"], payload.get("metadata", {}))]
+            frame_metadata = dict(messages[0][1])
+        if "key_id" in payload:
+            # Compteur propre à la clé: fenêtre anti-rejeu distincte par clé
+            frame_metadata["key_id"] = payload["key_id"]
+        return messages, frame_metadata
+
+    def _open(self, encrypted_data: bytes, decompressor: Optional[PayloadCompressor]) -> Tuple[str, Dict[str, Any]]:
+        payload = self._open_payload(encrypted_data, decompressor)
+        if "messages" in payload:
+            raise Exception("Trame groupée, à déchiffrer avec decrypt_frame")
+        if "acknowledgement" in payload:
+            raise Exception("Accusé de réception, à déchiffrer avec decrypt_frame")
+        return payload["message"], payload.get("metadata", {})
+
+    def _open_payload(self, encrypted_data: bytes, decompressor: Optional[PayloadCompressor]) -> Dict[str, Any]:
+        payload_data, origin = self._unseal(encrypted_data)
+
+        # Décompresser si l'émetteur a ajouté un drapeau de compression
+        if is_compressed_frame(payload_data):
+            payload_data = (decompressor or PayloadCompressor()).decompress(payload_data)
+
+        # Parser le payload (format détecté automatiquement)
+        payload = decode_payload(payload_data)
+        if origin:
+            # Nonce implicite: émetteur et séquence authentifiés par le nonce, ils
+            # remplacent ceux annoncés dans le payload
+            peer, counter = origin
+            entries = payload["messages"] + [payload] if "messages" in payload else [payload]
+            for entry in entries:
+                metadata = entry.setdefault("metadata", {})
+                metadata["sender"] = peer
+                metadata["seq"] = counter
+            payload["key_id"] = self.key_id
+        return payload
+
+    def _unseal(self, encrypted_data: bytes) -> Tuple[bytes, Optional[Tuple[str, int]]]:
+        """Déchiffrer, retourne (clair, (émetteur, compteur) si le nonce était implicite)"""
+        width = self.counter_bytes
+        if self.peers and len(encrypted_data) >= width + TAG_SIZE:
+            header = encrypted_data[:width]
+            auth_tag = encrypted_data[width:width + TAG_SIZE]
+            ciphertext = encrypted_data[width + TAG_SIZE:]
+            with self.peers_lock:
+                peers = list(self.peers)
+            for peer in peers:
+                cipher = AES.new(self.key, AES.MODE_GCM, nonce=self.prefixes[peer] + header)
+                try:
+                    payload_data = cipher.decrypt_and_verify(ciphertext, auth_tag)
+                except ValueError:
+                    continue
+                if peer != peers[0]:
+                    with self.peers_lock:
+                        self.peers.remove(peer)
+                        self.peers.insert(0, peer)
+                return payload_data, (peer, int.from_bytes(header, "big"))
+
+        # Extraire les composants
+        nonce = encrypted_data[:NONCE_SIZE]
+        auth_tag = encrypted_data[NONCE_SIZE:NONCE_SIZE + TAG_SIZE]
+        ciphertext = encrypted_data[NONCE_SIZE + TAG_SIZE:]
+
+        # Déchiffrer
+        cipher = AES.new(self.key, AES.MODE_GCM, nonce=nonce)
+        return cipher.decrypt_and_verify(ciphertext, auth_tag), None
+
+    def encrypt_many(self, messages: List[Tuple[str, Optional[Dict[str, Any]]]]) -> Tuple[List[Optional[bytes]], Dict[int, str]]:
+        """Chiffrer un lot de (message, métadonnées) sans lever d'exception
+
+        Retourne (trames, erreurs): trames est aligné sur l'entrée (None en
+        cas d'échec) et erreurs associe l'index d'un élément à son erreur.
+        Les nonces sont tirés en un seul appel, l'horodatage et les numéros
+        de séquence une seule fois pour tout le lot.
+        """
+        count = len(messages)
+        nonces = get_random_bytes(NONCE_SIZE * count) if count and not self.implicit else b""
+        timestamp = int(time.time())
+        seqs = self.sequence.next_many(count) if self.sequence else [None] * count
+
+        results: List[Optional[bytes]] = []
+        errors: Dict[int, str] = {}
+        for i, (plaintext, metadata) in enumerate(messages):
+            try:
+                payload_data = self._encode(plaintext, metadata, timestamp, seqs[i])
+                results.append(self._seal(payload_data, seqs[i], nonces[NONCE_SIZE * i:NONCE_SIZE * (i + 1)]))
+            except Exception as e:
+                results.append(None)
+                errors[i] = f"Erreur de chiffrement: {e}"
+        return results, errors
+
+    def decrypt_many(self, frames: List[bytes]) -> Tuple[List[Optional[Tuple[str, Dict[str, Any]]]], Dict[int, str]]:
+        """Déchiffrer un lot de trames sans lever d'exception
+
+        Retourne (messages, erreurs) comme encrypt_many; le décompresseur
+        par défaut n'est créé qu'une fois pour tout le lot.
+        """
+        decompressor = self.compressor or PayloadCompressor()
+        results: List[Optional[Tuple[str, Dict[str, Any]]]] = []
+        errors: Dict[int, str] = {}
+        for i, encrypted_data in enumerate(frames):
+            try:
+                results.append(self._open(encrypted_data, decompressor))
+            except Exception as e:
+                results.append(None)
+                errors[i] = f"Erreur de déchiffrement: {e}"
+        return results, errors
 
     def generate_key_pair(self) -> Tuple[str, str]:
         """Générer une paire de clés (publique/privée) pour l'échange"""
@@ -87,21 +363,34 @@ class SecureCrypto:
         return base64.b64encode(self.key).decode('ascii')
 
     @classmethod
-    def import_key(cls, key_b64: str) -> 'SecureCrypto':
+    def import_key(cls, key_b64: str, **kwargs) -> 'SecureCrypto':
         """Importer une clé depuis base64"""
         key = base64.b64decode(key_b64.encode('ascii'))
-        return cls(key=key)
+        return cls(key=key, **kwargs)
 
 class MessageValidator:
     """Classe pour valider l'intégrité des messages"""
 
-    def __init__(self):
-        self.seen_messages = set()
-        self.max_age = 300  # 5 minutes
+    def __init__(self, max_age: int = 300, window_store_path: str = None, window_size: int = 64,
+                 **cache_options):
+        self.max_age = max_age  # 5 minutes
+        # Fenêtre glissante par émetteur pour les trames numérotées
+        self.windows = ReplayWindowStore(window_store_path, window_size)
+        # Empreintes 64 bits rangées par tranches de temps, évincées par tranche entière
+        self.replay_cache = ReplayCache(max_age=max_age, **cache_options)
 
     def validate_message(self, message: str, metadata: Dict[str, Any]) -> bool:
         """Valider un message (anti-replay, fraîcheur)"""
-        # Vérifier l'âge du message
+        # Trame numérotée: fenêtre glissante, sans horloge ni hachage du texte
+        seq = metadata.get("seq")
+        if type(seq) is int:
+            sender = metadata.get("sender", "")
+            if metadata.get("key_id"):
+                # Nonce implicite: le compteur repart à chaque clé
+                sender = f"{sender}#{metadata['key_id']}"
+            return self.windows.check_and_update(sender, seq)
+
+        # Ancien format: vérifier l'âge du message
         timestamp = metadata.get("timestamp", 0)
         current_time = int(time.time())
 
@@ -109,18 +398,7 @@ class MessageValidator:
             return False
 
         # Vérifier les doublons (anti-replay)
-        message_hash = hashlib.sha256(f"{message}{timestamp}".encode()).hexdigest()
-
-        if message_hash in self.seen_messages:
-            return False
-
-        self.seen_messages.add(message_hash)
-
-        # Nettoyer les anciens hashes
-        if len(self.seen_messages) > 1000:
-            self.seen_messages.clear()
-
-        return True
+        return self.replay_cache.check_and_add(message_digest(message, timestamp), timestamp, current_time)
 
 def generate_secure_password(length: int = 16) -> str:
     """Générer un mot de passe sécurisé"""
@@ -151,6 +429,88 @@ def test_crypto():
     assert message == decrypted_msg
     assert metadata["sender"] == decrypted_meta["sender"]
 
+    # Trame binaire compacte, lisible par un récepteur configuré en JSON
+    compact = SecureCrypto(key=crypto.key, frame_format=FORMAT_BINARY)
+    encrypted_compact = compact.encrypt_message(message, metadata)
+    print(f"Message chiffré (binaire): {len(encrypted_compact)} bytes")
+    assert crypto.decrypt_message(encrypted_compact) == (message, metadata)
+
+    # Compression avec le dictionnaire par défaut
+    compressed = SecureCrypto(key=crypto.key, frame_format=FORMAT_BINARY, compressor=PayloadCompressor())
+    encrypted_compressed = compressed.encrypt_message(message, metadata)
+    print(f"Message chiffré (binaire compressé): {len(encrypted_compressed)} bytes")
+    assert crypto.decrypt_message(encrypted_compressed) == (message, metadata)
+
+    # Numéros de séquence: un même texte renvoyé passe, un rejeu non
+    numbered = SecureCrypto(key=crypto.key, sequence=SequenceCounter("device_1"))
+    expected_size = numbered.message_size(message, metadata)
+    assert numbered.sequence.value == 0
+    assert len(numbered.encrypt_message(message, metadata)) == expected_size
+    validator = MessageValidator()
+    frames = [numbered.encrypt_message(message, metadata) for _ in range(2)]
+    for frame in frames:
+        assert validator.validate_message(*crypto.decrypt_message(frame))
+    assert not validator.validate_message(*crypto.decrypt_message(frames[0]))
+
+    # Chiffrement par lot: une trame corrompue ne fait pas échouer le lot
+    frames, errors = numbered.encrypt_many([(f"lot {i}", metadata) for i in range(4)])
+    assert not errors and all(frames)
+    frames[2] = frames[2][:-1] + bytes([frames[2][-1] ^ 1])
+    decrypted, errors = crypto.decrypt_many(frames)
+    assert list(errors) == [2] and decrypted[2] is None
+    assert decrypted[3][0] == "lot 3" and decrypted[3][1]["seq"] == decrypted[0][1]["seq"] + 3
+
+    # Lot: une seule trame et un seul numéro de séquence pour plusieurs messages
+    batch = [(f"capteur {i}", {"sender": "device_1", "priority": "low"}) for i in range(3)]
+    expected_size = numbered.batch_size(batch)
+    encrypted_batch = numbered.encrypt_batch(batch)
+    assert len(encrypted_batch) == expected_size
+    messages, frame_metadata = crypto.decrypt_frame(encrypted_batch)
+    assert [message for message, _ in messages] == ["capteur 0", "capteur 1", "capteur 2"]
+    assert all(meta["seq"] == frame_metadata["seq"] and meta["priority"] == "low" for _, meta in messages)
+    assert crypto.decrypt_frame(encrypted)[0] == [(message, decrypted_meta)]
+    print(f"Lot de 3 messages chiffré: {len(encrypted_batch)} bytes")
+
+    # Nonce implicite: 4 octets de compteur au lieu de 12 octets de nonce
+    implicit = SecureCrypto(key=crypto.key, frame_format=FORMAT_BINARY,
+                            sequence=SequenceCounter("device_2"), nonce_mode=NONCE_IMPLICIT)
+    random_nonce = SecureCrypto(key=crypto.key, frame_format=FORMAT_BINARY, sequence=SequenceCounter("device_2"))
+    encrypted_implicit = implicit.encrypt_message(message, metadata)
+    assert len(random_nonce.encrypt_message(message, metadata)) - len(encrypted_implicit) >= 8
+    receiver = SecureCrypto(key=crypto.key, peers=["device_1", "device_2"])
+    messages, frame_metadata = receiver.decrypt_frame(encrypted_implicit)
+    # L'émetteur annoncé (device_1) cède la place à celui authentifié par le nonce
+    assert messages[0][0] == message and frame_metadata["seq"] == 1 and frame_metadata["sender"] == "device_2"
+    assert receiver.decrypt_message(encrypted_compact)[0] == message  # nonce aléatoire toujours accepté
+    assert validator.validate_message(message, frame_metadata)
+    assert not validator.validate_message(message, receiver.decrypt_frame(encrypted_implicit)[1])
+    batch_implicit = receiver.decrypt_frame(implicit.encrypt_batch(batch))
+    assert [meta["seq"] for _, meta in batch_implicit[0]] == [2, 2, 2]
+    print(f"Message chiffré (nonce implicite): {len(encrypted_implicit)} bytes")
+
+    # Accusé de réception chiffré, et trame numérotée demandant un accusé
+    ack_frame = implicit.encrypt_ack("device_1", 40, 0b1011)
+    messages, frame_metadata = receiver.decrypt_frame(ack_frame)
+    assert messages == [] and frame_metadata["sender"] == "device_2"
+    assert frame_metadata["acknowledgement"] == {"to": "device_1", "base": 40, "bitmap": 0b1011}
+    acked = numbered.encrypt_batch([(text, dict(metadata, ack=True)) for text, metadata in batch])
+    assert crypto.decrypt_frame(acked)[1]["ack"] is True
+    assert numbered.frame_sequence(acked) == crypto.decrypt_frame(acked)[1]["seq"]
+    assert implicit.frame_sequence(ack_frame) == frame_metadata["seq"]
+    print(f"Accusé de réception chiffré: {len(ack_frame)} bytes")
+
+    # Rotation forcée avant que le compteur ne reboucle
+    short = SecureCrypto(key=crypto.key, sequence=SequenceCounter("device_3"), nonce_mode=NONCE_IMPLICIT,
+                         counter_bytes=2)
+    short.sequence.value = short.max_counter - 100
+    assert short.rotation_needed
+    short.sequence.value = short.max_counter
+    try:
+        short.encrypt_message(message)
+        assert False, "compteur épuisé accepté"
+    except Exception as e:
+        assert "rotation" in str(e)
+
     print("⚪️ Test de chiffrement réussi!")
 
 if __name__ == "__main__":
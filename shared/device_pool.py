@@ -0,0 +1,622 @@
+import time
+import hashlib
+import itertools
+from collections import OrderedDict
+from queue import Queue, Empty, Full
+from threading import Thread, Lock, Event
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+from lora_module import LoRaDevice, RadioConfig, DEFAULT_RFCFG, DEFAULT_BAUDRATE
+from async_lora import AsyncLoRaDevice, LoRaEventLoop
+from tx_scheduler import TxScheduler
+from channel_plan import ChannelPlan, Channel, STRATEGY_ROUND_ROBIN
+
+ROLE_TX = "tx"
+ROLE_RX = "rx"
+ROLE_BOTH = "both"
+ROLES = [ROLE_TX, ROLE_RX, ROLE_BOTH]
+
+STATUS_OK = "ok"
+STATUS_DEGRADED = "degraded"
+STATUS_DOWN = "down"
+
+
+def frame_digest(frame: bytes) -> bytes:
+    """Empreinte courte d'une trame, pour la déduplication entre récepteurs"""
+    return hashlib.blake2b(frame, digest_size=12).digest()
+
+
+def _notify(progress: Optional[Callable], port: str, state: str, error: str = None):
+    """Signaler l'avancement d'une connexion ou d'une déconnexion"""
+    if progress:
+        try:
+            progress(port, state, error)
+        except Exception as e:
+            print(f"Erreur du suivi d'avancement: {e}")
+
+
+class _ChannelGuard:
+    """Vue d'un module pour son ordonnanceur: une seule émission à la fois par canal
+
+    Deux émetteurs du pool sur la même fréquence, le même SF et la même
+    bande passante se brouilleraient chez tous les récepteurs.
+    """
+
+    def __init__(self, member: 'PoolMember', pool: 'DevicePool'):
+        self.member = member
+        self.device = member.device
+        self.pool = pool
+
+    @property
+    def radio_config(self) -> RadioConfig:
+        return self.device.radio_config
+
+    def frame_airtime(self, data_size: int) -> float:
+        return self.device.frame_airtime(data_size)
+
+    def send_data(self, data: bytes) -> bool:
+        with self.pool.channel_lock(self.device.radio_config):
+            success = self.device.send_data(data)
+        if success and self.member.channel and self.pool.channel_plan:
+            self.pool.channel_plan.record(self.member.channel, self.device.frame_airtime(len(data)))
+        return success
+
+
+class PoolMember:
+    """Module du pool: rôle, ordonnanceur d'émission et état de santé"""
+
+    def __init__(self, device: LoRaDevice, role: str, max_failures: int = 3):
+        self.device = device
+        self.role = role
+        self.max_failures = max_failures
+        self.scheduler: Optional[TxScheduler] = None
+        self.channel: Optional[Channel] = None
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self.last_seen = time.time()
+        self.tx_frames = 0
+        self.tx_failures = 0
+        self.rx_frames = 0
+
+    @property
+    def port(self) -> str:
+        return self.device.port
+
+    @property
+    def can_transmit(self) -> bool:
+        return self.role in (ROLE_TX, ROLE_BOTH)
+
+    @property
+    def can_receive(self) -> bool:
+        return self.role in (ROLE_RX, ROLE_BOTH)
+
+    @property
+    def status(self) -> str:
+        if not self.device.is_connected or self.consecutive_failures >= self.max_failures:
+            return STATUS_DOWN
+        if self.consecutive_failures:
+            return STATUS_DEGRADED
+        return STATUS_OK
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.last_seen = time.time()
+
+    def record_failure(self, error: str):
+        self.consecutive_failures += 1
+        self.last_error = error
+
+    def get_status(self) -> dict:
+        status = {
+            "port": self.port,
+            "role": self.role,
+            "status": self.status,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "last_seen": self.last_seen,
+            "tx_frames": self.tx_frames,
+            "tx_failures": self.tx_failures,
+            "rx_frames": self.rx_frames,
+            "radio_config": self.device.radio_config.to_dict(),
+            "baudrate": self.device.baudrate,
+            "channel": self.channel.name if self.channel else None
+        }
+        if self.can_receive:
+            status["rx"] = self.device.get_rx_stats()
+        if self.scheduler:
+            status["queue_depth"] = len(self.scheduler.queue)
+        return status
+
+
+class DevicePool:
+    """Pool de N modules LoRa, chacun émetteur, récepteur ou les deux
+
+    Chaque émetteur a son propre ordonnanceur (priorités, rapport cyclique
+    du module); une trame part vers l'émetteur en bonne santé qui
+    l'émettra le plus tôt; les émetteurs d'un même canal émettent à tour
+    de rôle, le débit agrégé croît donc avec le nombre de canaux distincts
+    (voir ChannelPlan). Chaque récepteur lit son flux série dans son propre
+    thread; avec event_loop, les modules sont des AsyncLoRaDevice dont les
+    commandes, émissions et réceptions passent toutes par cette boucle
+    asyncio, sans thread de lecture. Les trames de tous les récepteurs sont
+    fusionnées dans une seule file, sans doublons: une trame entendue par
+    plusieurs récepteurs n'est livrée qu'une fois pendant dedup_window
+    secondes. Une trame entendue à nouveau par le même récepteur est une
+    nouvelle émission (retransmission après un accusé perdu) et elle est
+    livrée.
+    """
+
+    def __init__(self, mtu: int = None, radio_config: RadioConfig = None,
+                 dedup_window: float = 30.0, max_failures: int = 3, health_interval: float = 30.0,
+                 on_frame: Callable = None, channel_plan: ChannelPlan = None, max_baudrate: int = None,
+                 event_loop: LoRaEventLoop = None):
+        self.mtu = mtu
+        self.event_loop = event_loop
+        # Débit série visé à la connexion de chaque module (négocié, None pour le garder)
+        self.max_baudrate = max_baudrate
+        self.radio_config = radio_config or RadioConfig.from_rfcfg(DEFAULT_RFCFG)
+        self.dedup_window = dedup_window
+        self.max_failures = max_failures
+        self.health_interval = health_interval
+        self.on_frame = on_frame
+        self.channel_plan = channel_plan
+
+        self.members: Dict[str, PoolMember] = {}
+        self.lock = Lock()
+        self.rx_queue: Queue = Queue(maxsize=1024)
+        self.rx_overflows = 0
+        self.duplicates = 0
+        # empreinte -> (instant d'expiration, récepteurs l'ayant entendue), par expiration
+        self.seen: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self.seen_lock = Lock()
+        self.round_robin = itertools.count()
+        self.channel_locks: Dict[tuple, Lock] = {}
+
+        self.stop_event = Event()
+        self.health_thread: Thread = None
+
+    def add_devices(self, devices: List[dict], progress: Callable = None,
+                    max_workers: int = 8) -> Tuple[List[PoolMember], Dict[str, str]]:
+        """Connecter plusieurs modules en parallèle, retourne (ajoutés, {port: erreur})
+
+        devices: [{"port", "role", "baudrate", "max_baudrate", "radio_config"}]
+        (rôle, débits et configuration optionnels). progress(port, état, erreur) est appelé à
+        chaque étape: "connecting", "ready" ou "failed".
+        """
+        for spec in devices:
+            if spec.get("role", ROLE_BOTH) not in ROLES:
+                raise ValueError(f"Rôle inconnu: {spec.get('role')}")
+            if spec["port"] in self.members:
+                raise ValueError(f"Module déjà dans le pool: {spec['port']}")
+
+        # Avec un plan de canaux, le canal affecté remplace fréquence, SF et BW
+        assignment = {}
+        if self.channel_plan:
+            assignment = self._assign_channels(extra=[(spec["port"], spec.get("role", ROLE_BOTH))
+                                                      for spec in devices])
+
+        members, errors = [], {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(devices)))) as executor:
+            futures = {executor.submit(self._open_member, spec, assignment.get(spec["port"]), progress): spec["port"]
+                       for spec in devices}
+            for future in as_completed(futures):
+                port = futures[future]
+                try:
+                    members.append(future.result())
+                except Exception as e:
+                    errors[port] = str(e)
+                    _notify(progress, port, "failed", str(e))
+
+        with self.lock:
+            for member in members:
+                self.members[member.port] = member
+        if self.channel_plan and members:
+            # L'arrivée de modules peut déplacer les récepteurs déjà affectés
+            self._apply_channel_plan()
+        if members:
+            self._start_health_thread()
+        return members, errors
+
+    def add_device(self, port: str, role: str = ROLE_BOTH, baudrate: int = DEFAULT_BAUDRATE,
+                   radio_config: RadioConfig = None) -> PoolMember:
+        """Connecter un module et l'ajouter au pool (exception si la connexion échoue)"""
+        members, errors = self.add_devices([{"port": port, "role": role, "baudrate": baudrate,
+                                             "radio_config": radio_config}])
+        if errors:
+            raise Exception(errors[port])
+        return members[0]
+
+    def _open_member(self, spec: dict, channel: Optional[Channel], progress: Callable) -> PoolMember:
+        """Connecter un module et démarrer sa lecture continue et son ordonnanceur"""
+        port = spec["port"]
+        _notify(progress, port, "connecting")
+        config = (spec.get("radio_config") or self.radio_config).copy()
+        if channel:
+            config = channel.apply_to(config)
+
+        options = dict(mtu=self.mtu, radio_config=config, max_baudrate=spec.get("max_baudrate", self.max_baudrate))
+        if self.event_loop:
+            device = AsyncLoRaDevice(port, spec.get("baudrate") or DEFAULT_BAUDRATE, event_loop=self.event_loop,
+                                     **options)
+        else:
+            device = LoRaDevice(port, spec.get("baudrate") or DEFAULT_BAUDRATE, **options)
+        if not device.connect():
+            raise Exception(f"Impossible de connecter le module {port}")
+
+        member = PoolMember(device, spec.get("role", ROLE_BOTH), self.max_failures)
+        member.channel = channel
+        # Lecture continue aussi pour un émetteur seul: l'émission attend alors TX DONE
+        if member.can_receive:
+            callback = lambda frame, signal_info: self._on_device_frame(member, frame, signal_info)
+        else:
+            callback = self._ignore_frame
+        if not device.start_streaming(callback):
+            print(f"⚠️ Lecture continue indisponible sur {port}")
+        if member.can_transmit:
+            member.scheduler = TxScheduler(_ChannelGuard(member, self))
+            member.scheduler.start()
+        _notify(progress, port, "ready")
+        return member
+
+    def remove_device(self, port: str, reset: bool = False, progress: Callable = None):
+        """Retirer un module du pool (ATZ optionnel avant fermeture)"""
+        with self.lock:
+            member = self.members.pop(port, None)
+        if not member:
+            return
+        _notify(progress, port, "disconnecting")
+        if member.scheduler:
+            member.scheduler.stop()
+        if reset and member.device.is_connected:
+            try:
+                member.device._send_command("ATZ")
+            except Exception as e:
+                print(f"Erreur reset {port}: {e}")
+        member.device.disconnect()
+        _notify(progress, port, "disconnected")
+
+    def close(self, reset: bool = False, progress: Callable = None):
+        """Retirer tous les modules en parallèle et arrêter la surveillance"""
+        self.stop_event.set()
+        ports = list(self.members)
+        if ports:
+            with ThreadPoolExecutor(max_workers=min(8, len(ports))) as executor:
+                list(executor.map(lambda port: self.remove_device(port, reset, progress), ports))
+        if self.health_thread:
+            self.health_thread.join(timeout=1.0)
+        self.health_thread = None
+
+    def get_members(self, role: str = None) -> List[PoolMember]:
+        with self.lock:
+            members = list(self.members.values())
+        if role == ROLE_TX:
+            return [member for member in members if member.can_transmit]
+        if role == ROLE_RX:
+            return [member for member in members if member.can_receive]
+        return members
+
+    def has_transmitter(self) -> bool:
+        return any(member.status != STATUS_DOWN for member in self.get_members(ROLE_TX))
+
+    def has_receiver(self) -> bool:
+        return any(member.status != STATUS_DOWN for member in self.get_members(ROLE_RX))
+
+    # Plan de canaux
+
+    def _assign_channels(self, extra: List[tuple] = None) -> Dict[str, Channel]:
+        """Affectation du plan pour les modules du pool (et ceux à venir: [(port, rôle)])"""
+        roles = [(member.port, member.role) for member in self.get_members()] + (extra or [])
+        transmitters = [port for port, role in roles if role in (ROLE_TX, ROLE_BOTH)]
+        receivers = [port for port, role in roles if role in (ROLE_RX, ROLE_BOTH)]
+        return self.channel_plan.assign(transmitters, receivers)
+
+    def _apply_channel_plan(self) -> bool:
+        """Reconfigurer les modules dont le canal affecté a changé"""
+        assignment = self._assign_channels() if self.channel_plan else {}
+        success = True
+        for member in self.get_members():
+            channel = assignment.get(member.port)
+            if channel is member.channel:
+                continue
+            current = member.device.radio_config
+            if channel:
+                # SF commun (ADR) sauf s'il est imposé par le canal
+                config = channel.apply_to(current.copy(sf=self.radio_config.sf))
+            else:
+                config = current.copy(frequency=self.radio_config.frequency,
+                                      sf=self.radio_config.sf, bw=self.radio_config.bw)
+            if member.device.apply_radio_config(config):
+                member.channel = channel
+            else:
+                success = False
+        return success
+
+    def set_channel_plan(self, plan: Optional[ChannelPlan]) -> bool:
+        """Remplacer le plan de canaux (None: tous les modules sur la configuration commune)"""
+        self.channel_plan = plan
+        return self._apply_channel_plan()
+
+    def get_channel_status(self) -> dict:
+        """Plan courant, occupation de chaque canal et modules affectés"""
+        if not self.channel_plan:
+            return {"plan": None, "channels": []}
+        channels = self.channel_plan.get_utilisation()
+        for channel, usage in zip(self.channel_plan.channels, channels):
+            usage["transmitters"] = [m.port for m in self.get_members(ROLE_TX) if m.channel is channel]
+            usage["receivers"] = [m.port for m in self.get_members(ROLE_RX) if m.channel is channel]
+        return {"plan": self.channel_plan.to_dict(), "channels": channels}
+
+    # Émission
+
+    def _pick_transmitter(self, data_size: int, priority: str) -> PoolMember:
+        """Émetteur en bonne santé qui émettra le plus tôt (à égalité, tourniquet)
+
+        Avec un plan de canaux, la stratégie du plan passe avant (round_robin)
+        ou départage les émetteurs aussi disponibles (least_used).
+        """
+        candidates = [member for member in self.get_members(ROLE_TX) if member.status != STATUS_DOWN]
+        if not candidates:
+            raise Exception("Aucun émetteur LoRa disponible")
+
+        offset = next(self.round_robin)
+        rotated = candidates[offset % len(candidates):] + candidates[:offset % len(candidates)]
+        delay = lambda member: member.scheduler.estimate(data_size, priority)["estimated_delay_s"]
+
+        planned = [member for member in rotated if member.channel]
+        if not self.channel_plan or not planned:
+            return min(rotated, key=lambda member: (member.status != STATUS_OK, delay(member)))
+
+        channels = []
+        for member in planned:
+            if member.channel not in channels:
+                channels.append(member.channel)
+        rank = {id(channel): i for i, channel in enumerate(self.channel_plan.order(channels))}
+        if self.channel_plan.strategy == STRATEGY_ROUND_ROBIN:
+            key = lambda member: (member.status != STATUS_OK, rank[id(member.channel)], delay(member))
+        else:
+            key = lambda member: (member.status != STATUS_OK, delay(member), rank[id(member.channel)])
+        return min(planned, key=key)
+
+    def submit(self, data: bytes, priority: str = "normal", on_sent: Callable = None) -> dict:
+        """Mettre une trame en file sur le meilleur émetteur, on_sent(success) après l'émission"""
+        member = self._pick_transmitter(len(data), priority)
+
+        def sent(success: bool):
+            if success:
+                member.tx_frames += 1
+                member.record_success()
+            else:
+                member.tx_failures += 1
+                member.record_failure("Échec d'émission")
+            if on_sent:
+                on_sent(success)
+
+        ticket = member.scheduler.submit(data, priority, sent)
+        ticket["port"] = member.port
+        return ticket
+
+    def estimate(self, data_size: int, priority: str = "normal") -> dict:
+        member = self._pick_transmitter(data_size, priority)
+        estimate = member.scheduler.estimate(data_size, priority)
+        estimate["port"] = member.port
+        return estimate
+
+    def channel_lock(self, config: RadioConfig) -> Lock:
+        """Verrou d'émission partagé par les modules d'un même canal"""
+        key = (config.frequency, config.sf, config.bw)
+        with self.lock:
+            if key not in self.channel_locks:
+                self.channel_locks[key] = Lock()
+            return self.channel_locks[key]
+
+    def frame_airtime(self, data_size: int) -> float:
+        members = self.get_members(ROLE_TX)
+        if not members:
+            return 0.0
+        return members[0].device.frame_airtime(data_size)
+
+    def apply_radio_config(self, config: RadioConfig) -> bool:
+        """Appliquer une configuration radio à tous les modules
+
+        Un module affecté à un canal du plan garde sa fréquence et sa bande
+        passante, et son SF si le canal en impose un: les autres réglages
+        (SF choisi par l'ADR, puissance...) changent.
+        """
+        self.radio_config = config
+        results = [member.device.apply_radio_config(member.channel.apply_to(config) if member.channel
+                                                    else config.copy())
+                   for member in self.get_members()]
+        return all(results)
+
+    # Réception
+
+    @staticmethod
+    def _ignore_frame(frame: bytes, signal_info: dict):
+        pass
+
+    def _is_duplicate(self, digest: bytes, port: str) -> bool:
+        """Vérifier si une autre réception de la même émission a déjà été livrée, sinon la retenir"""
+        now = time.monotonic()
+        with self.seen_lock:
+            while self.seen:
+                oldest, (expires_at, _) = next(iter(self.seen.items()))
+                if expires_at > now:
+                    break
+                del self.seen[oldest]
+            if digest in self.seen and port not in self.seen[digest][1]:
+                self.seen[digest][1].add(port)
+                return True
+            self.seen[digest] = (now + self.dedup_window, {port})
+            self.seen.move_to_end(digest)
+            return False
+
+    def _on_device_frame(self, member: PoolMember, frame: bytes, signal_info: dict):
+        member.rx_frames += 1
+        member.record_success()
+
+        if self._is_duplicate(frame_digest(frame), member.port):
+            self.duplicates += 1
+            return
+
+        signal_info = signal_info or {}
+        signal_info["port"] = member.port
+        if self.on_frame:
+            try:
+                self.on_frame(frame, signal_info)
+            except Exception as e:
+                print(f"Erreur du callback de réception: {e}")
+            return
+        try:
+            self.rx_queue.put_nowait((frame, signal_info))
+        except Full:
+            self.rx_overflows += 1
+
+    def receive_frame(self, timeout: float = 1.0) -> tuple:
+        """Prochaine trame du flux fusionné: (données, infos de signal)"""
+        try:
+            return self.rx_queue.get(timeout=timeout)
+        except Empty:
+            return b"", None
+
+    def get_signal_info(self) -> dict:
+        """Qualité du dernier paquet reçu, tous récepteurs confondus"""
+        latest = None
+        for member in self.get_members(ROLE_RX):
+            info = member.device.last_signal_info
+            if info and (latest is None or info["received_at"] > latest["received_at"]):
+                latest = dict(info, port=member.port)
+        if latest:
+            return latest
+        return {"rssi": None, "snr": None, "frequency": self.radio_config.frequency,
+                "sf": self.radio_config.sf}
+
+    # Santé
+
+    def _start_health_thread(self):
+        if self.health_thread or not self.health_interval:
+            return
+        self.stop_event.clear()
+        self.health_thread = Thread(target=self._health_loop, daemon=True)
+        self.health_thread.start()
+
+    def _health_loop(self):
+        while not self.stop_event.wait(self.health_interval):
+            self.check_health()
+
+    def check_health(self):
+        """Interroger (AT) les modules silencieux depuis health_interval secondes"""
+        now = time.time()
+        for member in self.get_members():
+            if member.status == STATUS_OK and now - member.last_seen < self.health_interval:
+                continue
+            if not member.device.is_connected:
+                continue
+            try:
+                with member.device.tx_lock:
+                    member.device._send_command("AT", timeout=0.5)
+                member.record_success()
+            except Exception as e:
+                member.record_failure(str(e))
+
+    def get_status(self) -> dict:
+        members = self.get_members()
+        return {
+            "devices": [member.get_status() for member in members],
+            "transmitters": sum(1 for member in members if member.can_transmit and member.status != STATUS_DOWN),
+            "receivers": sum(1 for member in members if member.can_receive and member.status != STATUS_DOWN),
+            "rx_duplicates": self.duplicates,
+            "rx_overflows": self.rx_overflows,
+            "rx_queue_depth": self.rx_queue.qsize(),
+            "channel_plan": self.channel_plan.to_dict() if self.channel_plan else None
+        }
+
+    def get_scheduler_status(self) -> dict:
+        """État des files d'émission, global et par émetteur"""
+        per_device = {member.port: member.scheduler.get_status() for member in self.get_members(ROLE_TX)}
+        return {
+            "queue_depth": sum(status["queue_depth"] for status in per_device.values()),
+            "sent": sum(status["sent"] for status in per_device.values()),
+            "failed": sum(status["failed"] for status in per_device.values()),
+            "airtime_used_s": round(sum(status["airtime_used_s"] for status in per_device.values()), 3),
+            "devices": per_device
+        }
+
+
+def test_device_pool():
+    """Comparer le débit d'un et de deux couples émetteur/récepteur émulés"""
+    import threading
+    from modem_emulator import RadioChannel
+
+    def run(pairs: int, count: int, extra_receiver: bool = False, event_loop: LoRaEventLoop = None) -> float:
+        channel = RadioChannel(time_scale=0.05, seed=1)
+        # Un couple par canal du plan: les émetteurs ne se brouillent pas
+        plan = ChannelPlan([Channel(865.125 + 0.2 * i) for i in range(pairs)], STRATEGY_ROUND_ROBIN)
+        pool = DevicePool(health_interval=0, channel_plan=plan, event_loop=event_loop)
+        try:
+            for i in range(pairs):
+                pool.add_device(channel.add_modem(f"tx{i}").port, ROLE_TX)
+                pool.add_device(channel.add_modem(f"rx{i}").port, ROLE_RX)
+            if extra_receiver:
+                # Récepteur supplémentaire sur le premier canal: ses trames sont des doublons
+                pool.add_device(channel.add_modem("rx_extra").port, ROLE_RX)
+            if event_loop:
+                # Aucun thread de lecture par module: la boucle lit tous les ports
+                assert not [thread for thread in threading.enumerate() if "_reader_loop" in thread.name]
+
+            start = time.perf_counter()
+            payloads = [bytes([i]) * 100 for i in range(count)]
+            for payload in payloads:
+                pool.submit(payload)
+            received = set()
+            while len(received) < count and time.perf_counter() - start < 10:
+                frame, _ = pool.receive_frame(timeout=0.5)
+                if frame:
+                    received.add(frame)
+            elapsed = time.perf_counter() - start
+            assert received == set(payloads), len(received)
+            time.sleep(0.1)
+            assert (pool.duplicates > 0) == extra_receiver, pool.duplicates
+            shares = [usage["share"] for usage in pool.get_channel_status()["channels"]]
+            assert max(shares) - min(shares) < 0.2, shares
+            return count / elapsed
+        finally:
+            pool.close()
+            channel.close()
+
+    # Démarrage à froid de 8 modules en parallèle, jusqu'à la réception armée
+    channel = RadioChannel(seed=1)
+    pool = DevicePool(health_interval=0)
+    states = []
+    ports = [channel.add_modem().port for _ in range(8)]
+    start = time.perf_counter()
+    members, errors = pool.add_devices([{"port": port, "role": ROLE_BOTH} for port in ports],
+                                       progress=lambda port, state, error: states.append(state))
+    bring_up = time.perf_counter() - start
+    assert len(members) == 8 and not errors and states.count("ready") == 8
+    assert all(member.device.streaming for member in members)
+    start = time.perf_counter()
+    pool.close(reset=True)
+    teardown = time.perf_counter() - start
+    channel.close()
+    print(f"8 modules: prêts en {bring_up * 1000:.0f} ms, réinitialisés en {teardown * 1000:.0f} ms")
+    assert bring_up < 1.0
+
+    single = run(1, 20)
+    double = run(2, 20, extra_receiver=True)
+    print(f"Débit: 1 couple {single:.1f} trames/s, 2 couples {double:.1f} trames/s")
+    assert double > single * 1.5
+
+    # Mêmes échanges avec tous les modules sur une seule boucle asyncio
+    event_loop = LoRaEventLoop()
+    try:
+        shared_loop = run(2, 20, extra_receiver=True, event_loop=event_loop)
+    finally:
+        event_loop.stop()
+    print(f"Débit sur une boucle asyncio: 2 couples {shared_loop:.1f} trames/s")
+    assert shared_loop > single * 1.5
+    print("⚪️ Test du pool de modules réussi!")
+
+
+if __name__ == "__main__":
+    test_device_pool()
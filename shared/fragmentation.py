@@ -0,0 +1,234 @@
+import time
+import random
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Optional
+
+# En-tête de fragment: marqueur (1) | id de message (2) | index (1) | nombre de fragments (1)
+FRAGMENT_HEADER_SIZE = 5
+MAX_FRAGMENTS = 255
+# Premier octet réservé aux fragments: une trame tenant dans un paquet part sans en-tête,
+# lisible par un nœud sans fragmentation, sauf si elle commence elle-même par cet octet
+FRAGMENT_MARKER = 0xFF
+
+# Charge utile maximale d'un paquet LoRa envoyé par AT+TEST=TXLRPKT
+MAX_LORA_PAYLOAD = 255
+DEFAULT_MTU = 240
+
+
+class FragmentationError(Exception):
+    """Erreur de fragmentation d'une trame"""
+
+
+class Fragmenter:
+    """Classe pour découper les trames à la taille d'un paquet LoRa
+
+    Une trame d'au plus mtu octets est émise telle quelle; seules les
+    trames plus longues (ou commençant par FRAGMENT_MARKER) reçoivent un
+    en-tête par fragment. Les ids de message partent d'une valeur
+    aléatoire sur 16 bits: deux émetteurs (modules d'un même pool ou
+    nœuds distincts) ne numérotent pas leurs messages en même temps.
+    """
+
+    def __init__(self, mtu: int = DEFAULT_MTU):
+        if not FRAGMENT_HEADER_SIZE < mtu <= MAX_LORA_PAYLOAD:
+            raise FragmentationError(f"MTU invalide: {mtu}")
+        self.mtu = mtu
+        self.next_message_id = random.getrandbits(16)
+
+    @property
+    def max_chunk(self) -> int:
+        return self.mtu - FRAGMENT_HEADER_SIZE
+
+    def fragment(self, data: bytes) -> List[bytes]:
+        """Découper une trame en fragments préfixés par leur en-tête"""
+        if len(data) <= self.mtu and not data.startswith(bytes([FRAGMENT_MARKER])):
+            return [data]
+
+        count = max(1, -(-len(data) // self.max_chunk))
+        if count > MAX_FRAGMENTS:
+            raise FragmentationError(f"Trame trop longue: {len(data)} bytes")
+
+        message_id = self.next_message_id
+        self.next_message_id = (self.next_message_id + 1) & 0xFFFF
+
+        return [
+            bytes([FRAGMENT_MARKER]) + message_id.to_bytes(2, "big") + bytes([index, count]) + data[index * self.max_chunk:(index + 1) * self.max_chunk]
+            for index in range(count)
+        ]
+
+
+class _PendingMessage:
+    """Message en cours de réassemblage"""
+
+    def __init__(self, count: int):
+        self.count = count
+        self.chunks = {}
+        self.size = 0
+        self.started_at = time.time()
+
+
+class Reassembler:
+    """Classe pour réassembler les fragments reçus avec un tampon borné"""
+
+    def __init__(self, timeout: float = 30.0, max_pending: int = 16, max_buffer_bytes: int = 16384):
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.max_buffer_bytes = max_buffer_bytes
+        self.pending: "OrderedDict[tuple, _PendingMessage]" = OrderedDict()
+        self.buffered_bytes = 0
+        self.lock = Lock()
+
+        # Métriques
+        self.peak_buffered_bytes = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.timed_out = 0
+        self.dropped = 0
+        self.invalid = 0
+        self.reassembled = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def add_fragment(self, fragment: bytes, source: str = None) -> Optional[bytes]:
+        """Ajouter un fragment, retourne la trame complète quand elle est prête"""
+        if not fragment.startswith(bytes([FRAGMENT_MARKER])):
+            # Chemin rapide: trame tenant dans un paquet, sans en-tête
+            with self.lock:
+                self.completed += 1
+            return fragment
+
+        if len(fragment) < FRAGMENT_HEADER_SIZE:
+            with self.lock:
+                self.invalid += 1
+            return None
+
+        message_id = int.from_bytes(fragment[1:3], "big")
+        index, count = fragment[3], fragment[4]
+        chunk = fragment[FRAGMENT_HEADER_SIZE:]
+
+        with self.lock:
+            if count == 0 or index >= count:
+                self.invalid += 1
+                return None
+
+            # Trame d'un seul paquet commençant par le marqueur
+            if count == 1:
+                self.completed += 1
+                return chunk
+
+            self._expire(time.time())
+            key = (source, message_id)
+            pending = self.pending.get(key)
+
+            # Même id avec un autre nombre de fragments: ancien message abandonné
+            if pending and pending.count != count:
+                self._drop(key)
+                self.dropped += 1
+                pending = None
+
+            if pending is None:
+                pending = _PendingMessage(count)
+                self.pending[key] = pending
+
+            if index not in pending.chunks:
+                pending.chunks[index] = chunk
+                pending.size += len(chunk)
+                self.buffered_bytes += len(chunk)
+
+            if len(pending.chunks) == count:
+                del self.pending[key]
+                self.buffered_bytes -= pending.size
+                latency = time.time() - pending.started_at
+                self.completed += 1
+                self.reassembled += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+                return b"".join(pending.chunks[i] for i in range(count))
+
+            # Borner la mémoire en abandonnant les messages les plus anciens
+            while self.pending and (len(self.pending) > self.max_pending
+                                    or self.buffered_bytes > self.max_buffer_bytes):
+                self._drop(next(iter(self.pending)))
+                self.dropped += 1
+
+            self.peak_pending = max(self.peak_pending, len(self.pending))
+            self.peak_buffered_bytes = max(self.peak_buffered_bytes, self.buffered_bytes)
+            return None
+
+    def expire(self) -> int:
+        """Abandonner les messages incomplets trop anciens"""
+        with self.lock:
+            return self._expire(time.time())
+
+    def _expire(self, now: float) -> int:
+        expired = [key for key, pending in self.pending.items() if now - pending.started_at > self.timeout]
+        for key in expired:
+            self._drop(key)
+        self.timed_out += len(expired)
+        return len(expired)
+
+    def _drop(self, key: tuple):
+        pending = self.pending.pop(key)
+        self.buffered_bytes -= pending.size
+
+    def get_metrics(self) -> dict:
+        """Obtenir les métriques de mémoire et de latence du réassemblage"""
+        with self.lock:
+            return {
+                "pending_messages": len(self.pending),
+                "buffered_bytes": self.buffered_bytes,
+                "peak_pending_messages": self.peak_pending,
+                "peak_buffered_bytes": self.peak_buffered_bytes,
+                "max_buffer_bytes": self.max_buffer_bytes,
+                "completed": self.completed,
+                "timed_out": self.timed_out,
+                "dropped": self.dropped,
+                "invalid": self.invalid,
+                "reassembled": self.reassembled,
+                "avg_latency_ms": round(self.total_latency / self.reassembled * 1000, 1) if self.reassembled else 0.0,
+                "max_latency_ms": round(self.max_latency * 1000, 1)
+            }
+
+
+def test_fragmentation():
+    """Tester la fragmentation et le réassemblage dans le désordre"""
+    fragmenter = Fragmenter(mtu=32)
+    reassembler = Reassembler(max_pending=2)
+
+    data = bytes(range(200))
+    fragments = fragmenter.fragment(data)
+    assert len(fragments) == 8
+    assert all(len(f) <= 32 for f in fragments)
+
+    result = None
+    for fragment in reversed(fragments):
+        result = reassembler.add_fragment(fragment, "radio") or result
+    assert result == data
+
+    # Un message court part sans en-tête, sauf s'il commence par le marqueur
+    assert fragmenter.fragment(b"hello") == [b"hello"]
+    assert reassembler.add_fragment(b"hello") == b"hello"
+    escaped = fragmenter.fragment(b"\xffhello")
+    assert len(escaped) == 1 and reassembler.add_fragment(escaped[0]) == b"\xffhello"
+    assert len(fragmenter.fragment(bytes(32))) == 1 and len(fragmenter.fragment(bytes(33))) == 2
+
+    # Deux émetteurs vers le même récepteur, ids tirés au hasard: fragments entrelacés sans mélange
+    other = Fragmenter(mtu=32)
+    if other.next_message_id == fragmenter.next_message_id:
+        other.next_message_id += 1
+    first, second = fragmenter.fragment(data), other.fragment(bytes(200))
+    results = [reassembler.add_fragment(fragment, "radio") for pair in zip(first, second) for fragment in pair]
+    assert [frame for frame in results if frame] == [data, bytes(200)]
+
+    # Les messages incomplets sont bornés
+    for _ in range(3):
+        reassembler.add_fragment(fragmenter.fragment(data)[0])
+    metrics = reassembler.get_metrics()
+    assert metrics["pending_messages"] == 2 and metrics["dropped"] == 1
+    print(f"Métriques: {metrics}")
+    print("⚪️ Test de fragmentation réussi!")
+
+
+if __name__ == "__main__":
+    test_fragmentation()
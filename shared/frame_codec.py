@@ -0,0 +1,395 @@
+import json
+from typing import Tuple, Dict, Any, List
+
+# Formats de trame supportés par SecureCrypto
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+FRAME_FORMATS = (FORMAT_JSON, FORMAT_BINARY)
+
+# Version du format binaire (premier octet du clair, distinct de '{')
+FRAME_VERSION = 0x01
+
+# Types de trame (second octet de l'en-tête)
+FRAME_TYPE_MESSAGE = 0x00
+FRAME_TYPE_BATCH = 0x01
+FRAME_TYPE_ACK = 0x02
+
+# Identifiants des clés de métadonnées connues (4 bits)
+KEY_CUSTOM = 0x0
+KNOWN_KEYS = {
+    "sender": 0x1,
+    "priority": 0x2,
+    "timestamp": 0x3,
+    "seq": 0x4,
+    "ack": 0x5,
+}
+KNOWN_KEY_NAMES = {key_id: name for name, key_id in KNOWN_KEYS.items()}
+
+# Types de valeur (4 bits)
+VALUE_STR = 0x0
+VALUE_INT = 0x1
+VALUE_JSON = 0x2
+VALUE_FRAME_TIMESTAMP = 0x3  # Valeur identique au timestamp de la trame
+VALUE_PRIORITY = 0x4
+VALUE_BOOL = 0x5
+
+PRIORITIES = ["low", "normal", "high", "urgent"]
+
+
+class FrameError(Exception):
+    """Erreur de décodage d'une trame binaire"""
+
+
+def encode_varint(value: int) -> bytes:
+    """Encoder un entier positif en varint (LEB128)"""
+    if value < 0:
+        raise FrameError(f"Varint négatif: {value}")
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def decode_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    """Décoder un varint, retourne (valeur, nouvel offset)"""
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise FrameError("Varint tronqué")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+        if shift > 63:
+            raise FrameError("Varint trop long")
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) if value >= 0 else ((-value << 1) - 1)
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+
+def _encode_bytes(data: bytes) -> bytes:
+    return encode_varint(len(data)) + data
+
+
+def _decode_bytes(data: bytes, offset: int) -> Tuple[bytes, int]:
+    length, offset = decode_varint(data, offset)
+    end = offset + length
+    if end > len(data):
+        raise FrameError("Champ tronqué")
+    return data[offset:end], end
+
+
+def _encode_value(key: str, value: Any, timestamp: int) -> Tuple[int, bytes]:
+    """Choisir la représentation la plus compacte d'une valeur"""
+    if key == "timestamp" and value == timestamp and type(value) is int:
+        return VALUE_FRAME_TIMESTAMP, b""
+    if key == "priority" and value in PRIORITIES:
+        return VALUE_PRIORITY, bytes([PRIORITIES.index(value)])
+    if type(value) is bool:
+        return VALUE_BOOL, bytes([value])
+    if isinstance(value, str):
+        return VALUE_STR, _encode_bytes(value.encode("utf-8"))
+    if type(value) is int:
+        return VALUE_INT, encode_varint(_zigzag(value))
+    # float, None, listes, dictionnaires...
+    return VALUE_JSON, _encode_bytes(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def _decode_value(value_type: int, data: bytes, offset: int, timestamp: int) -> Tuple[Any, int]:
+    if value_type == VALUE_FRAME_TIMESTAMP:
+        return timestamp, offset
+    if value_type == VALUE_PRIORITY:
+        if offset >= len(data) or data[offset] >= len(PRIORITIES):
+            raise FrameError("Priorité invalide")
+        return PRIORITIES[data[offset]], offset + 1
+    if value_type == VALUE_BOOL:
+        if offset >= len(data):
+            raise FrameError("Booléen tronqué")
+        return bool(data[offset]), offset + 1
+    if value_type == VALUE_STR:
+        raw, offset = _decode_bytes(data, offset)
+        return raw.decode("utf-8"), offset
+    if value_type == VALUE_INT:
+        raw, offset = decode_varint(data, offset)
+        return _unzigzag(raw), offset
+    if value_type == VALUE_JSON:
+        raw, offset = _decode_bytes(data, offset)
+        return json.loads(raw.decode("utf-8")), offset
+    raise FrameError(f"Type de valeur inconnu: {value_type}")
+
+
+def _encode_metadata(metadata: Dict[str, Any], timestamp: int) -> bytes:
+    """nb métadonnées (varint) | métadonnées..."""
+    out = bytearray(encode_varint(len(metadata)))
+    for key, value in metadata.items():
+        key_id = KNOWN_KEYS.get(key, KEY_CUSTOM)
+        value_type, encoded = _encode_value(key, value, timestamp)
+        out.append((key_id << 4) | value_type)
+        if key_id == KEY_CUSTOM:
+            out += _encode_bytes(key.encode("utf-8"))
+        out += encoded
+    return bytes(out)
+
+
+def _decode_metadata(data: bytes, offset: int, timestamp: int) -> Tuple[Dict[str, Any], int]:
+    count, offset = decode_varint(data, offset)
+    metadata = {}
+    for _ in range(count):
+        if offset >= len(data):
+            raise FrameError("Métadonnées tronquées")
+        key_id, value_type = data[offset] >> 4, data[offset] & 0x0F
+        offset += 1
+        if key_id == KEY_CUSTOM:
+            raw_key, offset = _decode_bytes(data, offset)
+            key = raw_key.decode("utf-8")
+        elif key_id in KNOWN_KEY_NAMES:
+            key = KNOWN_KEY_NAMES[key_id]
+        else:
+            raise FrameError(f"Clé de métadonnée inconnue: {key_id}")
+        metadata[key], offset = _decode_value(value_type, data, offset, timestamp)
+    return metadata, offset
+
+
+def _entry_metadata(metadata: Dict[str, Any], common: Dict[str, Any]) -> Dict[str, Any]:
+    """Métadonnées propres à un message d'un lot (sans celles communes à la trame)"""
+    return {key: value for key, value in (metadata or {}).items()
+            if key not in common or common[key] != value}
+
+
+def encode_binary(message: str, timestamp: int, metadata: Dict[str, Any] = None) -> bytes:
+    """Encoder un message en trame binaire compacte
+
+    Format v1:
+        version (1) | type (1) | timestamp (varint) | nb métadonnées (varint)
+        | métadonnées... | message UTF-8 (jusqu'à la fin de la trame)
+
+    Chaque métadonnée commence par un octet (id de clé << 4 | type de valeur),
+    suivi du nom de clé pour les clés non connues, puis de la valeur.
+    """
+    out = bytearray([FRAME_VERSION, FRAME_TYPE_MESSAGE])
+    out += encode_varint(timestamp)
+    out += _encode_metadata(metadata or {}, timestamp)
+    out += message.encode("utf-8")
+    return bytes(out)
+
+
+def encode_binary_batch(messages: List[Tuple[str, int, Dict[str, Any]]], timestamp: int,
+                        metadata: Dict[str, Any] = None) -> bytes:
+    """Encoder plusieurs messages dans une seule trame binaire
+
+    Format v1, type lot:
+        version (1) | type (1) | timestamp (varint) | métadonnées communes
+        | nb messages (varint) | messages...
+
+    Chaque message: écart au timestamp de la trame (varint zigzag)
+    | métadonnées propres | longueur (varint) | message UTF-8. Les
+    métadonnées identiques aux métadonnées communes ne sont pas répétées.
+    """
+    common = metadata or {}
+    out = bytearray([FRAME_VERSION, FRAME_TYPE_BATCH])
+    out += encode_varint(timestamp)
+    out += _encode_metadata(common, timestamp)
+    out += encode_varint(len(messages))
+    for message, message_timestamp, message_metadata in messages:
+        out += encode_varint(_zigzag(message_timestamp - timestamp))
+        out += _encode_metadata(_entry_metadata(message_metadata, common), message_timestamp)
+        out += _encode_bytes(message.encode("utf-8"))
+    return bytes(out)
+
+
+def encode_binary_ack(to: str, base: int, bitmap: int, timestamp: int, metadata: Dict[str, Any] = None) -> bytes:
+    """Encoder un accusé de réception en trame binaire
+
+    Format v1, type accusé:
+        version (1) | type (1) | timestamp (varint) | métadonnées
+        | destinataire (longueur + UTF-8) | séquence de base (varint)
+        | bitmap (varint)
+
+    Le bit i du bitmap signale la réception de la séquence base - i.
+    """
+    out = bytearray([FRAME_VERSION, FRAME_TYPE_ACK])
+    out += encode_varint(timestamp)
+    out += _encode_metadata(metadata or {}, timestamp)
+    out += _encode_bytes(to.encode("utf-8"))
+    out += encode_varint(base)
+    out += encode_varint(bitmap)
+    return bytes(out)
+
+
+def decode_binary(data: bytes) -> Dict[str, Any]:
+    """Décoder une trame binaire, retourne le même dict que le format JSON"""
+    if len(data) < 2 or data[0] != FRAME_VERSION:
+        raise FrameError("Version de trame non supportée")
+    if data[1] == FRAME_TYPE_BATCH:
+        return _decode_binary_batch(data)
+    if data[1] == FRAME_TYPE_ACK:
+        return _decode_binary_ack(data)
+    if data[1] != FRAME_TYPE_MESSAGE:
+        raise FrameError(f"Type de trame inconnu: {data[1]}")
+
+    timestamp, offset = decode_varint(data, 2)
+    metadata, offset = _decode_metadata(data, offset, timestamp)
+
+    return {
+        "message": data[offset:].decode("utf-8"),
+        "timestamp": timestamp,
+        "metadata": metadata
+    }
+
+
+def _decode_binary_batch(data: bytes) -> Dict[str, Any]:
+    timestamp, offset = decode_varint(data, 2)
+    common, offset = _decode_metadata(data, offset, timestamp)
+    count, offset = decode_varint(data, offset)
+
+    messages = []
+    for _ in range(count):
+        delta, offset = decode_varint(data, offset)
+        message_timestamp = timestamp + _unzigzag(delta)
+        metadata, offset = _decode_metadata(data, offset, message_timestamp)
+        raw, offset = _decode_bytes(data, offset)
+        messages.append({"message": raw.decode("utf-8"), "timestamp": message_timestamp,
+                         "metadata": dict(common, **metadata)})
+    if offset != len(data):
+        raise FrameError("Données après le dernier message du lot")
+
+    return {"messages": messages, "timestamp": timestamp, "metadata": common}
+
+
+def _decode_binary_ack(data: bytes) -> Dict[str, Any]:
+    timestamp, offset = decode_varint(data, 2)
+    metadata, offset = _decode_metadata(data, offset, timestamp)
+    to, offset = _decode_bytes(data, offset)
+    base, offset = decode_varint(data, offset)
+    bitmap, offset = decode_varint(data, offset)
+    if offset != len(data):
+        raise FrameError("Données après le bitmap de l'accusé")
+
+    return {"acknowledgement": {"to": to.decode("utf-8"), "base": base, "bitmap": bitmap},
+            "timestamp": timestamp, "metadata": metadata}
+
+
+def encode_payload(message: str, timestamp: int, metadata: Dict[str, Any] = None,
+                   frame_format: str = FORMAT_JSON) -> bytes:
+    """Sérialiser le clair d'un message selon le format demandé"""
+    if frame_format == FORMAT_BINARY:
+        return encode_binary(message, timestamp, metadata)
+    if frame_format == FORMAT_JSON:
+        payload = {
+            "message": message,
+            "timestamp": timestamp,
+            "metadata": metadata or {}
+        }
+        return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    raise ValueError(f"Format de trame inconnu: {frame_format}")
+
+
+def encode_batch_payload(messages: List[Tuple[str, int, Dict[str, Any]]], timestamp: int,
+                         metadata: Dict[str, Any] = None, frame_format: str = FORMAT_JSON) -> bytes:
+    """Sérialiser un lot de (message, timestamp, métadonnées) selon le format demandé"""
+    if frame_format == FORMAT_BINARY:
+        return encode_binary_batch(messages, timestamp, metadata)
+    if frame_format == FORMAT_JSON:
+        common = metadata or {}
+        payload = {
+            "messages": [{"message": message, "timestamp": message_timestamp,
+                          "metadata": _entry_metadata(message_metadata, common)}
+                         for message, message_timestamp, message_metadata in messages],
+            "timestamp": timestamp,
+            "metadata": common
+        }
+        return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    raise ValueError(f"Format de trame inconnu: {frame_format}")
+
+
+def encode_ack_payload(to: str, base: int, bitmap: int, timestamp: int, metadata: Dict[str, Any] = None,
+                       frame_format: str = FORMAT_JSON) -> bytes:
+    """Sérialiser un accusé de réception (séquences base - i du bitmap reçues) selon le format demandé"""
+    if frame_format == FORMAT_BINARY:
+        return encode_binary_ack(to, base, bitmap, timestamp, metadata)
+    if frame_format == FORMAT_JSON:
+        payload = {
+            "acknowledgement": {"to": to, "base": base, "bitmap": bitmap},
+            "timestamp": timestamp,
+            "metadata": metadata or {}
+        }
+        return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    raise ValueError(f"Format de trame inconnu: {frame_format}")
+
+
+def decode_payload(data: bytes) -> Dict[str, Any]:
+    """Désérialiser un clair, en détectant automatiquement son format
+
+    Un lot est retourné avec une liste "messages" (métadonnées communes
+    déjà fusionnées dans celles de chaque message) au lieu de "message",
+    un accusé de réception avec "acknowledgement" (destinataire, base,
+    bitmap).
+    """
+    if data[:1] == b"{":
+        payload = json.loads(data.decode('utf-8'))
+        if "messages" in payload:
+            common = payload.get("metadata", {})
+            for entry in payload["messages"]:
+                entry["metadata"] = dict(common, **entry.get("metadata", {}))
+        return payload
+    if data[:1] == bytes([FRAME_VERSION]):
+        return decode_binary(data)
+    raise FrameError("Format de trame non reconnu")
+
+
+def test_frame_codec():
+    """Tester l'aller-retour du codec binaire"""
+    metadata = {
+        "sender": "web_interface",
+        "priority": "high",
+        "timestamp": 1700000000,
+        "retries": -2,
+        "ack": True,
+        "iso": "2024-01-01T12:00:00"
+    }
+    frame = encode_binary("Hello, LoRa World! ⚪️", 1700000000, metadata)
+    payload = decode_payload(frame)
+
+    assert payload["message"] == "Hello, LoRa World! ⚪️"
+    assert payload["timestamp"] == 1700000000
+    assert payload["metadata"] == metadata
+
+    legacy = encode_payload("hello", 1700000000, {"priority": "low"}, FORMAT_JSON)
+    assert decode_payload(legacy)["metadata"] == {"priority": "low"}
+    # Lot: métadonnées communes factorisées, horodatages relatifs
+    batch = [(f"temp={20 + i}", 1700000000 + i, {"sender": "web_interface", "priority": "normal",
+                                                  "timestamp": 1700000000 + i}) for i in range(5)]
+    for frame_format in FRAME_FORMATS:
+        decoded = decode_payload(encode_batch_payload(batch, 1700000000, {"sender": "web_interface", "seq": 7},
+                                                      frame_format))
+        assert [(entry["message"], entry["timestamp"]) for entry in decoded["messages"]] == \
+            [(message, timestamp) for message, timestamp, _ in batch]
+        assert decoded["messages"][3]["metadata"] == dict(batch[3][2], seq=7)
+    # Accusé de réception: 64 séquences en quelques octets
+    for frame_format in FRAME_FORMATS:
+        ack = decode_payload(encode_ack_payload("web_interface", 300, (1 << 64) - 3, 1700000000,
+                                                {"sender": "node_2"}, frame_format))
+        assert ack["acknowledgement"] == {"to": "web_interface", "base": 300, "bitmap": (1 << 64) - 3}
+        assert ack["metadata"] == {"sender": "node_2"}
+    ack_frame = encode_binary_ack("web_interface", 300, (1 << 64) - 3, 1700000000)
+    print(f"Accusé de réception (64 séquences): {len(ack_frame)} bytes")
+    batch_frame = encode_binary_batch(batch, 1700000000, {"sender": "web_interface", "seq": 7})
+    singles = sum(len(encode_binary(*entry)) for entry in batch)
+    print(f"Lot de {len(batch)} messages: {len(batch_frame)} bytes (séparés: {singles} bytes)")
+
+    print(f"Trame binaire: {len(frame)} bytes, JSON: {len(encode_payload('Hello, LoRa World! ⚪️', 1700000000, metadata))} bytes")
+    print("⚪️ Test du codec de trame réussi!")
+
+
+if __name__ == "__main__":
+    test_frame_codec()
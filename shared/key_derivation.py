@@ -0,0 +1,193 @@
+import os
+import hmac
+import time
+import hashlib
+import itertools
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, Optional
+
+# Paramètres PBKDF2 historiques de SecureCrypto
+DEFAULT_SALT = b'lora_secure_salt_2024'  # En production, utiliser un salt aléatoire
+DEFAULT_ITERATIONS = 100000
+DEFAULT_KEY_LENGTH = 32
+DEFAULT_HASH = "sha256"
+
+
+def _zeroise(buffer: bytearray):
+    """Effacer une clé en mémoire"""
+    buffer[:] = bytes(len(buffer))
+
+
+class KeyDerivationPool:
+    """Dérivation PBKDF2 dans un pool de threads, avec cache des clés dérivées
+
+    hashlib.pbkdf2_hmac (OpenSSL) relâche le GIL: la dérivation ne bloque
+    ni les requêtes Flask ni le heartbeat socket.io. Le cache est indexé
+    par (HMAC du mot de passe avec un secret propre au processus, salt,
+    paramètres): le mot de passe n'est jamais conservé, et les clés
+    évincées sont effacées.
+    """
+
+    def __init__(self, max_workers: int = 1, max_cached: int = 8):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kdf")
+        self.max_cached = max_cached
+        self.lock = Lock()
+        self.cache: "OrderedDict[tuple, bytearray]" = OrderedDict()
+        self.in_flight: Dict[tuple, Future] = {}
+        self.jobs: "OrderedDict[int, Future]" = OrderedDict()
+        self.job_ids = itertools.count(1)
+        self._secret = os.urandom(32)
+
+        self.hits = 0
+        self.misses = 0
+        self.derivations = 0
+        self.total_ms = 0.0
+        self.last_ms: Optional[float] = None
+        self.max_ms = 0.0
+
+    def _cache_key(self, password: str, salt: bytes, iterations: int, length: int, hash_name: str) -> tuple:
+        tag = hmac.new(self._secret, password.encode("utf-8"), hashlib.sha256).digest()
+        return tag, bytes(salt), iterations, length, hash_name
+
+    def submit(self, password: str, salt: bytes = DEFAULT_SALT, iterations: int = DEFAULT_ITERATIONS,
+               length: int = DEFAULT_KEY_LENGTH, hash_name: str = DEFAULT_HASH) -> Future:
+        """Lancer une dérivation, le Future donne la clé (bytes)
+
+        Une clé en cache donne un Future déjà terminé; deux demandes
+        identiques simultanées partagent la même dérivation.
+        """
+        cache_key = self._cache_key(password, salt, iterations, length, hash_name)
+        with self.lock:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.cache.move_to_end(cache_key)
+                self.hits += 1
+                future = Future()
+                future.set_result(bytes(cached))
+                return future
+
+            future = self.in_flight.get(cache_key)
+            if future is None:
+                self.misses += 1
+                future = self.executor.submit(self._derive, cache_key, password, salt, iterations,
+                                              length, hash_name)
+                self.in_flight[cache_key] = future
+            return future
+
+    def _derive(self, cache_key: tuple, password: str, salt: bytes, iterations: int,
+                length: int, hash_name: str) -> bytes:
+        start = time.perf_counter()
+        try:
+            key = bytearray(hashlib.pbkdf2_hmac(hash_name, password.encode("utf-8"), salt, iterations, length))
+        except Exception:
+            with self.lock:
+                self.in_flight.pop(cache_key, None)
+            raise
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        with self.lock:
+            self.in_flight.pop(cache_key, None)
+            self.derivations += 1
+            self.total_ms += elapsed_ms
+            self.last_ms = elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+            self.cache[cache_key] = key
+            while len(self.cache) > self.max_cached:
+                _, evicted = self.cache.popitem(last=False)
+                _zeroise(evicted)
+            return bytes(key)
+
+    def derive(self, password: str, timeout: float = None, **params) -> bytes:
+        """Dériver une clé en attendant le résultat"""
+        return self.submit(password, **params).result(timeout)
+
+    def start_job(self, password: str, **params) -> tuple:
+        """Lancer une dérivation suivie par identifiant, retourne (job_id, future)"""
+        future = self.submit(password, **params)
+        with self.lock:
+            job_id = next(self.job_ids)
+            self.jobs[job_id] = future
+            # Conserver seulement les derniers travaux
+            while len(self.jobs) > 64:
+                self.jobs.popitem(last=False)
+        return job_id, future
+
+    def get_job(self, job_id: int) -> Optional[Future]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def evict(self, password: str, salt: bytes = DEFAULT_SALT, iterations: int = DEFAULT_ITERATIONS,
+              length: int = DEFAULT_KEY_LENGTH, hash_name: str = DEFAULT_HASH) -> bool:
+        """Retirer et effacer une clé du cache"""
+        cache_key = self._cache_key(password, salt, iterations, length, hash_name)
+        with self.lock:
+            key = self.cache.pop(cache_key, None)
+        if key is None:
+            return False
+        _zeroise(key)
+        return True
+
+    def clear(self):
+        """Effacer toutes les clés en cache"""
+        with self.lock:
+            for key in self.cache.values():
+                _zeroise(key)
+            self.cache.clear()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "cached_keys": len(self.cache),
+                "pending": len(self.in_flight),
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "derivations": self.derivations,
+                "last_ms": round(self.last_ms, 1) if self.last_ms is not None else None,
+                "avg_ms": round(self.total_ms / self.derivations, 1) if self.derivations else None,
+                "max_ms": round(self.max_ms, 1)
+            }
+
+
+_default_pool: Optional[KeyDerivationPool] = None
+_default_pool_lock = Lock()
+
+
+def get_key_derivation_pool() -> KeyDerivationPool:
+    """Pool partagé par le processus (créé à la première utilisation)"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = KeyDerivationPool()
+        return _default_pool
+
+
+def test_key_derivation():
+    """Tester le cache, l'effacement et la compatibilité avec PBKDF2 de pycryptodome"""
+    from Crypto.Protocol.KDF import PBKDF2
+    from Crypto.Hash import SHA256
+
+    pool = KeyDerivationPool(max_cached=2)
+    key = pool.derive("test123")
+    assert key == PBKDF2("test123", DEFAULT_SALT, 32, count=DEFAULT_ITERATIONS, hmac_hash_module=SHA256)
+
+    start = time.perf_counter()
+    assert pool.derive("test123") == key
+    cached_ms = (time.perf_counter() - start) * 1000
+    print(f"Dérivation: {pool.get_stats()['last_ms']} ms, depuis le cache: {cached_ms:.3f} ms")
+
+    # Éviction LRU avec effacement de la clé
+    stored = pool.cache[next(iter(pool.cache))]
+    pool.derive("autre", iterations=1000)
+    pool.derive("encore", iterations=1000)
+    assert stored == bytes(len(stored))
+    assert pool.get_stats()["cached_keys"] == 2
+    assert pool.evict("encore", iterations=1000) and not pool.evict("encore", iterations=1000)
+    print(f"Statistiques: {pool.get_stats()}")
+    print("⚪️ Test de dérivation de clé réussi!")
+
+
+if __name__ == "__main__":
+    test_key_derivation()
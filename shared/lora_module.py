@@ -1,34 +1,160 @@
 from serial import Serial
 import serial.tools.list_ports
-from threading import Thread, Event
+from threading import Thread, Event, Lock
 from time import sleep
+from queue import Queue, Empty, Full
 import time
-import struct
+import math
+import re
+
+from fragmentation import Fragmenter, Reassembler, FRAGMENT_HEADER_SIZE
+from metrics import STAGE_SECONDS, SERIAL_ERRORS
+
+# Configuration radio par défaut: fréquence, SF, BW, préambules TX/RX, puissance, CRC, IQ, réseau
+DEFAULT_RFCFG = "865.125,sf7,125,14,15,14,on,off,off"
+
+# Débits UART acceptés par AT+UART=BR (Wio-E5), le module démarre à 9600
+DEFAULT_BAUDRATE = 9600
+SUPPORTED_BAUDRATES = [9600, 14400, 19200, 38400, 57600, 76800, 115200, 230400]
+# Allers-retours AT consécutifs sans erreur exigés pour valider un nouveau débit
+BAUDRATE_CHECKS = 5
+
+class RadioConfig:
+    """Classe pour décrire la configuration radio passée à AT+TEST=rfcfg"""
+
+    def __init__(self, frequency: float = 865.125, sf: int = 7, bw: int = 125,
+                 tx_preamble: int = 14, rx_preamble: int = 15, power: int = 14,
+                 crc: bool = True, iq_inverted: bool = False, public_network: bool = False,
+                 coding_rate: int = 1):
+        self.frequency = frequency
+        self.sf = sf
+        self.bw = bw
+        self.tx_preamble = tx_preamble
+        self.rx_preamble = rx_preamble
+        self.power = power
+        self.crc = crc
+        self.iq_inverted = iq_inverted
+        self.public_network = public_network
+        # Le mode TEST du module utilise un taux de codage fixe de 4/5 (CR=1)
+        self.coding_rate = coding_rate
+
+    @classmethod
+    def from_rfcfg(cls, rfcfg: str) -> 'RadioConfig':
+        """Lire une chaîne rfcfg (ex: "865.125,sf7,125,14,15,14,on,off,off")"""
+        fields = [f.strip().lower() for f in rfcfg.split(",")]
+        if len(fields) != 9:
+            raise ValueError(f"Configuration rfcfg invalide: {rfcfg}")
+        return cls(
+            frequency=float(fields[0]),
+            sf=int(fields[1].lstrip("sf")),
+            bw=int(fields[2]),
+            tx_preamble=int(fields[3]),
+            rx_preamble=int(fields[4]),
+            power=int(fields[5]),
+            crc=fields[6] == "on",
+            iq_inverted=fields[7] == "on",
+            public_network=fields[8] == "on"
+        )
+
+    def to_rfcfg(self) -> str:
+        """Construire la chaîne rfcfg correspondante"""
+        flag = lambda value: "on" if value else "off"
+        return (f"{self.frequency:g},sf{self.sf},{self.bw},{self.tx_preamble},{self.rx_preamble},"
+                f"{self.power},{flag(self.crc)},{flag(self.iq_inverted)},{flag(self.public_network)}")
+
+    def copy(self, **changes) -> 'RadioConfig':
+        """Copier la configuration en modifiant certains champs"""
+        config = RadioConfig(**self.__dict__)
+        for name, value in changes.items():
+            setattr(config, name, value)
+        return config
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+# Ligne émise par le module avant chaque paquet reçu: +TEST: LEN:5, RSSI:-40, SNR:10
+SIGNAL_LINE = re.compile(r"LEN:\s*(\d+),\s*RSSI:\s*(-?\d+(?:\.\d+)?),\s*SNR:\s*(-?\d+(?:\.\d+)?)")
+
+def parse_signal_line(line: str) -> dict:
+    """Lire la longueur, le RSSI et le SNR d'une ligne +TEST: LEN"""
+    match = SIGNAL_LINE.search(line)
+    if not match:
+        return None
+    return {
+        "length": int(match.group(1)),
+        "rssi": float(match.group(2)),
+        "snr": float(match.group(3))
+    }
+
+def time_on_air(payload_size: int, config: RadioConfig = None) -> float:
+    """Calculer le temps d'émission (secondes) d'un paquet LoRa (formule Semtech AN1200.13)"""
+    config = config or RadioConfig()
+    symbol_time = (2 ** config.sf) / (config.bw * 1000)
+    # Optimisation bas débit obligatoire quand un symbole dépasse 16 ms
+    low_dr_optimize = 1 if symbol_time > 0.016 else 0
+
+    preamble_time = (config.tx_preamble + 4.25) * symbol_time
+    numerator = 8 * payload_size - 4 * config.sf + 28 + (16 if config.crc else 0)
+    payload_symbols = 8 + max(
+        math.ceil(numerator / (4 * (config.sf - 2 * low_dr_optimize))) * (config.coding_rate + 4), 0
+    )
+    return preamble_time + payload_symbols * symbol_time
 
 class LoRaDevice:
     """Classe pour gérer un module LoRa"""
     
-    def __init__(self, port: str, baudrate: int = 9600):
+    def __init__(self, port: str, baudrate: int = DEFAULT_BAUDRATE, mtu: int = None,
+                 radio_config: RadioConfig = None, max_baudrate: int = None):
         self.port = port
         self.baudrate = baudrate
+        # Débit visé à la connexion (None: garder baudrate), borné par le pont USB-série
+        self.max_baudrate = max_baudrate
         self.serial: Serial = None
         self.is_connected = False
+        self.radio_config = radio_config or RadioConfig.from_rfcfg(DEFAULT_RFCFG)
+
+        # Fragmentation des trames plus longues qu'un paquet (DEFAULT_MTU par exemple;
+        # None, par défaut, pour le format historique). Les deux extrémités doivent
+        # utiliser le même réglage: avec la fragmentation, une trame qui commence par
+        # 0xFF reçoit un en-tête qu'un nœud sans fragmentation ne sait pas lire
+        self.fragmenter = Fragmenter(mtu) if mtu else None
+        self.reassembler = Reassembler() if mtu else None
+
+        # Lecture continue: un thread lit le flux série et répartit les lignes
+        self.streaming = False
+        self.reader_thread: Thread = None
+        self.rx_queue: Queue = Queue(maxsize=256)
+        self.response_queue: Queue = Queue()
+        self.on_frame = None
+        self.command_lock = Lock()
+        self.tx_lock = Lock()
+        self.tx_done = Event()
+        self.rx_packets = 0
+        self.rx_overflows = 0
+        self.rx_rearms = 0
+
+        # Qualité de lien du dernier paquet reçu (+TEST: LEN/RSSI/SNR)
+        self.pending_signal: dict = None
+        self.last_signal_info: dict = None
         
     def connect(self, timeout: float = 1.0) -> bool:
         """Connecter au module LoRa"""
         try:
             self.serial = Serial(self.port, self.baudrate, timeout=timeout)
-            self.serial.write("\r\n".encode("ascii"))
-            sleep(0.05)  # Réduit le délai d'attente
-            
+            # Ignorer ce que le module a émis avant l'ouverture (bannière de démarrage)
+            self.serial.reset_input_buffer()
+
             # Marquer comme connecté avant les tests de communication
             self.is_connected = True
-            
-            # Test de communication avec timeouts réduits
-            self._send_command("AT", timeout=0.5)
+
+            # Attendre que le module réponde plutôt qu'un délai fixe, sinon chercher son débit
+            if not self.wait_ready(timeout) and not self.detect_baudrate():
+                raise Exception("Le module ne répond pas à AT")
+            if self.max_baudrate and self.max_baudrate > self.baudrate:
+                self.negotiate_baudrate(self.max_baudrate)
             self._send_command("AT+MODE=TEST", timeout=0.5)
-            self._send_command("AT+TEST=rfcfg,865.125,sf7,125,14,15,14,on,off,off", timeout=1.0)
-            
+            self._send_command(f"AT+TEST=rfcfg,{self.radio_config.to_rfcfg()}", timeout=1.0)
+
             return True
             
         except Exception as e:
@@ -38,8 +164,139 @@ class LoRaDevice:
                 self.serial.close()
             return False
     
+    def wait_ready(self, timeout: float = 1.0, interval: float = 0.05) -> bool:
+        """Envoyer AT toutes les interval secondes jusqu'à la réponse +AT: OK
+
+        Les lignes de démarrage (bannière, réponses d'un AT précédent) sont
+        ignorées; retourne False si le module reste muet pendant timeout.
+        """
+        previous_timeout = self.serial.timeout
+        self.serial.timeout = interval
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline:
+                self.serial.write(b"AT\r\n")
+                line = self.serial.read_until(b"\r\n")
+                while line and time.monotonic() < deadline:
+                    if b"+AT: OK" in line:
+                        # Réponses aux AT précédents encore en route
+                        self.serial.reset_input_buffer()
+                        return True
+                    line = self.serial.read_until(b"\r\n")
+            return False
+        finally:
+            self.serial.timeout = previous_timeout
+
+    def _set_host_baudrate(self, baudrate: int) -> bool:
+        """Changer le débit côté hôte, False si le pont USB-série le refuse"""
+        try:
+            self.serial.baudrate = baudrate
+        except (ValueError, serial.SerialException) as e:
+            print(f"⚠️ Débit {baudrate} refusé par {self.port}: {e}")
+            return False
+        self.baudrate = baudrate
+        self.serial.reset_input_buffer()
+        return True
+
+    def detect_baudrate(self, timeout: float = 0.2) -> bool:
+        """Retrouver le débit d'un module qui ne répond pas au débit configuré"""
+        initial = self.baudrate
+        for baudrate in SUPPORTED_BAUDRATES:
+            if baudrate != initial and self._set_host_baudrate(baudrate) and self.wait_ready(timeout):
+                print(f"⚪️ Module {self.port} trouvé à {baudrate} bauds")
+                return True
+        self._set_host_baudrate(initial)
+        return False
+
+    def verify_baudrate(self, checks: int = BAUDRATE_CHECKS, timeout: float = 0.2) -> bool:
+        """Allers-retours AT consécutifs: la liaison doit être propre au débit courant"""
+        if not self.wait_ready(timeout):
+            return False
+        previous_timeout = self.serial.timeout
+        self.serial.timeout = timeout
+        try:
+            for _ in range(checks):
+                self.serial.write(b"AT\r\n")
+                if self.serial.read_until(b"\r\n") != b"+AT: OK\r\n":
+                    return False
+            return True
+        finally:
+            self.serial.timeout = previous_timeout
+
+    def negotiate_baudrate(self, max_baudrate: int) -> int:
+        """Passer au plus haut débit accepté par le module et le pont, retourne le débit retenu
+
+        Chaque débit candidat (du plus haut au plus bas) est demandé par
+        AT+UART=BR, appliqué par ATZ puis vérifié par des allers-retours AT.
+        En cas d'échec, l'ancien débit est redemandé au module et rétabli.
+        """
+        initial = self.baudrate
+        refused = []
+        for baudrate in sorted((rate for rate in SUPPORTED_BAUDRATES if initial < rate <= max_baudrate),
+                               reverse=True):
+            try:
+                response = self._send_command(f"AT+UART=BR, {baudrate}", timeout=0.5)
+            except Exception:
+                # Firmware sans AT+UART ou débit refusé par le module
+                response = ""
+            if str(baudrate) not in response:
+                refused.append(baudrate)
+                continue
+
+            self._send_command("ATZ", timeout=1.0)
+            if self._set_host_baudrate(baudrate) and self.verify_baudrate():
+                print(f"⚪️ Module {self.port} passé de {initial} à {baudrate} bauds")
+                return baudrate
+
+            SERIAL_ERRORS.inc("baudrate_fallback")
+            print(f"⚠️ Liaison instable à {baudrate} bauds sur {self.port}, retour à {initial}")
+            if not self._restore_baudrate(baudrate, initial):
+                raise Exception(f"Module {self.port} injoignable après le changement de débit")
+            if self.baudrate != initial:
+                # Module retrouvé à un autre débit: ne pas insister
+                return self.baudrate
+
+        if refused and self.baudrate == initial:
+            print(f"⚠️ Aucun débit supérieur à {initial} accepté par le module {self.port}")
+        return self.baudrate
+
+    def _restore_baudrate(self, current: int, initial: int, attempts: int = 10) -> bool:
+        """Redemander l'ancien débit au module sur une liaison peu fiable, puis le rétablir"""
+        self._set_host_baudrate(current)
+        previous_timeout = self.serial.timeout
+        self.serial.timeout = 0.1
+        try:
+            for _ in range(attempts):
+                self.serial.write(f"AT+UART=BR, {initial}\r\n".encode("ascii"))
+                if f"BR, {initial}".encode("ascii") in self.serial.read_until(b"\r\n"):
+                    break
+            for _ in range(attempts):
+                self.serial.write(b"ATZ\r\n")
+                if b"+RESET: OK" in self.serial.read_until(b"\r\n"):
+                    break
+                # Réponse perdue: le module a peut-être déjà redémarré
+                if self._set_host_baudrate(initial) and self.wait_ready(0.1):
+                    return True
+                self._set_host_baudrate(current)
+        finally:
+            self.serial.timeout = previous_timeout
+        if self._set_host_baudrate(initial) and self.wait_ready(0.3):
+            return True
+        return self.detect_baudrate()
+
+    def reset(self, timeout: float = 2.0) -> bool:
+        """Réinitialiser le module (ATZ) et attendre qu'il réponde à nouveau"""
+        try:
+            self.stop_streaming()
+            self._send_command("ATZ", timeout=timeout)
+            return self.wait_ready(timeout)
+        except Exception as e:
+            print(f"Erreur de réinitialisation: {e}")
+            return False
+
     def disconnect(self):
         """Déconnecter le module LoRa"""
+        self.stop_streaming()
         if self.serial and self.serial.is_open:
             self.serial.close()
         self.is_connected = False
@@ -48,12 +305,27 @@ class LoRaDevice:
         """Envoyer une commande AT et recevoir la réponse"""
         if not self.is_connected or not self.serial:
             raise Exception("Module LoRa non connecté")
+
+        if self.streaming:
+            return self._send_streaming_command(cmd, timeout)
             
         # Envoyer la commande
-        self.serial.write((cmd + "\r\n").encode("ascii"))
+        with STAGE_SECONDS.time("serial_write"):
+            self.serial.write((cmd + "\r\n").encode("ascii"))
         
-        # Recevoir la réponse
-        response = self.serial.read_until(b"\r\n").decode("ascii", errors="ignore")[:-2]
+        # Recevoir la réponse (délai allongé du temps de transfert à bas débit)
+        previous_timeout = self.serial.timeout
+        if timeout is None:
+            timeout = previous_timeout or 1.0
+        self.serial.timeout = timeout + self._transfer_time(cmd)
+        try:
+            with STAGE_SECONDS.time("at_response_wait"):
+                response = self.serial.read_until(b"\r\n").decode("ascii", errors="ignore")[:-2]
+        finally:
+            self.serial.timeout = previous_timeout
+        if not response:
+            SERIAL_ERRORS.inc("response_timeout")
+            raise Exception(f"Pas de réponse du module LoRa à {cmd.split('=')[0]}")
         
         # Vérifier les erreurs
         if "ERROR" in response:
@@ -61,18 +333,192 @@ class LoRaDevice:
             
         return response
     
+    def _transfer_time(self, cmd: str) -> float:
+        """Durée de la commande et de son écho sur la liaison série (10 bits par octet)"""
+        return 2 * (len(cmd) + 2) * 10 / self.baudrate
+
+    def _send_streaming_command(self, cmd: str, timeout: float = None) -> str:
+        """Envoyer une commande AT, la réponse arrive par le thread de lecture"""
+        with self.command_lock:
+            # Ignorer les réponses orphelines d'une commande précédente
+            while not self.response_queue.empty():
+                self.response_queue.get_nowait()
+
+            with STAGE_SECONDS.time("serial_write"):
+                self.serial.write((cmd + "\r\n").encode("ascii"))
+            try:
+                with STAGE_SECONDS.time("at_response_wait"):
+                    response = self.response_queue.get(timeout=(timeout or 1.0) + self._transfer_time(cmd))
+            except Empty:
+                SERIAL_ERRORS.inc("response_timeout")
+                raise Exception(f"Pas de réponse du module LoRa à {cmd.split('=')[0]}")
+
+        if "ERROR" in response:
+            raise Exception(f"Erreur LoRa: {response}")
+
+        return response
+
+    def start_streaming(self, callback=None) -> bool:
+        """Armer la réception une seule fois puis lire le flux série en continu
+
+        Les trames reçues sont passées à callback(frame, signal_info) si fourni, sinon
+        placées dans rx_queue (lue par receive_data).
+        """
+        if self.streaming:
+            return True
+        if not self.is_connected or not self.serial:
+            return False
+
+        try:
+            self._send_command("AT+TEST=RXLRPKT")
+        except Exception as e:
+            print(f"Erreur d'armement de la réception: {e}")
+            return False
+
+        # Timeout court pour que le thread réagisse à l'arrêt
+        self.serial.timeout = 0.2
+        self.on_frame = callback
+        self.streaming = True
+        self.reader_thread = Thread(target=self._reader_loop, daemon=True)
+        self.reader_thread.start()
+        return True
+
+    def stop_streaming(self):
+        """Arrêter le thread de lecture continue"""
+        if not self.streaming:
+            return
+        self.streaming = False
+        # Débloquer la lecture en cours plutôt qu'attendre son délai
+        if self.serial and hasattr(self.serial, "cancel_read"):
+            self.serial.cancel_read()
+        if self.reader_thread and self.reader_thread.is_alive():
+            self.reader_thread.join(timeout=1.0)
+        self.reader_thread = None
+
+    def _reader_loop(self):
+        """Répartir les lignes du module: trames reçues, fin d'émission, réponses"""
+        while self.streaming and self.serial and self.serial.is_open:
+            try:
+                line = self.serial.read_until(b"\r\n").decode("ascii", errors="ignore").strip()
+            except Exception as e:
+                if self.streaming:
+                    SERIAL_ERRORS.inc("read")
+                    print(f"Erreur de lecture série: {e}")
+                    sleep(0.1)
+                continue
+
+            if not line:
+                continue
+
+            if "+TEST: RX" in line and '"' in line:
+                self._handle_rx_line(line)
+            elif line.startswith("+TEST: LEN"):
+                # Infos de signal précédant chaque trame, pas une réponse
+                self.pending_signal = parse_signal_line(line)
+            elif "TX DONE" in line:
+                self.tx_done.set()
+            else:
+                self.response_queue.put(line)
+
+    def _handle_rx_line(self, line: str):
+        """Décoder une ligne +TEST: RX et livrer la trame complète"""
+        start = line.find('"') + 1
+        end = line.rfind('"')
+        if not (start > 0 and end > start):
+            return
+
+        try:
+            packet = bytes.fromhex(line[start:end])
+        except ValueError:
+            return
+
+        self.rx_packets += 1
+        signal_info = self._take_signal_info()
+        frame = self.reassembler.add_fragment(packet, self.port) if self.reassembler else packet
+        if frame is None:
+            return
+
+        if self.on_frame:
+            try:
+                self.on_frame(frame, signal_info)
+            except Exception as e:
+                print(f"Erreur du callback de réception: {e}")
+            return
+
+        try:
+            self.rx_queue.put_nowait((frame, signal_info))
+        except Full:
+            self.rx_overflows += 1
+
+    def _take_signal_info(self) -> dict:
+        """Associer les infos de signal en attente au paquet qui les suit"""
+        signal_info = dict(self.pending_signal or {})
+        self.pending_signal = None
+        signal_info["frequency"] = self.radio_config.frequency
+        signal_info["sf"] = self.radio_config.sf
+        signal_info["received_at"] = time.time()
+        self.last_signal_info = signal_info
+        return signal_info
+
+    def _wait_tx_done(self, timeout: float) -> bool:
+        """Attendre la fin d'émission du paquet en cours"""
+        with STAGE_SECONDS.time("tx_done_wait"):
+            if self.streaming:
+                return self.tx_done.wait(timeout)
+            return self._wait_for("TX DONE", timeout)
+
+    def _wait_for(self, marker: str, timeout: float) -> bool:
+        """Lire les lignes du module jusqu'à trouver un marqueur"""
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            line = self.serial.read_until(b"\r\n").decode("ascii", errors="ignore")
+            if marker in line:
+                return True
+        return False
+
     def send_data(self, data: bytes) -> bool:
         """Envoyer des données via LoRa"""
         try:
-            hex_data = data.hex().upper()
-            self._send_command(f'AT+TEST=TXLRPKT,"{hex_data}"')
+            packets = self.fragmenter.fragment(data) if self.fragmenter else [data]
+            with self.tx_lock:
+                self._send_packets(packets)
             return True
         except Exception as e:
+            SERIAL_ERRORS.inc("send")
             print(f"Erreur d'envoi: {e}")
             return False
+
+    def _send_packets(self, packets: list):
+        """Émettre les paquets d'une trame l'un après l'autre"""
+        try:
+            for i, packet in enumerate(packets):
+                with STAGE_SECONDS.time("hex_encode"):
+                    hex_data = packet.hex().upper()
+                self.tx_done.clear()
+                self._send_command(f'AT+TEST=TXLRPKT,"{hex_data}"')
+
+                # Attendre la fin d'émission avant le fragment suivant
+                # (et avant de réarmer la réception en lecture continue)
+                if (i < len(packets) - 1 or self.streaming) and not self._wait_tx_done(timeout=10.0):
+                    raise Exception("Fin d'émission non confirmée")
+        finally:
+            # Le module quitte la réception après une émission
+            if self.streaming:
+                self._send_command("AT+TEST=RXLRPKT")
+                self.rx_rearms += 1
     
     def receive_data(self, timeout: float = 1.0) -> bytes:
         """Recevoir des données via LoRa"""
+        return self.receive_frame(timeout)[0]
+
+    def receive_frame(self, timeout: float = 1.0) -> tuple:
+        """Recevoir une trame avec la qualité de lien mesurée: (données, infos de signal)"""
+        if self.streaming:
+            try:
+                return self.rx_queue.get(timeout=timeout)
+            except Empty:
+                return b"", None
+
         try:
             # Mettre le module en mode réception continue
             self._send_command("AT+TEST=RXLRPKT")
@@ -86,6 +532,10 @@ class LoRaDevice:
                 try:
                     line = self.serial.read_until(b"\r\n").decode("ascii", errors="ignore").strip()
                     
+                    if line.startswith("+TEST: LEN"):
+                        self.pending_signal = parse_signal_line(line)
+                        continue
+
                     # Chercher les lignes contenant des données reçues
                     if "+TEST: RX" in line and '"' in line:
                         # Extraire les données hexadécimales
@@ -94,26 +544,81 @@ class LoRaDevice:
                         if start > 0 and end > start:
                             hex_data = line[start:end]
                             if hex_data:  # Vérifier que les données ne sont pas vides
-                                return bytes.fromhex(hex_data)
+                                packet = bytes.fromhex(hex_data)
+                                signal_info = self._take_signal_info()
+                                if not self.reassembler:
+                                    return packet, signal_info
+
+                                # Attendre les fragments suivants dans le même délai
+                                frame = self.reassembler.add_fragment(packet, self.port)
+                                if frame is not None:
+                                    return frame, signal_info
                     
-                except Exception as read_error:
+                except Exception:
                     continue
                     
-            return b""  # Timeout atteint
+            return b"", None  # Timeout atteint
             
         except Exception as e:
+            SERIAL_ERRORS.inc("read")
             print(f"Erreur de réception: {e}")
-            return b""
+            return b"", None
     
-    def get_signal_info(self) -> dict:
-        """Obtenir les informations du signal (RSSI, SNR)"""
-        # Cette information est généralement dans les métadonnées de réception
-        # Pour l'instant, retourner des valeurs par défaut
+    def frame_airtime(self, data_size: int) -> float:
+        """Temps d'émission total d'une trame, fragments compris"""
+        if not self.fragmenter or data_size <= self.fragmenter.mtu:
+            # Un seul paquet, sans en-tête de fragment
+            return time_on_air(data_size, self.radio_config)
+
+        chunk = self.fragmenter.max_chunk
+        count = max(1, -(-data_size // chunk))
+        last = data_size - (count - 1) * chunk
+        return ((count - 1) * time_on_air(chunk + FRAGMENT_HEADER_SIZE, self.radio_config)
+                + time_on_air(last + FRAGMENT_HEADER_SIZE, self.radio_config))
+
+    def get_rx_stats(self) -> dict:
+        """Obtenir les compteurs de la lecture continue"""
         return {
-            "rssi": -50,
-            "snr": 10,
-            "frequency": 865.125
+            "streaming": self.streaming,
+            "rx_packets": self.rx_packets,
+            "rx_queue_depth": self.rx_queue.qsize(),
+            "rx_overflows": self.rx_overflows,
+            "rx_rearms": self.rx_rearms
+        }
+
+    def get_reassembly_metrics(self) -> dict:
+        """Obtenir les métriques du tampon de réassemblage"""
+        if not self.reassembler:
+            return {}
+        self.reassembler.expire()
+        return self.reassembler.get_metrics()
+
+    def apply_radio_config(self, config: RadioConfig, timeout: float = 1.0) -> bool:
+        """Reconfigurer le module (SF, puissance...) entre deux émissions"""
+        try:
+            with self.tx_lock:
+                self._send_command(f"AT+TEST=rfcfg,{config.to_rfcfg()}", timeout=timeout)
+                self.radio_config = config
+                # rfcfg fait quitter la réception continue
+                if self.streaming:
+                    self._send_command("AT+TEST=RXLRPKT")
+                    self.rx_rearms += 1
+            return True
+        except Exception as e:
+            print(f"Erreur de configuration radio: {e}")
+            return False
+
+    def get_signal_info(self) -> dict:
+        """Obtenir les informations du signal (RSSI, SNR) du dernier paquet reçu"""
+        info = {
+            "rssi": None,
+            "snr": None,
+            "frequency": self.radio_config.frequency,
+            "sf": self.radio_config.sf
         }
+        if self.last_signal_info:
+            info.update(self.last_signal_info)
+        return info
 
 def list_available_ports() -> list:
     """Lister les ports série disponibles"""
@@ -129,7 +634,7 @@ def list_available_ports() -> list:
     
     return sorted(ports, key=lambda x: x["port"])
 
-def test_lora_connection(port: str, baudrate: int = 9600) -> bool:
+def test_lora_connection(port: str, baudrate: int = DEFAULT_BAUDRATE) -> bool:
     """Tester la connexion à un module LoRa"""
     device = LoRaDevice(port, baudrate)
     success = device.connect()
@@ -0,0 +1,243 @@
+import time
+import itertools
+from threading import Thread, Condition
+from typing import Callable, Dict, List, Optional
+
+from tx_scheduler import PRIORITY_LEVELS
+from metrics import REGISTRY
+
+# Niveau de priorité à partir duquel un message n'attend pas la fenêtre
+DEFAULT_FLUSH_LEVEL = PRIORITY_LEVELS["high"]
+
+BATCH_MESSAGES = REGISTRY.counter("lora_aggregated_messages_total",
+                                  "Messages émis dans une trame groupée ou seuls", label="mode")
+
+
+class _HeldMessage:
+    """Message en attente de regroupement"""
+
+    def __init__(self, message_id: int, message: str, metadata: dict, priority: str, on_sent: Callable):
+        self.id = message_id
+        self.message = message
+        self.metadata = metadata
+        self.priority = priority
+        self.level = PRIORITY_LEVELS.get(priority, PRIORITY_LEVELS["normal"])
+        self.on_sent = on_sent
+        self.held_at = time.monotonic()
+
+
+class MessageAggregator:
+    """Regroupement de petits messages dans une seule trame chiffrée
+
+    Les messages sont retenus au plus window secondes après le premier,
+    ou jusqu'à ce que le suivant ne tienne plus dans max_size octets
+    (trame chiffrée). Un message de priorité >= flush_level part tout de
+    suite et emmène ceux déjà retenus. Un lot d'un seul message est
+    chiffré comme un message simple.
+
+    crypto fournit encrypt_message, encrypt_batch et batch_size;
+    submit(trame, priorité, on_sent(succès)) met la trame en file
+    d'émission. on_sent(succès, trame, nb messages) est appelé pour chaque
+    message du lot.
+    """
+
+    def __init__(self, crypto, submit: Callable, window: float = 0.2, max_size: int = 240,
+                 max_messages: int = 32, flush_level: int = DEFAULT_FLUSH_LEVEL):
+        self.crypto = crypto
+        self.submit = submit
+        self.window = window
+        self.max_size = max_size
+        self.max_messages = max_messages
+        self.flush_level = flush_level
+
+        self.held: List[_HeldMessage] = []
+        self.condition = Condition()
+        self.ids = itertools.count(1)
+        self.running = False
+        self.thread: Thread = None
+
+        self.frames = 0
+        self.messages = 0
+        self.errors = 0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, flush: bool = True):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self.thread = None
+        if flush:
+            self.flush()
+
+    def add(self, message: str, metadata: dict = None, priority: str = "normal",
+            on_sent: Callable = None) -> dict:
+        """Retenir un message, retourne {"id", "held", "pending", "hold_s"}
+
+        Lève une exception si le message seul dépasse max_size.
+        """
+        item = _HeldMessage(next(self.ids), message, metadata or {}, priority, on_sent)
+        if not self.fits(message, item.metadata):
+            raise Exception(f"Message trop long pour une trame ({self.max_size} bytes max)")
+
+        batches = []
+        with self.condition:
+            # Le nouveau message ne tient plus: le lot en cours part sans lui
+            if self.held and (len(self.held) >= self.max_messages or
+                              self.crypto.batch_size(self._entries(self.held + [item])) > self.max_size):
+                batches.append(self.held)
+                self.held = []
+            self.held.append(item)
+            if item.level >= self.flush_level or not self.running or self.window <= 0:
+                batches.append(self.held)
+                self.held = []
+            held = item in self.held
+            pending = len(self.held)
+            hold = max(0.0, self.held[0].held_at + self.window - time.monotonic()) if self.held else 0.0
+            self.condition.notify_all()
+
+        for batch in batches:
+            self._send(batch)
+        return {"id": item.id, "held": held, "pending": pending, "hold_s": round(hold, 3)}
+
+    def fits(self, message: str, metadata: dict = None) -> bool:
+        """Le message tient-il seul dans une trame de max_size octets?"""
+        return self.crypto.batch_size([(message, metadata or {})]) <= self.max_size
+
+    def flush(self):
+        """Envoyer immédiatement les messages retenus"""
+        with self.condition:
+            batch, self.held = self.held, []
+        if batch:
+            self._send(batch)
+
+    @staticmethod
+    def _entries(batch: List[_HeldMessage]) -> list:
+        return [(item.message, item.metadata) for item in batch]
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.held:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                delay = self.held[0].held_at + self.window - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+                batch, self.held = self.held, []
+            self._send(batch)
+
+    def _send(self, batch: List[_HeldMessage]):
+        """Chiffrer le lot en une trame et la mettre en file d'émission"""
+        priority = max(batch, key=lambda item: item.level).priority
+        try:
+            if len(batch) == 1:
+                frame = self.crypto.encrypt_message(batch[0].message, batch[0].metadata)
+            else:
+                frame = self.crypto.encrypt_batch(self._entries(batch))
+        except Exception as e:
+            print(f"⚫️ Erreur de chiffrement du lot: {e}")
+            self._notify(batch, False, None)
+            return
+
+        self.frames += 1
+        self.messages += len(batch)
+        BATCH_MESSAGES.inc("batch" if len(batch) > 1 else "single", len(batch))
+        try:
+            self.submit(frame, priority, lambda success: self._notify(batch, success, frame))
+        except Exception as e:
+            print(f"⚫️ Lot non mis en file: {e}")
+            self._notify(batch, False, frame)
+
+    def _notify(self, batch: List[_HeldMessage], success: bool, frame: Optional[bytes]):
+        if not success:
+            self.errors += len(batch)
+        for item in batch:
+            if item.on_sent:
+                try:
+                    item.on_sent(success, frame, len(batch))
+                except Exception as e:
+                    print(f"Erreur de notification d'envoi: {e}")
+
+    def get_status(self) -> Dict:
+        with self.condition:
+            pending = len(self.held)
+        return {
+            "window_s": self.window,
+            "max_size": self.max_size,
+            "pending": pending,
+            "frames": self.frames,
+            "messages": self.messages,
+            "messages_per_frame": round(self.messages / self.frames, 2) if self.frames else None,
+            "errors": self.errors
+        }
+
+
+def test_message_aggregator():
+    """Tester le regroupement et le gain de temps d'émission"""
+    from crypto_utils import SecureCrypto, MessageValidator
+    from replay_protection import SequenceCounter
+    from lora_module import RadioConfig, time_on_air
+
+    crypto = SecureCrypto(frame_format="binary", sequence=SequenceCounter("capteur"))
+    receiver = SecureCrypto(key=crypto.key)
+    validator = MessageValidator()
+    submitted = []
+    sent = []
+
+    def submit(frame, priority, on_sent):
+        submitted.append((frame, priority))
+        on_sent(True)
+
+    aggregator = MessageAggregator(crypto, submit, window=0.05, max_size=240)
+    aggregator.start()
+    try:
+        for i in range(20):
+            aggregator.add(f"temp={20 + i % 5}.{i}", {"sender": "capteur", "priority": "normal",
+                                                      "timestamp": int(time.time())},
+                           on_sent=lambda success, frame, count: sent.append(success))
+        time.sleep(0.15)
+        assert len(sent) == 20 and all(sent)
+        # Trame pleine avant la fin de la fenêtre: le reste part dans une seconde trame
+        assert len(submitted) == 2 and all(len(frame) <= 240 for frame, _ in submitted)
+        telemetry = [frame for frame, _ in submitted]
+
+        # Priorité haute: part sans attendre la fenêtre, avec le message retenu
+        aggregator.add("lent", {"sender": "capteur"}, "low")
+        ticket = aggregator.add("alarme", {"sender": "capteur"}, "urgent")
+        assert not ticket["held"] and len(submitted) == 3 and submitted[-1][1] == "urgent"
+    finally:
+        aggregator.stop()
+
+    received = []
+    for frame, _ in submitted:
+        messages, frame_metadata = receiver.decrypt_frame(frame)
+        assert validator.validate_message(frame[:28].hex(), frame_metadata)
+        received += [message for message, _ in messages]
+    assert len(received) == 22 and received[-2:] == ["lent", "alarme"]
+
+    # Temps d'émission pour 20 messages: trames séparées contre trames groupées
+    config = RadioConfig()
+    singles = sum(time_on_air(len(crypto.encrypt_message(f"temp={20 + i % 5}.{i}",
+                                                         {"sender": "capteur", "priority": "normal",
+                                                          "timestamp": int(time.time())})), config)
+                  for i in range(20))
+    grouped = sum(time_on_air(len(frame), config) for frame in telemetry)
+    print(f"Temps d'émission pour 20 messages: {singles * 1000:.0f} ms séparés, {grouped * 1000:.0f} ms groupés "
+          f"(x{singles / grouped:.1f})")
+    assert singles / grouped > 3
+    print(f"État: {aggregator.get_status()}")
+    print("⚪️ Test du regroupement de messages réussi!")
+
+
+if __name__ == "__main__":
+    test_message_aggregator()
@@ -0,0 +1,197 @@
+import os
+import bisect
+from threading import Lock
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+# Désactivable avec LORA_METRICS=off: les chronomètres deviennent des no-op
+METRICS_ENABLED = os.getenv("LORA_METRICS", "on").lower() == "on"
+
+# Bornes (secondes) adaptées aux étapes du chemin critique: de ~10 µs à 10 s
+DEFAULT_BUCKETS = [0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0]
+
+
+def _format_labels(label_name: str, label_value: str, extra: str = "") -> str:
+    parts = []
+    if label_name:
+        parts.append(f'{label_name}="{label_value}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Compteur Prometheus, avec une étiquette optionnelle"""
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, help_text: str, label: str = None):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.values: Dict[str, float] = {}
+        self.lock = Lock()
+
+    def inc(self, label_value: str = "", amount: float = 1):
+        if not self.registry.enabled:
+            return
+        with self.lock:
+            self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = dict(self.values)
+        if not self.label and not values:
+            values[""] = 0
+        for label_value, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label, label_value)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Histogramme Prometheus (classes cumulatives), avec une étiquette optionnelle"""
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, help_text: str, label: str = None,
+                 buckets: List[float] = None):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = buckets or DEFAULT_BUCKETS
+        # étiquette -> [comptes par classe (+Inf comprise), somme]
+        self.series: Dict[str, Tuple[List[int], List[float]]] = {}
+        self.lock = Lock()
+
+    def observe(self, value: float, label_value: str = ""):
+        if not self.registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = self.series[label_value] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def time(self, label_value: str = ""):
+        """Chronométrer un bloc: with STAGE_SECONDS.time("encrypt"): ..."""
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, label_value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {label: (list(counts), total[0]) for label, (counts, total) in self.series.items()}
+        for label_value, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ["+Inf"], counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label, label_value, le)} {cumulative}")
+            labels = _format_labels(self.label, label_value)
+            lines.append(f"{self.name}_sum{labels} {total:.6f}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    """Chronomètre d'un bloc (classe plutôt que générateur: moins coûteux)"""
+
+    __slots__ = ("histogram", "label_value", "start")
+
+    def __init__(self, histogram: Histogram, label_value: str):
+        self.histogram = histogram
+        self.label_value = label_value
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(perf_counter() - self.start, self.label_value)
+        return False
+
+
+class _NullTimer:
+    """Chronomètre inactif (métriques désactivées)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """Ensemble des métriques exposées au format texte Prometheus"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.metrics = []
+
+    def counter(self, name: str, help_text: str, label: str = None) -> Counter:
+        metric = Counter(self, name, help_text, label)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, label: str = None, buckets: List[float] = None) -> Histogram:
+        metric = Histogram(self, name, help_text, label, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry(enabled=METRICS_ENABLED)
+
+# Métriques du chemin critique, partagées par les modules radio, crypto et le backend
+STAGE_SECONDS = REGISTRY.histogram(
+    "lora_stage_duration_seconds",
+    "Durée des étapes d'émission et de réception",
+    label="stage"
+)
+SERIAL_ERRORS = REGISTRY.counter("lora_serial_errors_total", "Erreurs de lecture/écriture série", label="operation")
+DECRYPT_FAILURES = REGISTRY.counter("lora_decrypt_failures_total", "Trames reçues impossibles à déchiffrer")
+REPLAY_REJECTIONS = REGISTRY.counter("lora_replay_rejections_total", "Messages rejetés par l'anti-rejeu")
+
+
+def test_metrics():
+    """Tester le rendu texte et le mode désactivé"""
+    registry = MetricsRegistry()
+    stage = registry.histogram("test_stage_seconds", "Étapes", label="stage", buckets=[0.001, 0.01])
+    errors = registry.counter("test_errors_total", "Erreurs")
+    with stage.time("encrypt"):
+        pass
+    stage.observe(0.005, "decrypt")
+    errors.inc()
+
+    text = registry.render()
+    assert 'test_stage_seconds_bucket{stage="decrypt",le="0.01"} 1' in text
+    assert 'test_stage_seconds_count{stage="encrypt"} 1' in text
+    assert "test_errors_total 1" in text
+
+    registry.enabled = False
+    errors.inc()
+    with stage.time("encrypt"):
+        pass
+    assert registry.render() == text
+
+    overhead_start = perf_counter()
+    registry.enabled = True
+    for _ in range(10000):
+        with stage.time("encrypt"):
+            pass
+    print(f"Coût d'un chronométrage: {(perf_counter() - overhead_start) / 10000 * 1e6:.2f} µs")
+    print("⚪️ Test des métriques réussi!")
+
+
+if __name__ == "__main__":
+    test_metrics()
@@ -0,0 +1,452 @@
+import os
+import tty
+import time
+import array
+import fcntl
+import termios
+import math
+import heapq
+import random
+import argparse
+import itertools
+from threading import Thread, Condition, Lock
+from typing import Dict, List
+
+from lora_module import RadioConfig, DEFAULT_RFCFG, DEFAULT_BAUDRATE, SUPPORTED_BAUDRATES, time_on_air
+from adr import REQUIRED_SNR
+
+# Un paquet survit à une collision s'il dépasse l'interférent de ce seuil (effet de capture)
+CAPTURE_THRESHOLD_DB = 6.0
+MAX_REPORTED_SNR = 13.0
+
+# Lecture des réglages termios2 (débit quelconque, Linux)
+TCGETS2 = 0x802C542A
+BAUD_CONSTANTS = {getattr(termios, f"B{rate}"): rate for rate in SUPPORTED_BAUDRATES
+                  if hasattr(termios, f"B{rate}")}
+
+
+def host_baudrate(fd: int):
+    """Débit réglé par l'hôte sur le pseudo-terminal (None si illisible)"""
+    try:
+        settings = array.array("i", [0] * 64)
+        fcntl.ioctl(fd, TCGETS2, settings)
+        return settings[10]
+    except OSError:
+        return BAUD_CONSTANTS.get(termios.tcgetattr(fd)[5])
+
+
+def noise_floor(bw_khz: int, noise_figure_db: float = 6.0) -> float:
+    """Bruit thermique du récepteur (dBm) pour une bande passante donnée"""
+    return -174 + 10 * math.log10(bw_khz * 1000) + noise_figure_db
+
+
+class _Transmission:
+    """Paquet en cours d'émission sur le canal simulé"""
+
+    def __init__(self, sender: 'EmulatedModem', packet: bytes, config: RadioConfig, start: float, end: float):
+        self.sender = sender
+        self.packet = packet
+        self.config = config
+        self.start = start
+        self.end = end
+        self.delivered = False
+
+
+class RadioChannel:
+    """Canal radio partagé entre modules émulés
+
+    Chaque paquet occupe le canal pendant son temps d'émission (multiplié
+    par time_scale), puis est livré aux modules en réception sur la même
+    fréquence, le même SF et la même bande passante. Le RSSI dépend de la
+    puissance d'émission et de l'affaiblissement du lien; un paquet est
+    perdu sous la sensibilité du SF, avec la probabilité loss, ou quand
+    un autre paquet le chevauche sans qu'il puisse le capturer.
+
+    Avec uart_timing, chaque ligne AT occupe la liaison série pendant sa
+    durée de transfert au débit courant (10 bits par octet, non réduite
+    par time_scale).
+    """
+
+    def __init__(self, time_scale: float = 1.0, loss: float = 0.0, path_loss_db: float = 74.0,
+                 rssi_jitter_db: float = 1.0, seed: int = None, uart_timing: bool = False):
+        self.time_scale = time_scale
+        self.uart_timing = uart_timing
+        self.loss = loss
+        self.path_loss_db = path_loss_db
+        self.rssi_jitter_db = rssi_jitter_db
+        self.rng = random.Random(seed)
+        self.modems: List['EmulatedModem'] = []
+        self.links: Dict[tuple, float] = {}
+        self.transmissions: List[_Transmission] = []
+
+        self.condition = Condition()
+        self.events = []
+        self.event_ids = itertools.count()
+        self.running = True
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+        self.stats = {"transmitted": 0, "delivered": 0, "lost": 0, "collisions": 0, "below_sensitivity": 0}
+
+    def add_modem(self, name: str = None) -> 'EmulatedModem':
+        """Créer un module émulé relié à ce canal"""
+        modem = EmulatedModem(self, name or f"radio{len(self.modems)}")
+        self.modems.append(modem)
+        return modem
+
+    def set_path_loss(self, a: 'EmulatedModem', b: 'EmulatedModem', path_loss_db: float):
+        """Affaiblissement (dB) d'un lien, dans les deux sens"""
+        self.links[(a.name, b.name)] = path_loss_db
+        self.links[(b.name, a.name)] = path_loss_db
+
+    def schedule(self, delay: float, callback):
+        with self.condition:
+            heapq.heappush(self.events, (time.monotonic() + delay, next(self.event_ids), callback))
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and (not self.events or self.events[0][0] > time.monotonic()):
+                    timeout = self.events[0][0] - time.monotonic() if self.events else None
+                    self.condition.wait(timeout)
+                if not self.running:
+                    return
+                _, _, callback = heapq.heappop(self.events)
+            try:
+                callback()
+            except Exception as e:
+                print(f"Erreur du canal simulé: {e}")
+
+    def transmit(self, sender: 'EmulatedModem', packet: bytes, config: RadioConfig) -> float:
+        """Démarrer une émission, retourne sa durée réelle (secondes)"""
+        duration = time_on_air(len(packet), config) * self.time_scale
+        now = time.monotonic()
+        transmission = _Transmission(sender, packet, config, now, now + duration)
+        with self.condition:
+            self.transmissions.append(transmission)
+            self.stats["transmitted"] += 1
+        self.schedule(duration, lambda: self._deliver(transmission))
+        return duration
+
+    def _received_power(self, transmission: _Transmission, receiver: 'EmulatedModem') -> float:
+        path_loss = self.links.get((transmission.sender.name, receiver.name), self.path_loss_db)
+        return transmission.config.power - path_loss
+
+    def _same_channel(self, a: RadioConfig, b: RadioConfig) -> bool:
+        return a.frequency == b.frequency and a.sf == b.sf and a.bw == b.bw
+
+    def _deliver(self, transmission: _Transmission):
+        with self.condition:
+            overlapping = [
+                other for other in self.transmissions
+                if other is not transmission and other.start < transmission.end and other.end > transmission.start
+                and self._same_channel(other.config, transmission.config)
+            ]
+            # Oublier les émissions livrées qui ne peuvent plus chevaucher une émission en cours
+            transmission.delivered = True
+            horizon = min((t.start for t in self.transmissions if not t.delivered), default=math.inf)
+            self.transmissions = [t for t in self.transmissions if not t.delivered or t.end > horizon]
+
+        for receiver in self.modems:
+            if receiver is transmission.sender or not receiver.receiving:
+                continue
+            if not self._same_channel(receiver.config, transmission.config):
+                continue
+
+            rssi = self._received_power(transmission, receiver) + self.rng.gauss(0, self.rssi_jitter_db)
+            snr = rssi - noise_floor(transmission.config.bw)
+            if snr < REQUIRED_SNR.get(transmission.config.sf, REQUIRED_SNR[12]):
+                self.stats["below_sensitivity"] += 1
+                continue
+
+            interferers = [other for other in overlapping if other.sender is not receiver]
+            if any(rssi - self._received_power(other, receiver) < CAPTURE_THRESHOLD_DB for other in interferers):
+                self.stats["collisions"] += 1
+                continue
+
+            if self.loss and self.rng.random() < self.loss:
+                self.stats["lost"] += 1
+                continue
+
+            receiver.receive(transmission.packet, round(rssi), round(min(snr, MAX_REPORTED_SNR)))
+            self.stats["delivered"] += 1
+
+    def close(self):
+        for modem in self.modems:
+            modem.close()
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join(timeout=1.0)
+
+
+class EmulatedModem:
+    """Module LoRa émulé derrière un pseudo-terminal (sous-ensemble du firmware AT)
+
+    LoRaDevice s'y connecte sans modification en ouvrant modem.port.
+    Le module parle au débit baudrate (changé par AT+UART=BR puis ATZ);
+    une ligne échangée à un autre débit côté hôte est perdue ou illisible.
+    Au-delà de unreliable_above bauds, une ligne sur deux est corrompue
+    (pont USB-série ou câble qui ne tient pas le débit).
+    """
+
+    def __init__(self, channel: RadioChannel, name: str):
+        self.channel = channel
+        self.name = name
+        self.config = RadioConfig.from_rfcfg(DEFAULT_RFCFG)
+        self.test_mode = False
+        self.receiving = False
+        self.transmitting = False
+        self.write_lock = Lock()
+        self.baudrate = DEFAULT_BAUDRATE
+        self.pending_baudrate = None
+        self.supported_baudrates = list(SUPPORTED_BAUDRATES)
+        self.unreliable_above = None
+
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self._slave = slave
+        self.running = True
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _link_ok(self) -> bool:
+        """La ligne passe-t-elle intacte entre l'hôte et le module?"""
+        try:
+            rate = host_baudrate(self.master)
+        except OSError:
+            return False
+        if rate and rate != self.baudrate:
+            return False
+        return not (self.unreliable_above and self.baudrate > self.unreliable_above
+                    and self.channel.rng.random() < 0.5)
+
+    def _uart_delay(self, size: int):
+        if self.channel.uart_timing:
+            time.sleep(size * 10 / self.baudrate)
+
+    def _write_line(self, line: str):
+        data = (line + "\r\n").encode("ascii")
+        with self.write_lock:
+            self._uart_delay(len(data))
+            if not self._link_ok():
+                data = bytes(0x80 | (byte ^ 0x55) for byte in data[:-2])
+            try:
+                os.write(self.master, data)
+            except OSError:
+                pass
+
+    def _run(self):
+        buffer = b""
+        while self.running:
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+            while b"\n" in buffer:
+                raw, buffer = buffer.split(b"\n", 1)
+                self._uart_delay(len(raw) + 1)
+                if not self._link_ok():
+                    continue
+                line = raw.decode("ascii", errors="ignore").strip()
+                if line:
+                    self._handle_command(line)
+
+    def _handle_command(self, cmd: str):
+        upper = cmd.upper()
+        if upper == "AT":
+            self._write_line("+AT: OK")
+        elif upper == "ATZ":
+            self.test_mode = False
+            self.receiving = False
+            self.config = RadioConfig.from_rfcfg(DEFAULT_RFCFG)
+            self._write_line("+RESET: OK")
+            # Le débit UART demandé est conservé et appliqué au redémarrage
+            if self.pending_baudrate:
+                self.baudrate, self.pending_baudrate = self.pending_baudrate, None
+        elif upper.startswith("AT+UART=BR"):
+            self._handle_uart(upper.split(",", 1)[-1].strip())
+        elif upper.startswith("AT+MODE="):
+            self.test_mode = upper.split("=", 1)[1] == "TEST"
+            self._write_line(f"+MODE: {upper.split('=', 1)[1]}")
+        elif upper.startswith("AT+TEST=RFCFG,"):
+            self._handle_rfcfg(cmd.split(",", 1)[1])
+        elif upper.startswith("AT+TEST=TXLRPKT,"):
+            self._handle_tx(cmd)
+        elif upper == "AT+TEST=RXLRPKT":
+            if not self.test_mode:
+                self._write_line("+TEST: ERROR(-11)")
+                return
+            self.receiving = True
+            self._write_line("+TEST: RXLRPKT")
+        else:
+            name = upper[2:].lstrip("+").split("=", 1)[0].split("?", 1)[0] or "AT"
+            self._write_line(f"+{name}: ERROR(-1)")
+
+    def _handle_uart(self, value: str):
+        try:
+            baudrate = int(value)
+        except ValueError:
+            baudrate = None
+        if baudrate not in self.supported_baudrates:
+            self._write_line("+UART: ERROR(-1)")
+            return
+        self.pending_baudrate = baudrate
+        self._write_line(f"+UART: BR, {baudrate}")
+
+    def _handle_rfcfg(self, rfcfg: str):
+        try:
+            self.config = RadioConfig.from_rfcfg(rfcfg)
+        except ValueError:
+            self._write_line("+TEST: ERROR(-1)")
+            return
+        c = self.config
+        flag = lambda value: "ON" if value else "OFF"
+        self._write_line(f"+TEST: RFCFG F:{int(c.frequency * 1e6)}, SF{c.sf}, BW{c.bw}K, TXPR:{c.tx_preamble}, "
+                         f"RXPR:{c.rx_preamble}, POW:{c.power}dBm, CRC:{flag(c.crc)}, IQ:{flag(c.iq_inverted)}, "
+                         f"NET:{flag(c.public_network)}")
+
+    def _handle_tx(self, cmd: str):
+        start = cmd.find('"') + 1
+        end = cmd.rfind('"')
+        try:
+            packet = bytes.fromhex(cmd[start:end])
+        except ValueError:
+            packet = None
+        if not self.test_mode or not packet or end <= start or self.transmitting:
+            self._write_line("+TEST: ERROR(-1)")
+            return
+
+        # Le module quitte la réception pour émettre et n'y revient pas seul
+        self.receiving = False
+        self.transmitting = True
+        self._write_line(f'+TEST: TXLRPKT "{packet.hex().upper()}"')
+        duration = self.channel.transmit(self, packet, self.config.copy())
+        self.channel.schedule(duration, self._tx_done)
+
+    def _tx_done(self):
+        self.transmitting = False
+        self._write_line("+TEST: TX DONE")
+
+    def receive(self, packet: bytes, rssi: int, snr: int):
+        """Livraison d'un paquet par le canal"""
+        self._write_line(f"+TEST: LEN:{len(packet)}, RSSI:{rssi}, SNR:{snr}")
+        self._write_line(f'+TEST: RX "{packet.hex().upper()}"')
+
+    def close(self):
+        self.running = False
+        for fd in (self._slave, self.master):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def test_modem_emulator():
+    """Faire dialoguer deux LoRaDevice non modifiés à travers le canal simulé"""
+    from lora_module import LoRaDevice
+    from fragmentation import DEFAULT_MTU
+
+    channel = RadioChannel(time_scale=0.1, seed=1)
+    modem_a, modem_b = channel.add_modem("a"), channel.add_modem("b")
+    sender, receiver = LoRaDevice(modem_a.port, mtu=DEFAULT_MTU), LoRaDevice(modem_b.port, mtu=DEFAULT_MTU)
+    try:
+        assert sender.connect() and receiver.connect()
+        assert receiver.start_streaming()
+
+        payload = bytes(range(256)) * 2  # Fragmenté en trois paquets
+        assert sender.send_data(payload)
+        frame, signal_info = receiver.receive_frame(timeout=5.0)
+        assert frame == payload, len(frame)
+        print(f"Trame reçue: {len(frame)} bytes, RSSI {signal_info['rssi']} dBm, SNR {signal_info['snr']} dB")
+
+        # Deux émissions simultanées sur le même canal: collision sans effet de capture
+        for modem in (modem_a, modem_b):
+            modem.receiving = False
+        listener = channel.add_modem("c")
+        listener.test_mode = listener.receiving = True
+        received = []
+        listener.receive = lambda packet, rssi, snr: received.append(packet)
+        channel.transmit(modem_a, b"one", modem_a.config)
+        channel.transmit(modem_b, b"two", modem_b.config)
+        time.sleep(0.05)
+        assert not received and channel.stats["collisions"] == 2
+        print(f"Statistiques du canal: {channel.stats}")
+    finally:
+        receiver.disconnect()
+        sender.disconnect()
+        channel.close()
+    print("⚪️ Test de l'émulateur de modem réussi!")
+
+
+def test_baudrate_negotiation():
+    """Négocier le débit série, vérifier le repli et la détection du débit courant"""
+    from lora_module import LoRaDevice
+
+    channel = RadioChannel(uart_timing=True)
+    fast, old_firmware, flaky = (channel.add_modem(name) for name in ("fast", "old", "flaky"))
+    old_firmware.supported_baudrates = [DEFAULT_BAUDRATE]
+    flaky.unreliable_above = 57600
+    try:
+        device = LoRaDevice(fast.port, max_baudrate=115200)
+        assert device.connect() and device.baudrate == fast.baudrate == 115200
+        # Un délai propre à une commande ne change pas celui du port
+        device._send_command("AT", timeout=0.3)
+        assert device.serial.timeout == 1.0, device.serial.timeout
+        device.disconnect()
+
+        # Débit du module inconnu (non mémorisé): retrouvé à la connexion
+        rediscovered = LoRaDevice(fast.port)
+        assert rediscovered.connect() and rediscovered.baudrate == 115200
+        rediscovered.disconnect()
+
+        # AT+UART refusé: on reste à 9600
+        device = LoRaDevice(old_firmware.port, max_baudrate=230400)
+        assert device.connect() and device.baudrate == DEFAULT_BAUDRATE
+        device.disconnect()
+
+        # Liaison instable au-delà de 57600: repli puis débit inférieur
+        device = LoRaDevice(flaky.port, max_baudrate=230400)
+        assert device.connect() and device.baudrate == flaky.baudrate == 57600, device.baudrate
+        device.disconnect()
+
+        # Transfert hôte -> module d'une trame de 200 octets (ligne AT hexadécimale)
+        line = 2 * 200 + len('AT+TEST=TXLRPKT,""\r\n')
+        for rate in (DEFAULT_BAUDRATE, 115200):
+            print(f"Ligne TXLRPKT de 200 octets à {rate} bauds: {line * 10 / rate * 1000:.1f} ms")
+    finally:
+        channel.close()
+    print("⚪️ Test de la négociation du débit réussi!")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Émulateur de modules LoRa (pseudo-terminaux)")
+    parser.add_argument("--radios", type=int, default=2, help="Nombre de modules émulés")
+    parser.add_argument("--loss", type=float, default=0.0, help="Probabilité de perte d'un paquet")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Facteur appliqué au temps d'émission")
+    parser.add_argument("--path-loss", type=float, default=74.0, help="Affaiblissement des liens (dB)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    channel = RadioChannel(time_scale=args.time_scale, loss=args.loss, path_loss_db=args.path_loss,
+                           seed=args.seed)
+    for _ in range(args.radios):
+        modem = channel.add_modem()
+        print(f"📡 {modem.name}: {modem.port}")
+
+    print("Ctrl+C pour arrêter")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"\nStatistiques du canal: {channel.stats}")
+        channel.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock, Event
+from typing import Callable, Dict, List, Set
+
+from serial import Serial
+
+from lora_module import list_available_ports, DEFAULT_BAUDRATE
+from replay_protection import _read_json, _write_json_atomic
+
+
+def probe_port(port: str, baudrate: int = DEFAULT_BAUDRATE, timeout: float = 0.3) -> bool:
+    """Poignée de main courte: un module LoRa répond +AT: OK à AT"""
+    try:
+        with Serial(port, baudrate, timeout=timeout / 3, write_timeout=timeout) as ser:
+            ser.reset_input_buffer()
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                ser.write(b"AT\r\n")
+                line = ser.read_until(b"\r\n")
+                while line and time.monotonic() < deadline:
+                    if b"+AT: OK" in line:
+                        return True
+                    line = ser.read_until(b"\r\n")
+    except Exception:
+        pass
+    return False
+
+
+def is_candidate(port_info: dict) -> bool:
+    """Ports série sans matériel USB derrière (ttyS*, Bluetooth...) jamais sondés"""
+    hwid = port_info.get("hwid") or ""
+    name = (port_info.get("name") or "").lower()
+    return hwid not in ("", "n/a") and "bluetooth" not in name
+
+
+class PortDiscovery:
+    """Inventaire des ports série en cache, sondage parallèle et détection à chaud
+
+    Un thread réénumère les ports toutes les scan_interval secondes. Seuls
+    les ports apparus sont sondés (AT, en parallèle); un hwid déjà
+    confirmé comme module LoRa (mémorisé dans state_path) est reconnu sans
+    sondage, et le débit série négocié avec lui y est aussi mémorisé pour
+    sonder et connecter directement au bon débit. Les ports en cours
+    d'utilisation (in_use) ne sont jamais ouverts. on_added(port_info) et
+    on_removed(port_info) sont appelés pour chaque module LoRa branché ou
+    débranché.
+    """
+
+    def __init__(self, scan_interval: float = 2.0, probe_timeout: float = 0.3, max_workers: int = 8,
+                 state_path: str = None, baudrate: int = DEFAULT_BAUDRATE,
+                 enumerate_ports: Callable[[], List[dict]] = list_available_ports,
+                 probe: Callable = probe_port, in_use: Callable[[], Set[str]] = None,
+                 on_added: Callable = None, on_removed: Callable = None):
+        self.scan_interval = scan_interval
+        self.probe_timeout = probe_timeout
+        self.max_workers = max_workers
+        self.state_path = state_path
+        self.baudrate = baudrate
+        self.enumerate_ports = enumerate_ports
+        self.probe = probe
+        self.in_use = in_use or (lambda: set())
+        self.on_added = on_added
+        self.on_removed = on_removed
+
+        self.lock = Lock()
+        self.scan_lock = Lock()
+        self.ports: Dict[str, dict] = {}
+        state = _read_json(state_path, {})
+        self.known_hwids: Set[str] = set(state.get("lora_hwids", []))
+        self.baudrates: Dict[str, int] = state.get("baudrates", {})
+        self.scans = 0
+        self.probes = 0
+        self.last_scan_ms = None
+
+        self.stop_event = Event()
+        self.thread: Thread = None
+
+    def start(self):
+        if self.thread:
+            return
+        self.stop_event.clear()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self.thread = None
+
+    def _run(self):
+        while True:
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"Erreur de détection des ports: {e}")
+            if self.stop_event.wait(self.scan_interval):
+                return
+
+    def scan(self, reprobe: bool = False) -> tuple:
+        """Réénumérer les ports et sonder les nouveaux, retourne (ajoutés, retirés)"""
+        with self.scan_lock:
+            start = time.perf_counter()
+            current = {info["port"]: info for info in self.enumerate_ports()}
+            with self.lock:
+                previous = dict(self.ports)
+
+            removed = [info for port, info in previous.items() if port not in current]
+            new_ports = [info for port, info in current.items()
+                         if port not in previous or (reprobe and previous[port].get("lora") is not True)]
+
+            busy = self.in_use()
+            to_probe = []
+            for info in new_ports:
+                info = dict(info, lora=None, probed_at=None)
+                if info.get("hwid") in self.known_hwids:
+                    info["lora"] = True
+                elif not is_candidate(info):
+                    info["lora"] = False
+                elif info["port"] not in busy:
+                    to_probe.append(info)
+                with self.lock:
+                    self.ports[info["port"]] = info
+
+            if to_probe:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(to_probe))) as executor:
+                    results = list(executor.map(
+                        lambda info: self.probe(info["port"], self.baudrates.get(info["hwid"], self.baudrate),
+                                                self.probe_timeout), to_probe))
+                self.probes += len(to_probe)
+                for info, is_lora in zip(to_probe, results):
+                    info["lora"] = is_lora
+                    info["probed_at"] = time.time()
+                self._remember([info["hwid"] for info in to_probe if info["lora"]])
+
+            with self.lock:
+                for info in removed:
+                    self.ports.pop(info["port"], None)
+            self.scans += 1
+            self.last_scan_ms = round((time.perf_counter() - start) * 1000, 1)
+
+        with self.lock:
+            added = [dict(self.ports[info["port"]]) for info in new_ports
+                     if self.ports.get(info["port"], {}).get("lora")]
+        removed = [info for info in removed if info.get("lora")]
+        for callback, infos in ((self.on_added, added), (self.on_removed, removed)):
+            for info in infos:
+                if callback:
+                    try:
+                        callback(info)
+                    except Exception as e:
+                        print(f"Erreur du callback de détection: {e}")
+        return added, removed
+
+    def _remember(self, hwids: List[str]):
+        hwids = [hwid for hwid in hwids if hwid and hwid not in self.known_hwids]
+        if not hwids:
+            return
+        self.known_hwids.update(hwids)
+        self._save()
+
+    def _save(self):
+        if self.state_path:
+            _write_json_atomic(self.state_path, {"lora_hwids": sorted(self.known_hwids),
+                                                 "baudrates": self.baudrates})
+
+    def get_baudrate(self, port: str) -> int:
+        """Débit série mémorisé pour le module branché sur ce port (None si inconnu)"""
+        return self.baudrates.get(self.get_hwid(port))
+
+    def set_baudrate(self, port: str, baudrate: int):
+        """Mémoriser le débit série auquel le module de ce port répond"""
+        hwid = self.get_hwid(port)
+        if hwid and self.baudrates.get(hwid) != baudrate:
+            self.baudrates[hwid] = baudrate
+            self._save()
+
+    def confirm(self, port: str):
+        """Marquer un port comme module LoRa (connexion réussie), sans le sonder"""
+        with self.lock:
+            info = self.ports.get(port)
+            if info:
+                info["lora"] = True
+        if info:
+            self._remember([info.get("hwid")])
+
+    def get_ports(self) -> List[dict]:
+        """Ports connus (cache), sans énumération ni sondage"""
+        with self.lock:
+            return sorted((dict(info) for info in self.ports.values()), key=lambda info: info["port"])
+
+    def get_lora_ports(self) -> List[str]:
+        return [info["port"] for info in self.get_ports() if info.get("lora")]
+
+    def get_hwid(self, port: str) -> str:
+        with self.lock:
+            return self.ports.get(port, {}).get("hwid")
+
+    def get_status(self) -> dict:
+        return {
+            "ports": len(self.ports),
+            "lora_ports": len(self.get_lora_ports()),
+            "known_hwids": len(self.known_hwids),
+            "scans": self.scans,
+            "probes": self.probes,
+            "last_scan_ms": self.last_scan_ms,
+            "scan_interval_s": self.scan_interval
+        }
+
+
+def find_lora_ports(baudrate: int = DEFAULT_BAUDRATE, timeout: float = 0.3) -> List[str]:
+    """Sonder une fois tous les ports candidats en parallèle, retourne les modules LoRa"""
+    discovery = PortDiscovery(probe_timeout=timeout, baudrate=baudrate)
+    discovery.scan()
+    return discovery.get_lora_ports()
+
+
+def test_port_discovery():
+    """Tester le sondage parallèle et le branchement à chaud sur des modules émulés"""
+    import os
+    import pty
+    from modem_emulator import RadioChannel
+
+    channel = RadioChannel()
+    modems = [channel.add_modem() for _ in range(3)]
+    # Pseudo-terminal muet: un port série qui n'est pas un module LoRa
+    silent_master, silent_slave = pty.openpty()
+    silent_port = os.ttyname(silent_slave)
+
+    plugged = [{"port": modem.port, "name": "CP2102N", "hwid": f"USB VID:PID=10C4:EA60 SER={i}"}
+               for i, modem in enumerate(modems)]
+    plugged.append({"port": silent_port, "name": "USB Serial", "hwid": "USB VID:PID=0403:6001 SER=X"})
+    plugged.append({"port": "/dev/ttyS0", "name": "ttyS0", "hwid": "n/a"})
+    events = []
+
+    discovery = PortDiscovery(enumerate_ports=lambda: list(plugged), probe_timeout=0.2,
+                              on_added=lambda info: events.append(("added", info["port"])),
+                              on_removed=lambda info: events.append(("removed", info["port"])))
+    try:
+        start = time.perf_counter()
+        discovery.scan()
+        elapsed = time.perf_counter() - start
+        assert sorted(discovery.get_lora_ports()) == sorted(modem.port for modem in modems)
+        assert discovery.probes == 4 and elapsed < 0.5, elapsed
+        print(f"Premier inventaire: {elapsed * 1000:.0f} ms pour {discovery.probes} sondages en parallèle")
+
+        # Deuxième passage: rien de nouveau, aucun sondage
+        discovery.scan()
+        assert discovery.probes == 4
+
+        # Débranchement puis rebranchement: hwid déjà confirmé, reconnu sans sondage
+        unplugged = plugged.pop(0)
+        discovery.scan()
+        plugged.append(unplugged)
+        discovery.scan()
+        assert discovery.probes == 4
+        assert ("removed", unplugged["port"]) in events and events[-1] == ("added", unplugged["port"])
+        print(f"Événements: {events}")
+    finally:
+        channel.close()
+        os.close(silent_master)
+        os.close(silent_slave)
+    print("⚪️ Test de la détection des ports réussi!")
+
+
+if __name__ == "__main__":
+    test_port_discovery()
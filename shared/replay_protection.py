@@ -0,0 +1,378 @@
+import os
+import json
+import math
+import atexit
+import secrets
+from threading import Lock
+from typing import Dict, Union
+
+
+def message_digest(message: str, timestamp: int) -> int:
+    """Empreinte compacte (64 bits) d'un message et de son horodatage
+
+    hash() de Python est un SipHash avec une clé aléatoire par processus:
+    rapide, non prévisible pour un attaquant, et suffisant pour un cache
+    qui n'est jamais persisté.
+    """
+    return hash(f"{message}{timestamp}") & 0xFFFFFFFFFFFFFFFF
+
+
+class BloomFilter:
+    """Filtre de Bloom pour les empreintes 64 bits (faux positifs = rejet d'un message légitime)"""
+
+    def __init__(self, capacity: int, false_positive_rate: float = 1e-4):
+        bits = max(64, int(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.size = bits
+        self.hashes = max(1, round(bits / capacity * math.log(2)))
+        self.bits = bytearray((bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest: int):
+        # Double hachage à partir des deux moitiés de l'empreinte
+        h1, h2 = digest & 0xFFFFFFFF, (digest >> 32) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, digest: int) -> bool:
+        """Ajouter une empreinte, retourne False si elle était (probablement) présente"""
+        bits = self.bits
+        added = False
+        for pos in self._positions(digest):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, digest: int) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+
+class ReplayCache:
+    """Cache anti-rejeu découpé en tranches de temps alignées sur max_age
+
+    Chaque empreinte est rangée dans la tranche de l'horodatage du message.
+    Une tranche entière est supprimée dès qu'elle sort de la fenêtre
+    max_age (éviction O(1)), ce qui évite de vider tout le cache et de
+    rouvrir une fenêtre de rejeu. Une tranche qui dépasse bloom_threshold
+    entrées, ou toutes les tranches quand max_entries est atteint, passent
+    sur un filtre de Bloom beaucoup plus compact.
+    """
+
+    def __init__(self, max_age: int = 300, buckets: int = 10, max_entries: int = 100000,
+                 bloom_threshold: int = None, false_positive_rate: float = 1e-4):
+        self.max_age = max_age
+        self.bucket_width = max(1, math.ceil(max_age / buckets))
+        self.max_entries = max_entries
+        self.bloom_threshold = bloom_threshold
+        self.false_positive_rate = false_positive_rate
+        self.buckets: Dict[int, Union[set, BloomFilter]] = {}
+        self.entries = 0
+        self.oldest_index = None
+        self.evicted_buckets = 0
+
+    def _expire(self, now: int):
+        oldest = (now - self.max_age) // self.bucket_width
+        if self.oldest_index is not None and oldest <= self.oldest_index:
+            return
+        for index in [i for i in self.buckets if i < oldest]:
+            self._drop(index)
+            self.evicted_buckets += 1
+        self.oldest_index = oldest
+
+    def _drop(self, index: int):
+        bucket = self.buckets.pop(index)
+        if isinstance(bucket, set):
+            self.entries -= len(bucket)
+
+    def _to_bloom(self, index: int):
+        """Convertir une tranche en filtre de Bloom"""
+        bucket = self.buckets[index]
+        capacity = max(len(bucket) * 4, self.bloom_threshold or 1024)
+        bloom = BloomFilter(capacity, self.false_positive_rate)
+        for digest in bucket:
+            bloom.add(digest)
+        self.entries -= len(bucket)
+        self.buckets[index] = bloom
+
+    def check_and_add(self, digest: int, timestamp: int, now: int) -> bool:
+        """Retourne True si le message est nouveau (et le mémorise)"""
+        if self.oldest_index is None or (now - self.max_age) // self.bucket_width > self.oldest_index:
+            self._expire(now)
+
+        index = timestamp // self.bucket_width
+        bucket = self.buckets.get(index)
+        if bucket is None:
+            bucket = self.buckets[index] = set()
+        elif type(bucket) is BloomFilter:
+            return bucket.add(digest)
+
+        if digest in bucket:
+            return False
+
+        bucket.add(digest)
+        self.entries += 1
+        if self.bloom_threshold and len(bucket) > self.bloom_threshold:
+            self._to_bloom(index)
+        elif self.entries > self.max_entries:
+            self._enforce_limit()
+        return True
+
+    def _enforce_limit(self):
+        """Respecter max_entries, de préférence sans rouvrir de fenêtre de rejeu"""
+        if self.bloom_threshold is None:
+            # Sans filtre de Bloom: sacrifier les tranches les plus anciennes
+            while self.entries > self.max_entries and len(self.buckets) > 1:
+                self._drop(min(self.buckets))
+                self.evicted_buckets += 1
+            return
+
+        sets = [i for i, b in self.buckets.items() if isinstance(b, set)]
+        for index in sorted(sets, key=lambda i: len(self.buckets[i]), reverse=True):
+            if self.entries <= self.max_entries:
+                return
+            self._to_bloom(index)
+
+    def __len__(self) -> int:
+        return sum(len(b) if isinstance(b, set) else b.count for b in self.buckets.values())
+
+    def get_stats(self) -> dict:
+        return {
+            "tracked_messages": len(self),
+            "exact_entries": self.entries,
+            "buckets": len(self.buckets),
+            "bloom_buckets": sum(isinstance(b, BloomFilter) for b in self.buckets.values()),
+            "bloom_bytes": sum(b.memory_bytes() for b in self.buckets.values() if isinstance(b, BloomFilter)),
+            "evicted_buckets": self.evicted_buckets
+        }
+
+
+def _write_json_atomic(path: str, data):
+    """Écrire un fichier d'état sans risque de le laisser tronqué"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str, default):
+    if not path or not os.path.exists(path):
+        return default
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Fichier d'état illisible {path}: {e}")
+        return default
+
+
+def node_id_from_state(path: str) -> str:
+    """Identifiant de ce nœud mémorisé dans path, sinon un nouvel identifiant aléatoire
+
+    Le nouvel identifiant n'est pas écrit ici (voir save_node_id): aucun
+    fichier n'est créé tant que le nœud n'émet pas.
+    """
+    return _read_json(path, {}).get("node_id") or f"node-{secrets.token_hex(4)}"
+
+
+def save_node_id(path: str, node_id: str):
+    """Mémoriser l'identifiant de ce nœud pour les redémarrages suivants"""
+    if _read_json(path, {}).get("node_id") != node_id:
+        _write_json_atomic(path, {"node_id": node_id})
+
+
+class SequenceCounter:
+    """Compteur de séquence monotone d'un émetteur, persistant entre redémarrages
+
+    Le fichier contient la borne haute d'un bloc de valeurs réservées: après
+    un arrêt brutal on repart de cette borne, quitte à sauter des valeurs,
+    mais jamais on ne réémet un numéro déjà utilisé.
+    """
+
+    def __init__(self, sender_id: str, path: str = None, reserve: int = 256):
+        self.sender_id = sender_id
+        self.path = path
+        self.reserve = reserve
+        self.lock = Lock()
+        self.value = _read_json(path, {}).get("reserved_until", 0)
+        self.reserved_until = self.value
+
+    def next(self) -> int:
+        """Obtenir le prochain numéro de séquence (à partir de 1)"""
+        return self.next_many(1)[0]
+
+    def next_many(self, count: int) -> range:
+        """Réserver count numéros consécutifs (une seule écriture au plus)"""
+        with self.lock:
+            first = self.value + 1
+            self.value += count
+            if self.value > self.reserved_until:
+                self.reserved_until = self.value + self.reserve
+                if self.path:
+                    _write_json_atomic(self.path, {"sender_id": self.sender_id,
+                                                   "reserved_until": self.reserved_until})
+            return range(first, self.value + 1)
+
+
+class SlidingWindow:
+    """Fenêtre glissante anti-rejeu façon IPsec (RFC 4303) sur un entier bitmap
+
+    Le bit i du bitmap indique si le numéro highest - i a déjà été vu.
+    """
+
+    __slots__ = ("size", "mask", "highest", "bitmap")
+
+    def __init__(self, size: int = 64, highest: int = 0, bitmap: int = 0):
+        self.size = size
+        self.mask = (1 << size) - 1
+        self.highest = highest
+        self.bitmap = bitmap
+
+    def check_and_update(self, seq: int) -> bool:
+        """Retourne True si seq est nouveau et dans la fenêtre (et le marque vu)"""
+        if seq > self.highest:
+            shift = seq - self.highest
+            self.bitmap = ((self.bitmap << shift) | 1) & self.mask if shift < self.size else 1
+            self.highest = seq
+            return True
+
+        offset = self.highest - seq
+        if offset >= self.size or seq <= 0:
+            return False
+        bit = 1 << offset
+        if self.bitmap & bit:
+            return False
+        self.bitmap |= bit
+        return True
+
+
+class ReplayWindowStore:
+    """Fenêtres glissantes par émetteur, persistées par réservation anticipée
+
+    Comme pour SequenceCounter, le fichier contient pour chaque émetteur une
+    borne reserve numéros au-delà du plus haut numéro accepté, écrite avant
+    d'accepter un numéro qui la dépasse. Au rechargement, toute la fenêtre
+    sous cette borne est considérée comme vue: même après un arrêt brutal,
+    aucune trame acceptée ne peut être rejouée. En contrepartie, au plus
+    reserve trames légitimes sont rejetées après un arrêt brutal; un arrêt
+    normal sauvegarde les numéros exacts.
+    """
+
+    def __init__(self, path: str = None, window_size: int = 64, reserve: int = 64):
+        self.path = path
+        self.window_size = window_size
+        self.reserve = reserve
+        self.lock = Lock()
+        self.windows: Dict[str, SlidingWindow] = {}
+        # Borne écrite sur disque par émetteur
+        self.reserved: Dict[str, int] = {}
+
+        for sender, highest in _read_json(path, {}).items():
+            self.windows[sender] = SlidingWindow(window_size, highest, (1 << window_size) - 1)
+            self.reserved[sender] = highest
+
+        if path:
+            atexit.register(self.flush)
+
+    def check_and_update(self, sender: str, seq: int) -> bool:
+        """Vérifier un numéro de séquence pour un émetteur"""
+        with self.lock:
+            window = self.windows.get(sender)
+            if window is None:
+                window = self.windows[sender] = SlidingWindow(self.window_size)
+
+            if self.path and seq > self.reserved.get(sender, 0):
+                # Réserver avant d'accepter: un numéro accepté est toujours couvert sur disque
+                reserved = dict(self.reserved)
+                reserved[sender] = seq + self.reserve
+                _write_json_atomic(self.path, reserved)
+                self.reserved = reserved
+            return window.check_and_update(seq)
+
+    def flush(self):
+        """Sauvegarder le plus haut numéro vu par émetteur (arrêt normal)"""
+        if not self.path:
+            return
+        with self.lock:
+            highest = {sender: w.highest for sender, w in self.windows.items()}
+            if highest != self.reserved:
+                _write_json_atomic(self.path, highest)
+                self.reserved = highest
+
+
+def test_replay_cache():
+    """Tester la détection de rejeu et l'éviction par tranche"""
+    cache = ReplayCache(max_age=300, buckets=10, bloom_threshold=100)
+    now = 1700000000
+
+    digest = message_digest("hello", now)
+    assert cache.check_and_add(digest, now, now)
+    assert not cache.check_and_add(digest, now, now)
+
+    # Passage en filtre de Bloom au-delà du seuil, sans perdre les entrées
+    for i in range(500):
+        cache.check_and_add(message_digest(f"msg {i}", now), now, now)
+    assert not cache.check_and_add(digest, now, now)
+    assert cache.get_stats()["bloom_buckets"] == 1
+
+    # La tranche est supprimée d'un bloc quand elle sort de la fenêtre
+    cache.check_and_add(message_digest("later", now + 400), now + 400, now + 400)
+    assert cache.get_stats()["buckets"] == 1
+    print(f"Statistiques: {cache.get_stats()}")
+    print("⚪️ Test du cache anti-rejeu réussi!")
+
+
+def test_sliding_window():
+    """Tester la fenêtre glissante et sa persistance"""
+    import tempfile
+
+    window = SlidingWindow(size=64)
+    assert window.check_and_update(1) and window.check_and_update(3)
+    assert window.check_and_update(2)                 # en retard mais dans la fenêtre
+    assert not window.check_and_update(2)             # rejeu
+    assert window.check_and_update(100)
+    assert not window.check_and_update(30)            # trop ancien
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "windows.json")
+        store = ReplayWindowStore(path, reserve=10)
+        for seq in (1, 2, 5):
+            assert store.check_and_update("node", seq)
+        # Arrêt brutal, sans flush: les numéros acceptés restent couverts par la réservation
+        crashed = ReplayWindowStore(path, reserve=10)
+        assert not crashed.check_and_update("node", 5) and not crashed.check_and_update("node", 4)
+        assert not crashed.check_and_update("node", 11) and crashed.check_and_update("node", 12)
+        # Arrêt normal: numéros exacts, rien de légitime n'est perdu
+        crashed.flush()
+        reloaded = ReplayWindowStore(path)
+        assert not reloaded.check_and_update("node", 12)
+        assert reloaded.check_and_update("node", 13)
+
+        counter_path = os.path.join(tmp, "counter.json")
+        counter = SequenceCounter("node", counter_path, reserve=10)
+        first = [counter.next() for _ in range(3)]
+        restarted = SequenceCounter("node", counter_path, reserve=10)
+        assert restarted.next() > max(first)
+
+        # Identifiant de nœud tiré une fois, différent d'un nœud à l'autre, stable ensuite
+        id_path = os.path.join(tmp, "node_id.json")
+        node_id = node_id_from_state(id_path)
+        assert not os.path.exists(id_path) and node_id != node_id_from_state(id_path)
+        save_node_id(id_path, node_id)
+        assert node_id_from_state(id_path) == node_id
+    print("⚪️ Test de la fenêtre glissante réussi!")
+
+
+if __name__ == "__main__":
+    test_replay_cache()
+    test_sliding_window()
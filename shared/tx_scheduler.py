@@ -0,0 +1,267 @@
+import time
+import itertools
+from threading import Thread, Condition
+from typing import Callable, Dict, List
+
+# Sous-bandes ETSI EN 300 220 (MHz) et rapport cyclique autorisé
+SUB_BANDS = [
+    ("863-865", 863.0, 865.0, 0.001),
+    ("865-868", 865.0, 868.0, 0.01),
+    ("868.0-868.6", 868.0, 868.6, 0.01),
+    ("868.7-869.2", 868.7, 869.2, 0.001),
+    ("869.4-869.65", 869.4, 869.65, 0.1),
+    ("869.7-870", 869.7, 870.0, 0.01),
+]
+DEFAULT_DUTY_CYCLE = 0.01
+
+PRIORITY_LEVELS = {"low": 0, "normal": 1, "high": 2, "urgent": 3}
+
+
+def sub_band_for(frequency: float) -> tuple:
+    """Trouver la sous-bande et le rapport cyclique d'une fréquence"""
+    for name, low, high, duty in SUB_BANDS:
+        if low <= frequency < high:
+            return name, duty
+    return f"{frequency:g}", DEFAULT_DUTY_CYCLE
+
+
+class DutyCycleBucket:
+    """Seau à jetons exprimé en secondes de temps d'émission
+
+    Le seau se remplit au rythme du rapport cyclique (0.01 s par seconde
+    à 1%) et contient au plus duty_cycle x window secondes.
+    """
+
+    def __init__(self, duty_cycle: float, window: float = 3600.0):
+        self.duty_cycle = duty_cycle
+        self.capacity = duty_cycle * window
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.duty_cycle)
+        self.updated_at = now
+
+    def wait_time(self, airtime: float) -> float:
+        """Délai avant de pouvoir émettre airtime secondes"""
+        self._refill()
+        if self.tokens >= airtime:
+            return 0.0
+        return (airtime - self.tokens) / self.duty_cycle
+
+    def consume(self, airtime: float):
+        self._refill()
+        self.tokens -= airtime
+
+    def get_status(self) -> dict:
+        self._refill()
+        return {
+            "duty_cycle": self.duty_cycle,
+            "available_airtime_s": round(self.tokens, 3),
+            "capacity_s": round(self.capacity, 3)
+        }
+
+
+class _TxItem:
+    """Trame en attente d'émission"""
+
+    def __init__(self, item_id: int, data: bytes, priority: str, airtime: float, on_sent: Callable):
+        self.id = item_id
+        self.data = data
+        self.priority = priority
+        self.level = PRIORITY_LEVELS.get(priority, PRIORITY_LEVELS["normal"])
+        self.airtime = airtime
+        self.on_sent = on_sent
+        self.queued_at = time.monotonic()
+
+
+class TxScheduler:
+    """Ordonnanceur d'émission par priorité, avec budget de rapport cyclique
+
+    La priorité effective d'une trame augmente d'un niveau toutes les
+    aging_interval secondes d'attente, pour qu'une trame basse priorité
+    finisse toujours par partir.
+    """
+
+    def __init__(self, device, aging_interval: float = 30.0, max_queue: int = 500,
+                 duty_window: float = 3600.0):
+        self.device = device
+        self.aging_interval = aging_interval
+        self.max_queue = max_queue
+        self.duty_window = duty_window
+        self.buckets: Dict[str, DutyCycleBucket] = {}
+        self.queue: List[_TxItem] = []
+        self.condition = Condition()
+        self.ids = itertools.count(1)
+        self.running = False
+        self.thread: Thread = None
+        self.current: _TxItem = None
+        self.current_started_at = 0.0
+
+        self.sent = 0
+        self.failed = 0
+        self.airtime_used = 0.0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self.thread = None
+
+    def _bucket(self) -> DutyCycleBucket:
+        name, duty = sub_band_for(self.device.radio_config.frequency)
+        if name not in self.buckets:
+            self.buckets[name] = DutyCycleBucket(duty, self.duty_window)
+        return self.buckets[name]
+
+    def _effective_priority(self, item: _TxItem, now: float) -> float:
+        return item.level + (now - item.queued_at) / self.aging_interval
+
+    def submit(self, data: bytes, priority: str = "normal", on_sent: Callable = None) -> dict:
+        """Mettre une trame en file, on_sent(success) est appelé après l'émission"""
+        with self.condition:
+            if len(self.queue) >= self.max_queue:
+                raise Exception("File d'émission pleine")
+
+            estimate = self._estimate(len(data), priority)
+            item = _TxItem(next(self.ids), data, priority, estimate["airtime_s"], on_sent)
+            self.queue.append(item)
+            self.condition.notify_all()
+
+        estimate["id"] = item.id
+        return estimate
+
+    def estimate(self, data_size: int, priority: str = "normal") -> dict:
+        """Estimer le délai d'émission d'une trame avant de l'accepter"""
+        with self.condition:
+            return self._estimate(data_size, priority)
+
+    def _estimate(self, data_size: int, priority: str) -> dict:
+        now = time.monotonic()
+        level = PRIORITY_LEVELS.get(priority, PRIORITY_LEVELS["normal"])
+        airtime = self.device.frame_airtime(data_size)
+
+        # Trames qui passeront avant: priorité effective supérieure ou égale
+        ahead = [item for item in self.queue if self._effective_priority(item, now) >= level]
+        airtime_ahead = sum(item.airtime for item in ahead)
+        if self.current:
+            airtime_ahead += max(0.0, self.current.airtime - (now - self.current_started_at))
+
+        bucket = self._bucket()
+        delay = airtime_ahead + bucket.wait_time(airtime_ahead + airtime)
+
+        return {
+            "airtime_s": round(airtime, 4),
+            "queue_depth": len(self.queue),
+            "queue_position": len(ahead) + 1,
+            "estimated_delay_s": round(delay, 3),
+            "estimated_send_time": time.time() + delay
+        }
+
+    def _next_item(self) -> _TxItem:
+        now = time.monotonic()
+        return max(self.queue, key=lambda item: (self._effective_priority(item, now), -item.id))
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                if not self.running:
+                    return
+
+                item = self._next_item()
+                bucket = self._bucket()
+                wait = bucket.wait_time(item.airtime)
+                if wait > 0:
+                    # Réévaluer après l'attente: une trame plus urgente a pu arriver
+                    self.condition.wait(timeout=min(wait, 1.0))
+                    continue
+
+                self.queue.remove(item)
+                bucket.consume(item.airtime)
+                self.current = item
+                self.current_started_at = time.monotonic()
+
+            success = self.device.send_data(item.data)
+
+            with self.condition:
+                self.current = None
+                if success:
+                    self.sent += 1
+                    self.airtime_used += item.airtime
+                else:
+                    self.failed += 1
+
+            if item.on_sent:
+                try:
+                    item.on_sent(success)
+                except Exception as e:
+                    print(f"Erreur du callback d'émission: {e}")
+
+    def get_status(self) -> dict:
+        """Obtenir la profondeur de file et le budget de chaque sous-bande"""
+        with self.condition:
+            depth = {name: 0 for name in PRIORITY_LEVELS}
+            for item in self.queue:
+                depth[item.priority if item.priority in depth else "normal"] += 1
+            self._bucket()
+            return {
+                "queue_depth": len(self.queue),
+                "queue_by_priority": depth,
+                "queued_airtime_s": round(sum(item.airtime for item in self.queue), 3),
+                "sent": self.sent,
+                "failed": self.failed,
+                "airtime_used_s": round(self.airtime_used, 3),
+                "sub_bands": {name: bucket.get_status() for name, bucket in self.buckets.items()}
+            }
+
+
+def test_tx_scheduler():
+    """Tester l'ordre de priorité avec un module simulé"""
+    from lora_module import RadioConfig, time_on_air
+
+    class _RecordingDevice:
+        radio_config = RadioConfig()
+
+        def __init__(self):
+            self.sent = []
+
+        def frame_airtime(self, size):
+            return time_on_air(size, self.radio_config)
+
+        def send_data(self, data):
+            self.sent.append(data)
+            return True
+
+    device = _RecordingDevice()
+    scheduler = TxScheduler(device)
+    for i in range(3):
+        scheduler.submit(b"low %d" % i, "low")
+    scheduler.submit(b"alarm", "urgent")
+    estimate = scheduler.estimate(50, "high")
+    assert estimate["queue_position"] == 2
+
+    scheduler.start()
+    deadline = time.time() + 2
+    while len(device.sent) < 4 and time.time() < deadline:
+        time.sleep(0.01)
+    scheduler.stop()
+
+    assert device.sent[0] == b"alarm"
+    print(f"Statut: {scheduler.get_status()}")
+    print("⚪️ Test de l'ordonnanceur réussi!")
+
+
+if __name__ == "__main__":
+    test_tx_scheduler()
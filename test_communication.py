@@ -14,6 +14,7 @@ from datetime import datetime
 sys.path.append(os.path.join(os.path.dirname(__file__), 'shared'))
 
 from lora_module import LoRaDevice, list_available_ports
+from port_discovery import find_lora_ports
 from crypto_utils import SecureCrypto, test_crypto
 
 def test_lora_communication():
@@ -53,13 +54,8 @@ def test_lora_communication():
     print(f"Empreinte de clé: {crypto.get_key_fingerprint()}")
 
     # 4. Configuration des modules LoRa
-    # Utiliser les ports LoRa détectés (CP2102N)
-    lora_ports = []
-    for port in ports:
-        if isinstance(port, dict):
-            # Vérifier si c'est un port CP2102N (module LoRa)
-            if 'CP2102N' in port.get('name', '') or 'usbserial' in port.get('port', ''):
-                lora_ports.append(port['port'])
+    # Ports qui répondent à AT (sondés en parallèle)
+    lora_ports = find_lora_ports()
 
     if len(lora_ports) < 2:
         print(f"⚫️ Erreur: Au moins 2 modules LoRa requis, trouvés: {len(lora_ports)}")
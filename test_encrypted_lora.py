@@ -13,7 +13,7 @@ from datetime import datetime
 # Ajouter le dossier shared au path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'shared'))
 
-from lora_module import list_available_ports
+from port_discovery import find_lora_ports
 from crypto_utils import SecureCrypto
 
 def setup_lora_module(port, frequency="865.125", sf="sf7", bw="125"):
@@ -116,14 +116,8 @@ def test_encrypted_communication():
     print("⚪️ Test de Communication LoRa Chiffrée")
     print("=" * 50)
 
-    # 1. Détecter les ports LoRa
-    ports = list_available_ports()
-    lora_ports = []
-
-    for port in ports:
-        if isinstance(port, dict):
-            if 'CP2102N' in port.get('name', '') or 'usbserial' in port.get('port', ''):
-                lora_ports.append(port['port'])
+    # 1. Détecter les ports LoRa (sondage AT en parallèle)
+    lora_ports = find_lora_ports()
 
     if len(lora_ports) < 2:
         print(f"⚫️ Au moins 2 modules LoRa requis, trouvés: {len(lora_ports)}")